@@ -0,0 +1,919 @@
+import time
+from datetime import datetime
+import logging
+from typing import Generator, List, Dict
+from collections import Counter
+import os
+import numpy as np
+from mouse_recorder import MouseRecorder
+from screen_backend import PyAutoGUIBackend
+from template_cache import TemplateCache
+from progress_journal import ProgressJournal, journal_path_for
+from phone_source import PhoneSource, write_checkpoint, estimate_rows
+from phone_index import PhoneIndex, normalize_phone, precheck, INVALID_STATUS, DUPLICATE_STATUS, ADDED_STATUS, DEFAULT_INDEX_FILE
+from metrics import RunMetrics
+from dashboard import Dashboard, RunCounters
+from recovery import Recovery, NO_ACTION
+from frame_provider import FrameProvider
+from work_queue import WorkQueue
+from io_worker import IOWorker, start_log_listener
+from rate_scheduler import RateScheduler, load_rate_limits, DEFAULT_RATE_FILE, DEFAULT_STATE_FILE
+from display_geometry import DisplayGeometry
+from step_pipeline import StepPipeline, load_step_specs, run_blocking, DEFAULT_SPEC_FILE
+from wait_profile import WaitProfile, DEFAULT_PROFILE_FILE
+from locator import locate, to_gray
+from template_store import TemplateStore, DEFAULT_STORE_FILE
+from failure_store import FailureStore, DEFAULT_FAILURE_DIR
+from similarity import score, score_batch, score_variants, tiered_score, tiered_score_variants, TIER_FULL, DEFAULT_CHANNEL_WEIGHTS, DEFAULT_GRID, DEFAULT_GLOBAL_WEIGHT, DEFAULT_LOCAL_WEIGHT
+import random
+
+class MouseAutomation:
+    def __init__(self, backend=None, logger=None):
+        self.running = False
+        self.paused = False
+        # 截图和鼠标键盘输入后端，默认操作真实桌面
+        self.backend = backend or PyAutoGUIBackend()
+        self._setup_logging(logger)
+        # 后台写入线程：失败截图、进度日志和Excel检查点不在点击路径上写盘
+        self.io_worker = IOWorker(self.logger)
+        # 匹配失败截图库：相同或近似相同的截图只保存一份，结束时按大小和保存天数清理
+        self.failure_store = FailureStore(DEFAULT_FAILURE_DIR, self.logger, self.io_worker)
+        self.template_cache = TemplateCache(self.logger)
+        # 同一时刻的各次检查共用一次截图（截图写入复用的缓冲区，各步骤取只读视图）
+        self.frames = FrameProvider(self.backend, logger=self.logger)
+        # 多变体模板库（启动时一次性加载），步骤有多个变体时与全部变体比较，并统计各变体的命中次数
+        self.template_store = TemplateStore(DEFAULT_STORE_FILE, self.logger).load()
+        self.variant_hits = Counter()
+        # 界面等待参数：单步最长等待、轮询间隔及退避
+        self.step_timeout = 6.0
+        self.poll_interval = 0.2
+        self.poll_backoff = 1.5
+        self.max_poll_interval = 1.0
+        self.settle_delay = 0.3
+        # 限速：配置文件、额度状态文件、代码中覆盖的配置项，操作间隔也由限速配置决定
+        self.rate_limits_path = DEFAULT_RATE_FILE
+        self.rate_state_path = DEFAULT_STATE_FILE
+        self.rate_limits = None
+        self.scheduler = None
+        # 分级判定：缩略图上界低于阈值时直接判定不匹配，并统计各层级的判定次数
+        self.tiered_verify = True
+        self.verify_tiers = Counter()
+        # 模板定位：在记录位置附近多少像素内搜索界面（0表示只比较记录位置），
+        # 以及上一次匹配到的窗口偏移和实际匹配位置
+        self.locate_radius = 0
+        self.window_offset = (0, 0)
+        self.matched_point = None
+        # 切换到本窗口的回调（多窗口处理时设置），每次截图、点击和输入前调用
+        self.activate = None
+        # 上一次匹配时估计的界面就绪时间（time.monotonic）和截图次数，用于统计界面响应时间
+        self.matched_at = None
+        self.match_polls = 0
+        # 学习到的步骤等待时间：样本文件（为空时不学习）、等待时间取响应时间的百分位数
+        self.wait_profile_path = DEFAULT_PROFILE_FILE
+        self.wait_percentile = 50
+        self.wait_profile = None
+        # 粘贴前和按键前模拟手动输入的随机延迟范围
+        self.typing_delay_range = (0.5, 1.5)
+        self.key_delay_range = (0.3, 0.8)
+        # 输入输出文件
+        self.excel_path = 'phone.xlsx'
+        self.coordinates_path = 'coordinates.json'
+        self.steps_path = DEFAULT_SPEC_FILE
+        # 每处理多少行导出一次Excel检查点
+        self.checkpoint_interval = 50
+        # 本次最多处理的行数（不含无效手机号），为空时处理全部
+        self.max_rows = None
+        # 所有运行中已成功添加过的手机号索引，为空时不检查
+        self.phone_index_path = DEFAULT_INDEX_FILE
+        self.phone_index = None
+        self.journal = None
+        self.pipeline = None
+        # 共享任务队列数据库路径，设置后从队列领取手机号（多台电脑同时处理），每批领取queue_batch_size条
+        self.queue_path = None
+        self.queue_batch_size = 10
+        self.queue = None
+        # 运行统计导出文件，.prom结尾时导出Prometheus文本格式
+        self.metrics_path = 'metrics.json'
+        self.metrics = None
+        # 本次运行按状态累计的计数器，以及是否在终端显示实时面板（每dashboard_interval秒重绘）
+        self.counters = RunCounters()
+        self.dashboard_enabled = False
+        self.dashboard_interval = 1.0
+        self.dashboard = None
+        # 自愈：连续failure_threshold次失败后自动恢复界面并重试当前行（每行最多row_retries次），
+        # 恢复动作都无效或连续失败达到escalate_after次时暂停等待人工处理，
+        # 暂停期间每隔escalation_retry_interval秒再尝试自动恢复一次（为空时不再尝试）
+        self.failure_threshold = 2
+        self.row_retries = 1
+        self.escalate_after = 6
+        self.escalation_retry_interval = 300.0
+        # 自动恢复时切换窗口焦点使用的窗口标题（为空时跳过该动作）
+        self.window_title = None
+        self.recovery = None
+        # 相似度计算参数（通道权重、局部区域划分、全局/局部权重）
+        self.similarity_options = {
+            'channel_weights': DEFAULT_CHANNEL_WEIGHTS,
+            'grid': DEFAULT_GRID,
+            'global_weight': DEFAULT_GLOBAL_WEIGHT,
+            'local_weight': DEFAULT_LOCAL_WEIGHT,
+        }
+        self.mouse_recorder = MouseRecorder(self.logger, self.template_cache, self.backend,
+                                            template_store=self.template_store)
+        
+    def _setup_logging(self, logger=None):
+        """设置日志，传入logger时直接复用（多窗口时共用同一个日志文件）"""
+        if logger is not None:
+            self.logger = logger
+            return
+        
+        # 创建logger
+        self.logger = logging.getLogger('mouse_automation')
+        self.logger.setLevel(logging.INFO)
+        
+        # 创建按日期命名的日志文件
+        log_filename = f'automation_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+        file_handler = logging.FileHandler(log_filename, encoding='utf-8')
+        
+        # 设置日志格式
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        file_handler.setFormatter(formatter)
+        
+        # 日志先放入队列，由后台线程写入文件
+        self.log_listener = start_log_listener(self.logger, [file_handler])
+        
+        self.logger.info("程序启动")
+
+    def record_coordinates(self, total_steps: int = None):
+        """记录鼠标坐标的模块"""
+        coordinates = self.mouse_recorder.record(total_steps)
+        if coordinates:
+            self.mouse_recorder.save_to_file(self.coordinates_path)
+        return True
+
+    def _precheck(self, excel_path: str) -> set:
+        """开始处理前一次性检查整个手机号文件，无效、重复和已添加过的号码直接记录状态，不进入界面流程
+        Returns:
+            已记录状态的行号
+        """
+        started = time.perf_counter()
+        rows = precheck(excel_path, self.journal.pending, self.phone_index)
+        for index, phone, status in rows:
+            self.journal.record(index, phone, status)
+            self.counters.record(status)
+        counts = Counter(row.status for row in rows)
+        message = (f"预检查完成（{time.perf_counter() - started:.1f}秒）：无效号码 {counts[INVALID_STATUS]} 条，"
+                   f"文件中重复 {counts[DUPLICATE_STATUS]} 条，已添加过 {counts[ADDED_STATUS]} 条")
+        print(message)
+        self.logger.info(message)
+        return {row.index for row in rows}
+
+    def _capture_region(self, x: int, y: int, size: tuple[int, int] = (80, 50)) -> np.ndarray:
+        """截取以点击位置为中心、与模板同样大小的区域（记录时为80x50，显示缩放不同时随模板缩放）
+        Returns:
+            RGB数组，为共享截图的只读视图，下一次截图前有效
+        """
+        width, height = size
+        left = max(0, x - width // 2)
+        top = max(0, y - height // 2)
+        return self.frames.crop(left, top, width, height)
+
+    def _capture_step(self, x: int, y: int, template) -> tuple[np.ndarray, tuple[int, int]]:
+        """截取步骤区域；开启定位时在记录位置附近搜索模板，返回最佳位置的截图和校正后的点击坐标
+        Args:
+            x: 记录的点击x坐标
+            y: 记录的点击y坐标
+            template: 模板缓存项
+        Returns:
+            (与模板同尺寸的RGB截图数组, 校正后的点击坐标)
+        """
+        if self.locate_radius <= 0:
+            return self._capture_region(x, y, template.size), (x, y)
+
+        width, height = template.size
+        radius = self.locate_radius
+        expected_left = max(0, x - width // 2)
+        expected_top = max(0, y - height // 2)
+        # 以上一次匹配到的窗口偏移为搜索中心
+        offset_x, offset_y = self.window_offset
+        left = max(0, expected_left + offset_x - radius)
+        top = max(0, expected_top + offset_y - radius)
+        region_array = self.frames.crop(left, top, width + 2 * radius, height + 2 * radius)
+
+        dy, dx, _ = locate(to_gray(region_array), template.gray)
+        crop = region_array[dy:dy + height, dx:dx + width]
+        return crop, (x + left + dx - expected_left, y + top + dy - expected_top)
+
+    def check_template(self, step: Dict, threshold: float = 0.6, step_name: str = "") -> Dict:
+        """对步骤区域截图一次并与模板比较
+        Args:
+            step: 步骤坐标配置，包含x、y、template和可选的模板缩放比例scale
+            threshold: 匹配阈值，默认0.6
+            step_name: 步骤名称，用于统计和日志
+        Returns:
+            比较结果，包含matched、final、global、min_local、tier、frame、point，
+            以及最接近的模板变体序号variant（没有多变体模板时为None）；
+            模板不存在或图片大小不匹配时返回None
+        """
+        x, y, template_path = step['x'], step['y'], step['template']
+        scale = step.get('scale', 1.0)
+
+        # 从缓存获取模板（已缩放到当前屏幕），文件变化时自动重新加载
+        template = self.template_cache.get(template_path, scale)
+        if template is None:
+            self.logger.error(f"模板文件不存在: {template_path}")
+            print(f"模板文件不存在: {template_path}")
+            return None
+
+        capture_started = time.perf_counter()
+        screenshot_array, point = self._capture_step(x, y, template)
+        self._observe(step_name, 'capture', time.perf_counter() - capture_started)
+
+        # 确保图片大小一致
+        if screenshot_array.shape != template.rgb.shape:
+            current_size = (screenshot_array.shape[1], screenshot_array.shape[0])
+            self.logger.error(f"图片大小不匹配: 当前{current_size} vs 模板{template.size}")
+            print(f"图片大小不匹配: 当前{current_size} vs 模板{template.size}")
+            return None
+
+        variants = self.template_store.get(step_name, scale) if self.template_store is not None and step_name else None
+        if variants is not None and variants.shape != screenshot_array.shape:
+            self.logger.warning(f"{step_name} 模板变体大小{variants.shape}与截图不一致，只比较模板图片")
+            variants = None
+
+        # 先比较缩略图，明显不匹配时直接判定，否则完整计算全局和16个局部区域相似度；
+        # 有多个变体时在一次向量化计算中与全部变体比较
+        score_started = time.perf_counter()
+        grid = self.similarity_options['grid']
+        variant = None
+        if variants is not None and self.tiered_verify:
+            matched, tier, final_similarity, similarity, min_local_similarity, variant = tiered_score_variants(
+                screenshot_array, variants.images_i16, variants.means(grid),
+                threshold, **self.similarity_options)
+        elif self.tiered_verify:
+            matched, tier, final_similarity, similarity, min_local_similarity = tiered_score(
+                screenshot_array, template.rgb_i16, template.means(grid),
+                threshold, **self.similarity_options)
+        else:
+            final_similarity, similarity, min_local_similarity, variant = self._full_score(screenshot_array, template, variants)
+            matched, tier = final_similarity >= threshold, TIER_FULL
+        self._observe(step_name, 'score', time.perf_counter() - score_started)
+        self.verify_tiers[tier] += 1
+        self.logger.debug(f"{step_name} 判定层级: {tier}，相似度: {final_similarity:.4f}")
+        if matched and variant is not None:
+            self.variant_hits[f'{step_name}:{variants.label(variant)}'] += 1
+            self.logger.debug(f"{step_name} 匹配模板变体: {variants.label(variant)}")
+
+        if matched:
+            if point != (x, y):
+                print(f"界面位置偏移 {point[0] - x:+d}, {point[1] - y:+d}，点击坐标已校正")
+                self.logger.info(f"{step_name} 界面位置偏移 ({point[0] - x:+d}, {point[1] - y:+d})")
+            self.window_offset = (point[0] - x, point[1] - y)
+            self.matched_point = point
+
+        return {
+            'matched': matched,
+            'final': final_similarity,
+            'global': similarity,
+            'min_local': min_local_similarity,
+            'tier': tier,
+            'frame': screenshot_array,
+            'point': point,
+            'variant': variant,
+            'template': template,
+            'variants': variants,
+        }
+
+    def _full_score(self, frame: np.ndarray, template, variants) -> tuple:
+        """完整计算全局和局部相似度，有多变体模板时取最接近的变体
+        Returns:
+            (最终相似度, 全局相似度, 最低局部相似度, 变体序号或None)
+        """
+        if variants is None:
+            return (*score(frame, template.rgb_i16, **self.similarity_options), None)
+        result = score_variants(frame, variants.images_i16, **self.similarity_options)
+        variant = int(np.argmax(result.final))
+        return float(result.final[variant]), float(result.global_[variant]), float(result.min_local[variant]), variant
+
+    def save_failure(self, step: Dict, check: Dict, threshold: float, step_name: str, phone: str, attempts: int, waited: float) -> str:
+        """将匹配失败时的最后一次截图保存到失败截图库并记录详细信息
+        Returns:
+            失败记录的位置（截图库目录#编号），没有截图时返回空字符串
+        """
+        if check is None:
+            print("模板匹配失败，最终相似度: 0.0000")
+            return ""
+        if check['tier'] != TIER_FULL:
+            # 缩略图层级判定时只有相似度上界，保存前完整计算一次；tier仍记录当时的判定层级
+            final, similarity, min_local, _ = self._full_score(check['frame'], check['template'], check['variants'])
+            check = dict(check, **{'final': final, 'global': similarity, 'min_local': min_local})
+        print(f"模板匹配失败，最终相似度: {check['final']:.4f}")
+
+        record = self.failure_store.add(check['frame'], step_name, phone, check['final'], threshold=threshold,
+                                        global_score=check['global'], min_local=check['min_local'], tier=check['tier'])
+        debug_path = f"{self.failure_store.directory}#{record['id']}"
+        if record['duplicate']:
+            print(f"失败截图与#{record['frame']}相同，已记录为{debug_path}")
+        else:
+            print(f"失败截图已保存至: {debug_path}")
+
+        # 记录详细的匹配信息到日志文件
+        self.logger.debug(f"""模板匹配详细信息:
+            模板文件: {os.path.basename(step['template'])}
+            当前位置: ({step['x']}, {step['y']})
+            全局相似度: {check['global']:.4f}
+            最低局部相似度: {check['min_local']:.4f}
+            最终相似度: {check['final']:.4f}
+            判定层级: {check['tier']}
+            匹配阈值: {threshold}
+            轮询次数: {attempts}
+            等待时长: {waited:.1f}秒
+        """)
+        return debug_path
+
+    def wait_for_template(self, step: Dict, timeout: float = None, poll_interval: float = None, threshold: float = 0.6, step_name: str = "", phone: str = "") -> tuple[bool, str]:
+        """轮询步骤区域，界面与模板匹配后立即返回（参数和返回值同iter_wait_for_template）"""
+        return run_blocking(self.iter_wait_for_template(step, timeout, poll_interval, threshold, step_name, phone))
+
+    def iter_wait_for_template(self, step: Dict, timeout: float = None, poll_interval: float = None, threshold: float = 0.6,
+                               step_name: str = "", phone: str = "") -> Generator[float, None, tuple[bool, str]]:
+        """轮询步骤区域，界面与模板匹配后立即返回；两次截图之间让出控制权并给出等待秒数
+        Args:
+            step: 步骤坐标配置，包含x、y和template
+            timeout: 最长等待秒数，默认使用self.step_timeout
+            poll_interval: 初始轮询间隔秒数，之后按退避系数递增
+            threshold: 匹配阈值，默认0.6
+            step_name: 步骤名称，用于保存失败截图
+            phone: 手机号，用于保存失败截图
+        Returns:
+            (是否匹配, 失败时的截图路径)，匹配成功时实际匹配位置保存在self.matched_point
+        """
+        timeout = self.step_timeout if timeout is None else timeout
+        interval = self.poll_interval if poll_interval is None else poll_interval
+        deadline = time.monotonic() + timeout
+        attempts = 0
+        last_check = None
+        # 上一次截图未匹配的时间，界面就绪时间按两次截图的中点估计
+        missed_at = None
+        self.matched_point = (step['x'], step['y'])
+
+        while True:
+            attempts += 1
+            try:
+                self._activate()
+                check = self.check_template(step, threshold, step_name)
+                if check is None:
+                    return False, ""
+                last_check = check
+                checked_at = time.monotonic()
+                if check['matched']:
+                    self.matched_at = checked_at if missed_at is None else (missed_at + checked_at) / 2
+                    self.match_polls = attempts
+                    print(f"模板匹配成功，相似度: {check['final']:.4f}，轮询 {attempts} 次")
+                    return True, ""
+                missed_at = checked_at
+            except Exception as e:
+                self.logger.error(f"模板验证失败: {e}")
+                print(f"模板验证失败: {e}")
+                print(f"错误类型: {type(e)}")
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            self.frames.next_tick()
+            yield min(interval, remaining)
+            interval = min(interval * self.poll_backoff, self.max_poll_interval)
+
+        debug_path = self.save_failure(step, last_check, threshold, step_name, phone, attempts, timeout)
+        return False, debug_path
+
+    def _verify_template(self, x: int, y: int, template_path: str, threshold: float = 0.6, max_retries: int = 2, step_name: str = "", phone: str = "") -> tuple[bool, str]:
+        """验证当前位置与模板是否匹配（兼容旧接口，基于wait_for_template实现）
+        Args:
+            x: 点击位置的x坐标
+            y: 点击位置的y坐标
+            template_path: 模板图片路径
+            threshold: 匹配阈值，默认0.6
+            max_retries: 最大重试次数，每次重试对应3秒等待
+            step_name: 步骤名称，用于保存失败截图
+            phone: 手机号，用于保存失败截图
+        Returns:
+            (是否匹配, 失败时的截图路径)
+        """
+        step = {'x': x, 'y': y, 'template': template_path}
+        return self.wait_for_template(step, timeout=3 * max(0, max_retries - 1), threshold=threshold, step_name=step_name, phone=phone)
+
+    def _wait_for_step(self, step: Dict, step_name: str, phone: str, timeout: float = None, threshold: float = 0.6) -> tuple[bool, str]:
+        """等待步骤界面就绪，随机操作间隔只作为最短等待时间而不叠加在轮询之上"""
+        return run_blocking(self.iter_wait_for_step(step, step_name, phone, timeout, threshold))
+
+    def iter_wait_for_step(self, step: Dict, step_name: str, phone: str, timeout: float = None,
+                           threshold: float = 0.6) -> Generator[float, None, tuple[bool, str]]:
+        """_wait_for_step的生成器版本，需要等待时让出控制权"""
+        floor = self.scheduler.action_gap() if self.scheduler is not None else 0.0
+        started = time.monotonic()
+        print(f"等待界面就绪（最短 {floor:.1f} 秒）...")
+        success, debug_path = yield from self.iter_wait_for_template(step, timeout=timeout, threshold=threshold, step_name=step_name, phone=phone)
+        if success:
+            remaining = floor - (time.monotonic() - started)
+            if remaining > 0:
+                yield remaining
+                self._observe(step_name, 'jitter', remaining)
+        return success, debug_path
+
+    def _activate(self):
+        """多窗口时切换到本窗口"""
+        if self.activate is not None:
+            self.activate()
+
+    def _observe(self, step_name: str, phase: str, seconds: float):
+        """记录分步骤耗时"""
+        if self.metrics is not None:
+            self.metrics.observe(step_name, phase, seconds)
+
+    def click(self, x: int, y: int):
+        """点击指定坐标"""
+        self._activate()
+        self.backend.click(x, y)
+        self.frames.invalidate()
+
+    def paste_text(self, text: str):
+        """通过剪贴板粘贴文本"""
+        run_blocking(self.iter_paste_text(text))
+
+    def iter_paste_text(self, text: str) -> Generator[float, None, None]:
+        """先模拟手动输入的随机延迟，再复制并粘贴；复制和粘贴之间不让出控制权，其他窗口不会改动剪贴板"""
+        yield random.uniform(*self.typing_delay_range)
+        self._activate()
+        self.backend.copy(text)
+        self.backend.hotkey('ctrl', 'v')
+        self.frames.invalidate()
+
+    def press_key(self, key: str):
+        """按下指定按键"""
+        self._activate()
+        self.backend.press(key)
+        self.frames.invalidate()
+
+    def score_frames(self, frames, template_path: str):
+        """批量计算多张截图与模板的相似度，用于重试和离线调参
+        Args:
+            frames: (N, H, W, 3) 的RGB截图数组或截图列表
+            template_path: 模板图片路径
+        Returns:
+            SimilarityResult，模板不存在时返回None
+        """
+        template = self.template_cache.get(template_path)
+        if template is None:
+            return None
+        frames = np.stack([np.asarray(frame.convert('RGB') if hasattr(frame, 'convert') else frame) for frame in frames])
+        return score_batch(frames, template.rgb_i16, **self.similarity_options)
+
+    def _print_summary(self, counts: Dict[str, int], title: str = "自动化处理结果统计", skipped_label: str = "未处理数"):
+        """打印自动化处理结果统计
+        Args:
+            counts: 各状态的数量，字段与phone_source.summarize一致
+            title: 标题
+            skipped_label: skipped项的名称（本次运行的计数中为跳过的已有状态的行，任务队列中为未处理的行）
+        """
+        print(f"\n{title}")
+        print("=" * 50)
+        
+        total_records = counts['total']
+        processed = counts['processed']
+        failed = counts['failed']
+        invalid = counts['invalid']
+        duplicate = counts['duplicate']
+        error = counts['error']
+        skipped = counts['skipped']
+        
+        # 计算成功率
+        success_rate = (processed / total_records * 100) if total_records > 0 else 0
+        
+        # 打印统计结果
+        print(f"总记录数: {total_records}")
+        print(f"处理成功: {processed} ({success_rate:.1f}%)")
+        print(f"添加失败: {failed}")
+        print(f"无效号码: {invalid}")
+        print(f"重复号码: {duplicate}")
+        print(f"发生错误: {error}")
+        print(f"{skipped_label}: {skipped}")
+        print("=" * 50)
+        
+        # 记录到日志
+        self.logger.info(f"""{title}:
+            总记录数: {total_records}
+            处理成功: {processed} ({success_rate:.1f}%)
+            添加失败: {failed}
+            无效号码: {invalid}
+            重复号码: {duplicate}
+            发生错误: {error}
+            {skipped_label}: {skipped}
+        """)
+
+    def _set_status(self, index: int, phone, status: str, **fields):
+        """将行状态立即追加到进度日志，队列模式下写入任务队列"""
+        self.counters.record(status)
+        if self.queue is not None:
+            self.queue.complete(index, status)
+            return
+        self.journal.record(index, phone, status, **fields)
+
+    def _checkpoint(self, excel_path: str):
+        """在后台线程中原子地导出Excel检查点"""
+        if self.journal is None or not self.journal.has_pending():
+            return
+        self.io_worker.submit(self._write_checkpoint, excel_path, self.journal.snapshot())
+
+    def _write_checkpoint(self, excel_path: str, statuses: Dict[int, str]):
+        """导出Excel检查点，成功后从进度日志中移除已导出的记录"""
+        try:
+            write_checkpoint(excel_path, statuses)
+            self.journal.compact(statuses)
+            print("进度已保存到Excel文件")
+            self.logger.info("进度已保存到Excel文件")
+        except Exception as e:
+            print(f"保存Excel文件失败，进度仍保留在日志中: {e}")
+            self.logger.error(f"保存Excel文件失败，进度仍保留在日志中: {e}")
+
+    def _save_wait_profile(self):
+        """在后台线程中保存界面响应时间样本"""
+        if self.wait_profile is not None:
+            self.io_worker.submit(self.wait_profile.save, self.wait_profile.snapshot())
+
+    def _close_queue(self) -> Dict[str, int]:
+        """归还未处理完的租约并关闭任务队列
+        Returns:
+            队列中各状态的数量，未使用队列或统计失败时返回None
+        """
+        if self.queue is None:
+            return None
+        counts = None
+        if self.queue.failed_writes:
+            self.logger.warning(f"{self.queue.failed_writes} 行的状态未能写入任务队列，这些行将在租约过期后被重新领取")
+        try:
+            self.queue.release()
+            counts = self.queue.summarize()
+        except Exception as e:
+            self.logger.warning(f"释放任务队列租约失败，租约将在过期后自动归还: {e}")
+        self.queue.close()
+        self.queue = None
+        return counts
+
+    def create_scheduler(self) -> RateScheduler:
+        """根据限速配置文件和rate_limits覆盖项创建限速器"""
+        limits = load_rate_limits(self.rate_limits_path, self.logger)
+        limits.update(self.rate_limits or {})
+        return RateScheduler(limits, self.rate_state_path, self.logger, self.io_worker)
+
+    def automate_process(self):
+        """自动化处理模块
+        Returns:
+            是否开始了处理，手机号文件、坐标文件或步骤配置无法加载时返回False
+        """
+        print("\n开始自动化处理...")
+        self.logger.info("开始自动化处理")
+        
+        # 本次运行的计数器（含连续失败次数）
+        self.counters = RunCounters()
+        
+        excel_path = self.excel_path
+        rows_since_checkpoint = 0
+        rows_started = 0
+        skipped_seen = 0
+        self.phone_index = PhoneIndex(self.phone_index_path, self.logger, self.io_worker).load() if self.phone_index_path else None
+        
+        if self.queue_path:
+            # 从共享任务队列逐批领取，状态直接写回队列
+            try:
+                self.queue = WorkQueue(self.queue_path, logger=self.logger)
+            except Exception as e:
+                error_msg = f"打开任务队列失败: {e}"
+                print(error_msg)
+                self.logger.error(error_msg)
+                return False
+            total_rows = self.queue.summarize()['skipped']
+            source = self.queue.rows(self.queue_batch_size)
+            print(f"使用共享任务队列 {self.queue_path}，待处理 {total_rows} 条")
+            self.logger.info(f"使用共享任务队列 {self.queue_path}，持有者 {self.queue.owner}，待处理 {total_rows} 条")
+        else:
+            # 回放上次中断前的进度日志，手机号文件按行流式读取
+            if not os.path.exists(excel_path):
+                error_msg = f"加载Excel文件失败: 未找到文件 {excel_path}"
+                print(error_msg)
+                self.logger.error(error_msg)
+                return False
+            self.journal = ProgressJournal(journal_path_for(excel_path), self.logger, self.io_worker)
+            replayed = self.journal.replay()
+            if replayed:
+                print(f"已从进度日志恢复 {len(replayed)} 条记录的状态")
+                self.logger.info(f"已从进度日志恢复 {len(replayed)} 条记录的状态")
+            source = None
+            total_rows = estimate_rows(excel_path)
+
+        print("正在加载坐标文件...")
+        coordinates = self.mouse_recorder.load_from_file(self.coordinates_path)
+        
+        if not coordinates:
+            self.logger.warning("未找到坐标文件或坐标文件为空")
+            print("未找到坐标文件或坐标文件为空，请先记录坐标")
+            self._close_queue()
+            return False
+            
+        # 根据坐标文件和步骤配置生成执行流程
+        try:
+            display = DisplayGeometry.from_backend(self.backend, self.logger)
+            steps = load_step_specs(coordinates, self.steps_path, logger=self.logger, display=display)
+        except Exception as e:
+            error_msg = f"加载步骤配置失败: {e}"
+            print(error_msg)
+            self.logger.error(error_msg)
+            self._close_queue()
+            return False
+        self.pipeline = StepPipeline(steps, self, self.logger)
+        refocus = (lambda: self.backend.focus_window(self.window_title)) if self.window_title else None
+        self.recovery = Recovery(self, steps, self.logger, refocus)
+        
+        # 分步骤耗时和吞吐量统计
+        self.metrics = RunMetrics(self.metrics_path, logger=self.logger)
+        if self.queue is not None:
+            # 队列模式下行号是队列中的全局行号，按待处理数量和已处理数量估算剩余时间
+            self.metrics.pending_rows = total_rows
+        else:
+            self.metrics.total_rows = total_rows
+        self.pipeline.add_hook(self.metrics.observe)
+
+        # 按本机界面的实际响应时间决定步骤之间的等待
+        if self.wait_profile_path:
+            self.wait_profile = WaitProfile(self.wait_profile_path, self.wait_percentile, logger=self.logger).load()
+            self.pipeline.wait_profile = self.wait_profile
+
+        # 每行开始前申请许可，在限额内尽快处理
+        self.scheduler = self.create_scheduler()
+        
+        print(f"成功加载坐标文件，共 {len(coordinates)} 个坐标点")
+        self.logger.info(f"成功加载坐标文件，共 {len(coordinates)} 个坐标点")
+        
+        # 预加载模板图片，避免在处理循环中重复读取和解码
+        loaded = self.template_cache.preload((step.template, step.scale) for step in steps)
+        self.logger.info(f"已预加载 {loaded} 个模板图片")
+        
+        prechecked = set()
+        if source is None:
+            try:
+                prechecked = self._precheck(excel_path)
+            except Exception as e:
+                error_msg = f"预检查手机号文件失败: {e}"
+                print(error_msg)
+                self.logger.error(error_msg)
+                self.io_worker.flush()
+                self.journal.close()
+                return False
+            # 预检查过的行在处理循环中跳过，跳过数只统计开始前已有状态的行
+            done = {index: status for index, status in self.journal.pending.items() if index not in prechecked}
+            source = PhoneSource(excel_path, done=done, logger=self.logger)
+
+        # 注册快捷键
+        self.backend.add_hotkey('ctrl+f1', self._toggle_pause)
+        self.backend.add_hotkey('ctrl+f2', self._stop)
+        
+        self.running = True
+        if self.queue is not None:
+            self.queue.start_heartbeat()
+        print("\n开始自动化处理，按Ctrl+F1暂停/继续，按Ctrl+F2结束")
+        print("=" * 50)
+        if self.dashboard_enabled:
+            # 面板在后台线程中重绘，处理过程中的输出显示在面板下方
+            self.dashboard = Dashboard(self.counters, self.metrics, self.dashboard_interval)
+            if not self.dashboard.start():
+                self.dashboard = None
+
+        try:
+            # 已有状态的行在读取时即被跳过
+            for index, phone, _ in source:
+                if not self.running:
+                    print("\n检测到停止信号，结束处理")
+                    self.logger.info("检测到停止信号，结束处理")
+                    break
+                self.counters.skipped += getattr(source, 'skipped', 0) - skipped_seen
+                skipped_seen = getattr(source, 'skipped', 0)
+                if index in prechecked:
+                    continue
+
+                # 清洗并验证手机号（队列模式下没有预检查）
+                normalized = normalize_phone(phone)
+                if normalized is None:
+                    print(f"无效的手机号: {phone}")
+                    self.logger.warning(f"无效的手机号: {phone}")
+                    self._set_status(index, phone, INVALID_STATUS)
+                    continue
+                if self.phone_index is not None and self.phone_index.contains(normalized):
+                    print(f"手机号已添加过: {normalized}")
+                    self.logger.info(f"手机号已添加过: {normalized}")
+                    self._set_status(index, phone, ADDED_STATUS)
+                    continue
+                phone = normalized
+
+                if self.max_rows is not None and rows_started >= self.max_rows:
+                    print(f"\n已达到本次处理上限 {self.max_rows} 条，结束处理")
+                    self.logger.info(f"已达到本次处理上限 {self.max_rows} 条，结束处理")
+                    break
+
+                while self.paused:
+                    time.sleep(0.1)
+
+                if not self.scheduler.wait(lambda: self.running):
+                    print("\n检测到停止信号，结束处理")
+                    self.logger.info("检测到停止信号，结束处理")
+                    break
+                # 暂停和限速等待期间界面可能变化
+                self.frames.next_tick()
+
+                rows_started += 1
+                self.counters.current_row = index
+                self.counters.current_phone = phone
+                row_started = time.perf_counter()
+                row_success = False
+                try:
+                    print(f"\n正在处理第 {index + 1} 条记录，手机号: {phone}")
+                    self.logger.info(f"开始处理第 {index + 1} 条记录，手机号: {phone}")
+                    
+                    outcome = self.pipeline.run(str(phone))
+                    retries = 0
+                    while True:
+                        # 任一步骤验证通过即重置连续失败计数器
+                        if outcome.completed:
+                            self.counters.consecutive_failures = 0
+                        if outcome.success:
+                            break
+                        step = outcome.failed_step
+                        error_msg = f"步骤{step.index}验证失败：界面不匹配 {outcome.debug_path}"
+                        print(error_msg)
+                        self.logger.error(error_msg)
+                        self.counters.consecutive_failures += 1
+
+                        # 连续失败说明界面可能异常，恢复后重试当前行
+                        if self.counters.consecutive_failures < self.failure_threshold or retries >= self.row_retries:
+                            break
+                        if not self._recover():
+                            break
+                        retries += 1
+                        print(f"\n重试第 {index + 1} 条记录，手机号: {phone}")
+                        self.logger.info(f"重试第 {index + 1} 条记录，手机号: {phone}")
+                        outcome = self.pipeline.run(str(phone))
+
+                    if not outcome.success:
+                        self._set_status(index, phone, '添加失败')
+                    else:
+                        print(f"手机号 {phone} 处理完成")
+                        self.logger.info(f"手机号 {phone} 处理完成")
+                        self._set_status(index, phone, '已处理')
+                        if self.phone_index is not None:
+                            self.phone_index.add(phone)
+                        row_success = True
+
+                except Exception as e:
+                    error_msg = f"处理手机号 {phone} 时出错: {e}"
+                    print(error_msg)
+                    self.logger.error(error_msg)
+                    self._set_status(index, phone, f'错误: {str(e)}')
+
+                self.scheduler.record_result(row_success)
+
+                self.metrics.row_finished(index, time.perf_counter() - row_started)
+                self.metrics.maybe_export(self.io_worker)
+
+                # 进度已逐行写入日志，定期导出Excel检查点
+                rows_since_checkpoint += 1
+                if rows_since_checkpoint >= self.checkpoint_interval:
+                    self._checkpoint(excel_path)
+                    self._save_wait_profile()
+                    rows_since_checkpoint = 0
+                print("-" * 50)
+
+        except Exception as e:
+            error_msg = f"自动化处理出错: {e}"
+            print(error_msg)
+            self.logger.error(error_msg)
+        finally:
+            # 先停止面板，之后的输出直接显示在终端
+            if self.dashboard is not None:
+                self.dashboard.stop()
+                self.dashboard = None
+            # 清理快捷键
+            self.backend.unhook_all()
+            if self.queue is not None:
+                counts = self._close_queue()
+            else:
+                # 先结束读取（删除手机号文件的临时副本），再导出最终检查点并等待后台写入全部完成
+                counts = None
+                source.close()
+                self._checkpoint(excel_path)
+                self.io_worker.flush()
+                self.journal.close()
+                self.counters.skipped += source.skipped - skipped_seen
+                print(f"跳过已处理的记录 {self.counters.skipped} 条")
+                self.logger.info(f"跳过已处理的记录 {self.counters.skipped} 条")
+            print("\n自动化处理完成")
+            self.logger.info("自动化处理完成")
+            self.logger.info(f"模板缓存统计: {self.template_cache.stats()}")
+            self.logger.info(f"截图统计: {self.frames.stats()}")
+            self.logger.info(f"模板判定层级统计: {dict(self.verify_tiers)}")
+            if self.variant_hits:
+                self.logger.info(f"模板变体命中统计: {dict(self.variant_hits)}")
+            if self.scheduler is not None:
+                self.logger.info(f"限速额度统计: {self.scheduler.stats()}")
+            if self.recovery is not None and self.recovery.attempts:
+                self.logger.info(f"自动恢复统计: {self.recovery.stats()}")
+            if self.phone_index is not None:
+                self.io_worker.submit(self.phone_index.compact)
+            if self.failure_store.saved or self.failure_store.deduplicated:
+                self.logger.info(f"失败截图统计: {self.failure_store.stats()}")
+            self.io_worker.submit(self.failure_store.prune)
+            if self.wait_profile is not None:
+                self._save_wait_profile()
+                self.logger.info(f"界面响应时间统计: {self.wait_profile.stats()}")
+            self.io_worker.flush()
+            self.logger.info(f"后台写入统计: {self.io_worker.stats()}")
+            try:
+                self.metrics.export()
+                summary = self.metrics.format_summary()
+                print(summary)
+                self.logger.info(f"运行统计:\n{summary}")
+            except Exception as e:
+                self.logger.warning(f"导出运行统计失败: {e}")
+            print("=" * 50)
+            
+            # 打印处理结果统计：本次运行的计数，队列模式下另外打印整个队列的进度
+            self._print_summary(self.counters.as_dict(), "本次运行统计", "跳过已有状态")
+            if counts is not None:
+                self._print_summary(counts, "任务队列统计")
+            
+            return True
+
+    def _recover(self) -> bool:
+        """连续失败后自动恢复界面，恢复动作都无效时暂停等待人工处理
+        Returns:
+            是否重试当前行（第一步界面本来就已就绪时，失败与号码本身有关，不重试）
+        """
+        failures = self.counters.consecutive_failures
+        if failures >= self.escalate_after:
+            self.logger.warning(f"连续 {failures} 次匹配失败，自动恢复后仍然失败")
+            return self._escalate()
+        print(f"\n检测到连续{failures}次匹配失败，正在自动恢复界面...")
+        self.logger.warning(f"检测到连续{failures}次匹配失败，开始自动恢复")
+        self.counters.state = '自动恢复中'
+        action = self.recovery.recover()
+        self.counters.state = '运行中'
+        if action == NO_ACTION:
+            print("第一步界面已就绪，继续处理下一条记录")
+            self.counters.consecutive_failures = 0
+            return False
+        if action is not None:
+            print(f"界面已恢复（{action}）")
+            return True
+        return self._escalate()
+
+    def _escalate(self) -> bool:
+        """暂停处理等待人工检查，期间定时再尝试自动恢复
+        Returns:
+            是否继续处理（按Ctrl+F2结束时返回False）
+        """
+        print("\n警告：自动恢复失败！")
+        print("请检查以下可能的问题：")
+        print("1. 微信窗口是否被遮挡或最小化")
+        print("2. 界面是否发生变化")
+        print("3. 坐标点是否需要重新记录")
+        print("\n已暂停处理，检查后按Ctrl+F1继续（重试当前记录），按Ctrl+F2结束")
+        self.logger.warning("自动恢复失败，暂停等待人工处理")
+        self.paused = True
+        self.counters.state = '等待人工处理'
+        started = time.perf_counter()
+        next_retry = time.monotonic() + (self.escalation_retry_interval or 0)
+        while self.paused and self.running:
+            time.sleep(0.1)
+            self.frames.next_tick()
+            if self.escalation_retry_interval and time.monotonic() >= next_retry:
+                # 界面可能已被其他原因恢复（如弹窗超时关闭），恢复后自动继续
+                if self.recovery.recover() is not None:
+                    print("界面已自动恢复，继续处理")
+                    self.logger.info("暂停期间界面已自动恢复，继续处理")
+                    self.paused = False
+                next_retry = time.monotonic() + self.escalation_retry_interval
+        self.metrics.observe('recovery', 'manual', time.perf_counter() - started)
+        self.counters.consecutive_failures = 0
+        self.counters.state = '运行中'
+        return self.running
+
+    def _toggle_pause(self):
+        """暂停/继续自动化处理"""
+        self.paused = not self.paused
+        status = "已暂停" if self.paused else "继续运行"
+        self.counters.state = "已暂停" if self.paused else "运行中"
+        print(status)
+        self.logger.info(status)
+
+    def _stop(self):
+        """停止自动化处理"""
+        self.running = False
+        self.logger.info("程序已停止")
+        print("程序已停止")
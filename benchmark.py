@@ -0,0 +1,259 @@
+"""离线基准测试：在无桌面环境下使用模拟屏幕后端测量热点路径的性能
+
+用法:
+    python benchmark.py [--rows 200] [--templates templates] [--repeat 2000]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+
+from io_worker import IOWorker
+from progress_journal import ProgressJournal
+from phone_source import write_checkpoint
+from screen_backend import FakeScreenBackend
+from similarity import score, score_batch
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    values = np.percentile(np.asarray(samples), (50, 95, 99))
+    return {'p50': float(values[0]), 'p95': float(values[1]), 'p99': float(values[2])}
+
+
+def _template_paths(template_dir: str) -> List[str]:
+    names = sorted(name for name in os.listdir(template_dir) if name.endswith('_template.png'))
+    if not names:
+        raise SystemExit(f"模板目录中没有模板图片: {template_dir}")
+    return [os.path.join(template_dir, name) for name in names]
+
+
+def bench_scoring(template_paths: List[str], repeat: int) -> Dict:
+    """单帧和批量相似度计算的耗时"""
+    templates = [np.array(Image.open(path).convert('RGB')) for path in template_paths]
+    template = templates[0].astype(np.int16)
+    frames = np.stack([templates[i % len(templates)] for i in range(64)])
+
+    samples = []
+    for i in range(repeat):
+        frame = frames[i % len(frames)]
+        started = time.perf_counter()
+        score(frame, template)
+        samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    rounds = max(1, repeat // len(frames))
+    for _ in range(rounds):
+        score_batch(frames, template)
+    batch_elapsed = time.perf_counter() - started
+
+    result = {'single_seconds': _percentiles(samples)}
+    result['batch_frames_per_second'] = rounds * len(frames) / batch_elapsed
+    return result
+
+
+def _prepare_workspace(workdir: str, template_paths: List[str], rows: int) -> List[Dict]:
+    """在临时目录中生成坐标文件、无等待的步骤配置和手机号文件"""
+    from openpyxl import Workbook
+
+    steps = []
+    coordinates = []
+    for i, path in enumerate(template_paths, 1):
+        template = os.path.join(workdir, os.path.basename(path))
+        shutil.copy(path, template)
+        step = {'x': 100 + i * 100, 'y': 300, 'template': template}
+        steps.append(step)
+        coordinates.append({f'step{i}': step})
+    with open(os.path.join(workdir, 'coordinates.json'), 'w') as f:
+        json.dump(coordinates, f)
+
+    spec = {f'step{i}': {} for i in range(1, len(template_paths) + 1)}
+    if 'step2' in spec:
+        spec['step2'] = {'input': '{phone}', 'press_enter': True}
+    with open(os.path.join(workdir, 'steps.json'), 'w') as f:
+        json.dump(spec, f)
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(['序号', '手机号', '状态', '备注'])
+    for i in range(rows):
+        ws.append([i + 1, 13800000000 + i, None, None])
+    wb.save(os.path.join(workdir, 'phone.xlsx'))
+    return steps
+
+
+def bench_run(template_paths: List[str], rows: int) -> Dict:
+    """关闭所有延迟后完整运行automate_process的吞吐量和内存"""
+    from automation import MouseAutomation
+
+    workdir = tempfile.mkdtemp(prefix='wecom_bench_')
+    cwd = os.getcwd()
+    try:
+        steps = _prepare_workspace(workdir, template_paths, rows)
+        os.chdir(workdir)
+        backend = FakeScreenBackend(steps)
+        automation = MouseAutomation(backend)
+        automation.logger.setLevel(logging.WARNING)
+        automation.rate_limits = {'per_minute': 0, 'per_hour': 0, 'per_day': 0, 'action_gap': [0, 0]}
+        automation.rate_state_path = None
+        automation.wait_profile_path = None
+        automation.settle_delay = 0
+        automation.typing_delay_range = (0, 0)
+        automation.key_delay_range = (0, 0)
+        automation.checkpoint_interval = max(rows, 1)
+
+        tracemalloc.start()
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            automation.automate_process()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'rows': rows,
+            'seconds': elapsed,
+            'rows_per_second': rows / elapsed if elapsed > 0 else 0.0,
+            'peak_bytes_per_row': peak / rows if rows else 0.0,
+            'screenshots': backend.screenshots,
+            'screenshots_per_row': backend.screenshots / rows if rows else 0.0,
+            'clicks': len(backend.clicks),
+            'template_cache': automation.template_cache.stats(),
+            'frames': automation.frames.stats(),
+        }
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def bench_capture(template_paths: List[str], repeat: int) -> Dict:
+    """截图的耗时、截图次数和临时内存
+    legacy: 每次检查截图生成图片再转数组；buffered: 每次检查截图写入复用的缓冲区（轮询时的情形）；
+    recovery: 自动恢复时帧差检查和第一步检查在同一轮内共用一次截图
+    """
+    from frame_provider import FrameProvider
+    from recovery import steps_region
+    from step_pipeline import StepSpec
+
+    steps = [StepSpec(i, f'step{i}', 100 + i * 100, 300, path) for i, path in enumerate(template_paths, 1)]
+    backend = FakeScreenBackend([step.target for step in steps])
+    regions = [(step.x - 40, step.y - 25, 80, 50) for step in steps]
+    watched = steps_region(steps)
+
+    def legacy():
+        for region in regions:
+            np.array(backend.screenshot(region=region).convert('RGB'))
+
+    provider = FrameProvider(backend)
+
+    def buffered():
+        for region in regions:
+            provider.next_tick()
+            provider.crop(*region)
+
+    def recovery():
+        provider.next_tick()
+        provider.crop(*watched)
+        provider.crop(*regions[0])
+
+    result = {}
+    for name, tick in (('legacy', legacy), ('buffered', buffered), ('recovery', recovery)):
+        tick()
+        captures = backend.screenshots
+        tracemalloc.start()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            tick()
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result[name] = {
+            'seconds_per_tick': elapsed / repeat,
+            'captures_per_tick': (backend.screenshots - captures) / repeat,
+            'peak_bytes': peak,
+        }
+    result['frames'] = provider.stats()
+    return result
+
+
+def bench_persistence(rows: int) -> Dict:
+    """进度日志追加（同步落盘和后台批量落盘）和检查点导出的耗时"""
+    from openpyxl import Workbook
+
+    workdir = tempfile.mkdtemp(prefix='wecom_bench_')
+    try:
+        journal = ProgressJournal(os.path.join(workdir, 'phone.journal.jsonl'))
+        samples = []
+        with journal:
+            for i in range(rows):
+                started = time.perf_counter()
+                journal.record(i, str(13800000000 + i), '已处理')
+                samples.append(time.perf_counter() - started)
+
+        worker = IOWorker()
+        async_journal = ProgressJournal(os.path.join(workdir, 'async.journal.jsonl'), worker=worker)
+        async_samples = []
+        for i in range(rows):
+            started = time.perf_counter()
+            async_journal.record(i, str(13800000000 + i), '已处理')
+            async_samples.append(time.perf_counter() - started)
+        worker.stop()
+        async_journal.close()
+
+        excel_path = os.path.join(workdir, 'phone.xlsx')
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        ws.append(['序号', '手机号', '状态', '备注'])
+        for i in range(rows):
+            ws.append([i + 1, 13800000000 + i, None, None])
+        wb.save(excel_path)
+
+        started = time.perf_counter()
+        write_checkpoint(excel_path, journal.pending)
+        checkpoint_seconds = time.perf_counter() - started
+        return {
+            'journal_record_seconds': _percentiles(samples),
+            'async_journal_record_seconds': _percentiles(async_samples),
+            'checkpoint_seconds': checkpoint_seconds,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run_benchmarks(template_dir: str = 'templates', rows: int = 200, repeat: int = 2000) -> Dict:
+    template_paths = [os.path.abspath(path) for path in _template_paths(template_dir)]
+    return {
+        'scoring': bench_scoring(template_paths, repeat),
+        'capture': bench_capture(template_paths, repeat),
+        'run': bench_run(template_paths, rows),
+        'persistence': bench_persistence(rows),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='离线基准测试')
+    parser.add_argument('--templates', default='templates', help='模板图片目录')
+    parser.add_argument('--rows', type=int, default=200, help='模拟处理的手机号数量')
+    parser.add_argument('--repeat', type=int, default=2000, help='相似度计算的重复次数')
+    parser.add_argument('--output', help='将结果保存为JSON文件')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.templates, args.rows, args.repeat)
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+if __name__ == '__main__':
+    main()
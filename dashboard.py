@@ -0,0 +1,168 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+# 状态 -> 计数项
+STATUS_FIELDS = {
+    '已处理': 'processed',
+    '添加失败': 'failed',
+    '无效手机号': 'invalid',
+    '重复手机号': 'duplicate',
+    '已添加过': 'duplicate',
+}
+
+# 步骤耗时按流程阶段相加（capture、score是verify的组成部分，不重复计算）
+STEP_PHASES = ('verify', 'click', 'input', 'post_wait')
+
+
+class RunCounters:
+    """本次运行按状态累计的计数器，每行只做O(1)的更新，供实时面板和结束时的统计使用"""
+
+    __slots__ = ('processed', 'failed', 'invalid', 'duplicate', 'error', 'skipped',
+                 'current_row', 'current_phone', 'consecutive_failures', 'state')
+
+    def __init__(self):
+        self.processed = 0
+        self.failed = 0
+        self.invalid = 0
+        self.duplicate = 0
+        self.error = 0
+        # 开始时已有状态而跳过的行
+        self.skipped = 0
+        self.current_row: Optional[int] = None
+        self.current_phone = ''
+        self.consecutive_failures = 0
+        self.state = '运行中'
+
+    def record(self, status: str):
+        """按行状态累加计数"""
+        field = STATUS_FIELDS.get(status)
+        if field is None:
+            field = 'error' if str(status).startswith('错误:') else None
+        if field is not None:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def as_dict(self) -> Dict[str, int]:
+        """与phone_source.summarize字段一致的计数，skipped为跳过的已有状态的行"""
+        counts = {field: getattr(self, field) for field in ('processed', 'failed', 'invalid', 'duplicate', 'error', 'skipped')}
+        counts['total'] = sum(counts.values())
+        return counts
+
+
+class _CapturedOutput:
+    """面板运行期间代替sys.stdout，print的内容只追加到最近输出中，由面板线程统一显示"""
+
+    def __init__(self, lines: deque):
+        self.lines = lines
+        self._partial = ''
+
+    def write(self, text: str) -> int:
+        text = self._partial + text
+        *complete, self._partial = text.split('\n')
+        self.lines.extend(line for line in complete if line.strip())
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+class Dashboard:
+    """在后台线程中按固定频率重绘的终端面板
+
+    处理线程只更新计数器；print的内容被收集到最近输出中，不再直接写终端，
+    重绘（格式化、清屏、写终端）全部在面板线程中完成，不拖慢处理线程。
+    """
+
+    def __init__(self, counters: RunCounters, metrics=None, interval: float = 1.0, log_lines: int = 10, stream=None):
+        """
+        Args:
+            counters: 本次运行的计数器
+            metrics: RunMetrics，提供吞吐量、剩余时间和分步骤耗时
+            interval: 重绘间隔秒数
+            log_lines: 面板下方显示的最近输出行数
+            stream: 输出终端，默认为sys.stdout
+        """
+        self.counters = counters
+        self.metrics = metrics
+        self.interval = interval
+        self.stream = stream or sys.stdout
+        self.lines = deque(maxlen=log_lines)
+        self.renders = 0
+        self._started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+        self._saved_stdout = None
+
+    def start(self) -> bool:
+        """开始重绘，输出不是终端（如计划任务重定向到文件）时不启用
+        Returns:
+            是否已启用
+        """
+        if self._thread is not None or not self.stream.isatty():
+            return False
+        if os.name == 'nt':
+            # 启用Windows控制台的ANSI控制序列
+            os.system('')
+        self._saved_stdout = sys.stdout
+        sys.stdout = _CapturedOutput(self.lines)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='dashboard', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """停止重绘并恢复sys.stdout，最后绘制一次面板"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        sys.stdout = self._saved_stdout
+        self._draw()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._draw()
+
+    def _draw(self):
+        try:
+            # 清屏并回到左上角后整体重绘
+            self.stream.write('\x1b[2J\x1b[H' + self.render() + '\n')
+            self.stream.flush()
+            self.renders += 1
+        except Exception:
+            pass
+
+    def render(self) -> str:
+        """生成面板文本"""
+        c = self.counters
+        elapsed = int(time.monotonic() - self._started)
+        lines = [
+            f"企业微信自动添加客户  {c.state}  已运行 {elapsed // 3600:02d}:{elapsed % 3600 // 60:02d}:{elapsed % 60:02d}"
+            f"  （Ctrl+F1暂停/继续，Ctrl+F2结束）",
+            "=" * 60,
+            f"当前: 第 {c.current_row + 1} 条  手机号 {c.current_phone}" if c.current_row is not None else "当前: 等待开始",
+            f"处理成功 {c.processed}  添加失败 {c.failed}  无效号码 {c.invalid}  重复号码 {c.duplicate}  "
+            f"发生错误 {c.error}  跳过 {c.skipped}",
+            f"连续失败 {c.consecutive_failures} 次",
+        ]
+        if self.metrics is not None:
+            eta = self.metrics.eta_seconds()
+            lines.append(f"吞吐量 {self.metrics.rows_per_hour():.1f} 条/小时  "
+                         f"预计剩余 {'未知' if eta is None else f'{eta / 60:.1f}分钟'}")
+            # 只读取各统计项的累计值（O(1)），不在面板线程中计算百分位数
+            steps: Dict[str, float] = {}
+            for (step, phase), histogram in list(self.metrics.histograms.items()):
+                if phase in STEP_PHASES and histogram.count:
+                    steps[step] = steps.get(step, 0.0) + histogram.total / histogram.count
+            if steps:
+                lines.append("步骤平均耗时: " + "  ".join(f"{step} {seconds:.2f}秒" for step, seconds in sorted(steps.items())))
+        lines.append("-" * 60)
+        lines.extend(self.lines)
+        return '\n'.join(lines)
@@ -0,0 +1,71 @@
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+# 100%缩放时的DPI
+REFERENCE_DPI = 96
+
+
+class DisplayGeometry:
+    """屏幕分辨率和DPI，记录坐标时写入坐标文件，运行时与当前屏幕比较"""
+
+    __slots__ = ('width', 'height', 'dpi')
+
+    def __init__(self, width: int, height: int, dpi: int = REFERENCE_DPI):
+        self.width = int(width)
+        self.height = int(height)
+        self.dpi = int(dpi) or REFERENCE_DPI
+
+    @property
+    def scale(self) -> float:
+        """显示缩放比例（100%为1.0）"""
+        return self.dpi / REFERENCE_DPI
+
+    @classmethod
+    def from_backend(cls, backend, logger=None) -> Optional['DisplayGeometry']:
+        """读取当前屏幕的分辨率和DPI，无法获取时返回None（不做坐标转换）"""
+        try:
+            width, height = backend.screen_size()
+            return cls(width, height, backend.dpi())
+        except Exception as e:
+            (logger or logging.getLogger('display_geometry')).warning(f"无法获取屏幕分辨率和DPI，不转换坐标: {e}")
+            return None
+
+    @classmethod
+    def from_point(cls, point: Dict) -> Optional['DisplayGeometry']:
+        """坐标文件中记录的屏幕信息，旧版本记录的坐标没有该信息时返回None"""
+        size = point.get('screen_size')
+        if not size:
+            return None
+        return cls(size[0], size[1], point.get('dpi') or REFERENCE_DPI)
+
+    def as_dict(self) -> Dict:
+        return {'screen_size': [self.width, self.height], 'dpi': self.dpi}
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DisplayGeometry) and (self.width, self.height, self.dpi) == (other.width, other.height, other.dpi)
+
+    def __repr__(self) -> str:
+        return f'{self.width}x{self.height} {self.dpi}DPI（{self.scale:.0%}）'
+
+
+def transform_point(x: int, y: int, recorded: DisplayGeometry, current: DisplayGeometry) -> Tuple[int, int, float]:
+    """将记录时的坐标转换到当前屏幕
+    界面元素按逻辑像素布局，物理坐标随显示缩放等比变化；分辨率只影响可见范围，超出当前屏幕的坐标收回到屏幕内。
+    窗口位置不同造成的剩余偏移由模板定位（locate_radius）校正。
+    Returns:
+        (x, y, 模板缩放比例)
+    """
+    scale = current.dpi / recorded.dpi
+    x = min(int(round(x * scale)), current.width - 1)
+    y = min(int(round(y * scale)), current.height - 1)
+    return x, y, scale
+
+
+def scale_image(rgb: np.ndarray, scale: float) -> np.ndarray:
+    """按比例缩放RGB图片（模板转换到当前屏幕的显示缩放）"""
+    height, width = rgb.shape[:2]
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    return np.array(Image.fromarray(rgb).resize(size, Image.LANCZOS))
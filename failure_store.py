@@ -0,0 +1,367 @@
+"""匹配失败截图库：截图去重后追加到一个归档文件中，另用索引记录每次失败的手机号、步骤、相似度和时间
+
+用法:
+    python failure_store.py list [--step step3] [--max-score 0.5]     按步骤和相似度查看失败记录
+    python failure_store.py stats                                    各步骤的失败次数、截图数和相似度
+    python failure_store.py export 12 [--output xxx.png]             导出一次失败的截图
+    python failure_store.py export --step step3 --out-dir out/       导出某一步骤的全部截图（可用于调整阈值）
+    python failure_store.py prune                                    按大小和保存天数清理
+"""
+import argparse
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from similarity import block_means
+
+DEFAULT_FAILURE_DIR = 'debug_screenshots'
+ARCHIVE_FILE = 'frames.bin'
+INDEX_FILE = 'index.jsonl'
+# 用于判断近似重复的缩略图大小
+THUMB_GRID = (8, 8)
+
+
+def thumbnail(frame: np.ndarray) -> np.ndarray:
+    """8x8的灰度缩略图，用于判断两张截图是否近似相同"""
+    return block_means(frame, THUMB_GRID).mean(axis=2).astype(np.float32).ravel()
+
+
+def _round(value: float) -> Optional[float]:
+    """索引中的相似度保留4位小数，NaN（未计算）记为null，保证索引是合法的JSON"""
+    return None if math.isnan(value) else round(value, 4)
+
+
+class FailureStore:
+    """匹配失败截图库
+
+    每张截图先计算内容哈希和8x8缩略图：与最近保存的截图相同或近似相同（缩略图平均灰度差不超过near_threshold）时，
+    只在索引中追加一条引用已有截图的记录；否则编码为PNG追加到归档文件。
+    界面被遮挡等故障期间的大量相同截图因此只保存一份。编码和写盘在后台线程中完成。
+    """
+
+    def __init__(self, directory: str = DEFAULT_FAILURE_DIR, logger=None, worker=None,
+                 max_bytes: int = 200 * 1024 * 1024, max_age_days: float = 14, near_threshold: float = 3.0,
+                 recent: int = 256):
+        """
+        Args:
+            directory: 保存目录
+            logger: 日志对象
+            worker: 后台写入线程（IOWorker），为空时同步写入
+            max_bytes: 归档文件的大小上限，清理时先删除最早的截图
+            max_age_days: 失败记录的保存天数
+            near_threshold: 缩略图平均灰度差不超过该值时视为近似相同
+            recent: 参与去重比较的最近截图数量
+        """
+        self.directory = directory
+        self.archive_path = os.path.join(directory, ARCHIVE_FILE)
+        self.index_path = os.path.join(directory, INDEX_FILE)
+        self.worker = worker
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.near_threshold = near_threshold
+        self.recent = recent
+        self.next_id = 1
+        self.saved = 0
+        self.deduplicated = 0
+        # 最近保存的截图：截图编号 -> (形状, 内容哈希, 缩略图)
+        self._recent: 'OrderedDict[int, tuple]' = OrderedDict()
+        # 已写入归档的截图位置：截图编号 -> (偏移, 长度)，只在写入线程中访问
+        self._frames: Dict[int, tuple] = {}
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('failure_store')
+
+    def load(self) -> 'FailureStore':
+        """读取已有索引，继续编号，并用最近的截图参与去重"""
+        self._loaded = True
+        for record in self.records():
+            self.next_id = max(self.next_id, record['id'] + 1)
+            frame_id = record['frame']
+            self._frames[frame_id] = (record['offset'], record['length'])
+            if not record.get('duplicate') and record.get('thumb'):
+                self._remember(frame_id, tuple(record['shape']), record['hash'],
+                               np.frombuffer(bytes.fromhex(record['thumb']), dtype=np.float32))
+        return self
+
+    def _remember(self, frame_id: int, shape: tuple, digest: str, thumb: np.ndarray):
+        self._recent[frame_id] = (shape, digest, thumb)
+        while len(self._recent) > self.recent:
+            self._recent.popitem(last=False)
+
+    def _find_duplicate(self, shape: tuple, digest: str, thumb: np.ndarray) -> Optional[int]:
+        """在最近的截图中查找相同或近似相同的截图编号"""
+        best, best_diff = None, self.near_threshold
+        for frame_id, (other_shape, other_digest, other_thumb) in reversed(self._recent.items()):
+            if other_shape != shape:
+                continue
+            if other_digest == digest:
+                return frame_id
+            diff = float(np.abs(other_thumb - thumb).mean())
+            if diff <= best_diff:
+                best, best_diff = frame_id, diff
+        return best
+
+    def add(self, frame: np.ndarray, step: str, phone: str = '', score: float = None, **info) -> Dict:
+        """记录一次匹配失败
+        Args:
+            frame: (H, W, 3) 的RGB截图，会被复制，调用方可以继续复用缓冲区
+            step: 步骤名
+            phone: 手机号
+            score: 最终相似度
+            **info: 其他写入索引的信息，如global、min_local、threshold
+        Returns:
+            索引记录，包含编号id、截图编号frame和是否重复duplicate
+        """
+        if not self._loaded:
+            self.load()
+        frame = np.ascontiguousarray(frame[..., :3], dtype=np.uint8)
+        digest = hashlib.sha1(frame.tobytes()).hexdigest()
+        thumb = thumbnail(frame)
+        with self._lock:
+            record_id = self.next_id
+            self.next_id += 1
+            duplicate_of = self._find_duplicate(frame.shape, digest, thumb)
+            if duplicate_of is None:
+                self._remember(record_id, frame.shape, digest, thumb)
+        record = {
+            'id': record_id,
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'step': step,
+            'phone': str(phone),
+            'score': None if score is None else _round(float(score)),
+            **{key: _round(value) if isinstance(value, float) else value for key, value in info.items()},
+            'frame': record_id if duplicate_of is None else duplicate_of,
+            'duplicate': duplicate_of is not None,
+            'shape': list(frame.shape),
+            'hash': digest,
+        }
+        if duplicate_of is None:
+            self.saved += 1
+            record['thumb'] = thumb.tobytes().hex()
+            job = (self._write, record, frame.copy())
+        else:
+            self.deduplicated += 1
+            job = (self._write, record, None)
+        if self.worker is not None:
+            self.worker.submit(*job)
+        else:
+            job[0](*job[1:])
+        return record
+
+    def _write(self, record: Dict, frame: Optional[np.ndarray]):
+        """追加截图和索引记录（在写入线程中执行）"""
+        os.makedirs(self.directory, exist_ok=True)
+        if frame is not None:
+            buffer = io.BytesIO()
+            Image.fromarray(frame).save(buffer, format='PNG')
+            data = buffer.getvalue()
+            with open(self.archive_path, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+            self._frames[record['id']] = (offset, len(data))
+        location = self._frames.get(record['frame'])
+        if location is None:
+            # 引用的截图已被清理，这条失败记录无法查看截图，不写入索引
+            self.logger.warning(f"失败记录#{record['id']}引用的截图#{record['frame']}已被清理，未写入索引: "
+                                f"{record['step']} {record['phone']}")
+            return
+        record['offset'], record['length'] = location
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def records(self) -> List[Dict]:
+        """读取全部索引记录"""
+        if not os.path.exists(self.index_path):
+            return []
+        records = []
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # 中断时写了一半的最后一行
+                    continue
+        return records
+
+    def query(self, step: str = None, min_score: float = None, max_score: float = None,
+              since: datetime = None, phone: str = None) -> List[Dict]:
+        """按步骤、相似度范围、时间和手机号筛选失败记录"""
+        result = []
+        for record in self.records():
+            score = record.get('score')
+            if step is not None and record['step'] != step:
+                continue
+            if min_score is not None and (score is None or score < min_score):
+                continue
+            if max_score is not None and (score is None or score > max_score):
+                continue
+            if since is not None and datetime.fromisoformat(record['time']) < since:
+                continue
+            if phone is not None and record['phone'] != phone:
+                continue
+            result.append(record)
+        return result
+
+    def read_frame(self, record: Dict) -> np.ndarray:
+        """读取一条记录的截图"""
+        with open(self.archive_path, 'rb') as f:
+            f.seek(record['offset'])
+            data = f.read(record['length'])
+        with Image.open(io.BytesIO(data)) as image:
+            return np.array(image.convert('RGB'))
+
+    def prune(self) -> Dict[str, int]:
+        """删除超过保存天数的记录，归档仍超过大小上限时从最早的截图开始删除，然后原子地重写归档和索引
+        Returns:
+            清理前后的记录数和归档大小
+        """
+        records = self.records()
+        before = {'records': len(records), 'bytes': os.path.getsize(self.archive_path) if os.path.exists(self.archive_path) else 0}
+        if self.max_age_days is not None:
+            cutoff = datetime.now() - timedelta(days=self.max_age_days)
+            records = [record for record in records if datetime.fromisoformat(record['time']) >= cutoff]
+
+        # 截图编号 -> (偏移, 长度)，按首次出现的顺序（即时间顺序）
+        frames = OrderedDict()
+        for record in records:
+            frames.setdefault(record['frame'], (record['offset'], record['length']))
+        total = sum(length for _, length in frames.values())
+        if self.max_bytes is not None:
+            while frames and total > self.max_bytes:
+                _, (_, length) = frames.popitem(last=False)
+                total -= length
+        records = [record for record in records if record['frame'] in frames]
+        if before['records'] == len(records) and before['bytes'] == total:
+            return {**before, 'kept_records': len(records), 'kept_bytes': total}
+
+        directory = os.path.abspath(self.directory)
+        locations = {}
+        fd, archive_tmp = tempfile.mkstemp(prefix='.tmp_', suffix='.bin', dir=directory)
+        with os.fdopen(fd, 'wb') as out, open(self.archive_path, 'rb') as src:
+            for frame_id, (offset, length) in frames.items():
+                src.seek(offset)
+                locations[frame_id] = (out.tell(), length)
+                out.write(src.read(length))
+        fd, index_tmp = tempfile.mkstemp(prefix='.tmp_', suffix='.jsonl', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            for record in records:
+                record['offset'], record['length'] = locations[record['frame']]
+                out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        os.replace(archive_tmp, self.archive_path)
+        os.replace(index_tmp, self.index_path)
+        self._frames = dict(locations)
+        with self._lock:
+            for frame_id in [frame_id for frame_id in self._recent if frame_id not in locations]:
+                del self._recent[frame_id]
+        self.logger.info(f"失败截图库已清理: {before['records']} -> {len(records)} 条记录，"
+                         f"{before['bytes']} -> {total} 字节")
+        return {**before, 'kept_records': len(records), 'kept_bytes': total}
+
+    def stats(self) -> Dict[str, int]:
+        """本次运行保存和去重的截图数量"""
+        return {'saved': self.saved, 'deduplicated': self.deduplicated}
+
+
+def _print_records(records: List[Dict]):
+    print(f"{'编号':>6}  {'时间':<19}  {'步骤':<8}  {'相似度':>6}  {'截图':>6}  手机号")
+    for record in records:
+        score = '-' if record.get('score') is None else f"{record['score']:.4f}"
+        frame = f"={record['frame']}" if record.get('duplicate') else str(record['frame'])
+        print(f"{record['id']:>6}  {record['time']:<19}  {record['step']:<8}  {score:>6}  {frame:>6}  {record['phone']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='匹配失败截图库')
+    parser.add_argument('--dir', dest='directory', default=DEFAULT_FAILURE_DIR, help='截图库目录')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_cmd = commands.add_parser('list', help='按步骤和相似度查看失败记录')
+    list_cmd.add_argument('--step', help='步骤名')
+    list_cmd.add_argument('--min-score', type=float, help='最低相似度')
+    list_cmd.add_argument('--max-score', type=float, help='最高相似度')
+    list_cmd.add_argument('--hours', type=float, help='只显示最近多少小时的记录')
+    list_cmd.add_argument('--phone', help='手机号')
+    list_cmd.add_argument('--sort', choices=('time', 'score'), default='time', help='排序方式')
+    list_cmd.add_argument('--limit', type=int, default=50, help='最多显示的条数')
+
+    commands.add_parser('stats', help='各步骤的失败次数、截图数和相似度')
+
+    export = commands.add_parser('export', help='导出截图为PNG')
+    export.add_argument('id', nargs='?', type=int, help='失败记录编号')
+    export.add_argument('--output', help='导出单张截图的路径')
+    export.add_argument('--step', help='导出该步骤的全部截图（每张截图一个文件）')
+    export.add_argument('--out-dir', default='exported_failures', help='按步骤导出时的目录')
+
+    commands.add_parser('prune', help='按大小和保存天数清理')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s - %(message)s')
+    store = FailureStore(args.directory)
+
+    if args.command == 'list':
+        since = datetime.now() - timedelta(hours=args.hours) if args.hours else None
+        records = store.query(args.step, args.min_score, args.max_score, since, args.phone)
+        if args.sort == 'score':
+            records.sort(key=lambda record: -1 if record.get('score') is None else record['score'])
+        else:
+            records.reverse()
+        print(f"共 {len(records)} 条失败记录" + (f"，显示前 {args.limit} 条" if len(records) > args.limit else ''))
+        _print_records(records[:args.limit])
+    elif args.command == 'stats':
+        groups = defaultdict(list)
+        for record in store.records():
+            groups[record['step']].append(record)
+        size = os.path.getsize(store.archive_path) if os.path.exists(store.archive_path) else 0
+        print(f"失败截图库 {store.directory}：归档 {size / 1024:.1f}KB")
+        for step, records in sorted(groups.items()):
+            scores = [record['score'] for record in records if record.get('score') is not None]
+            frames = len({record['frame'] for record in records})
+            score_text = f"相似度 {min(scores):.4f}~{max(scores):.4f}，平均 {np.mean(scores):.4f}" if scores else ''
+            print(f"  {step}: {len(records)} 次失败，{frames} 张不同截图  {score_text}")
+    elif args.command == 'export':
+        if args.id is not None:
+            records = [record for record in store.records() if record['id'] == args.id]
+            if not records:
+                print(f"未找到失败记录: {args.id}")
+                return 1
+            record = records[0]
+            path = args.output or f"{record['step']}_{record['phone']}_{record['id']}.png"
+            Image.fromarray(store.read_frame(record)).save(path)
+            print(f"已导出: {path}")
+        elif args.step:
+            # 文件名以步骤名开头，可直接用于tune_thresholds.py
+            os.makedirs(args.out_dir, exist_ok=True)
+            exported = set()
+            for record in store.query(step=args.step):
+                if record['frame'] in exported:
+                    continue
+                exported.add(record['frame'])
+                path = os.path.join(args.out_dir, f"{record['step']}_{record['phone']}_{record['id']}.png")
+                Image.fromarray(store.read_frame(record)).save(path)
+            print(f"已导出 {len(exported)} 张截图到 {args.out_dir}")
+        else:
+            parser.error('export需要指定失败记录编号或--step')
+    elif args.command == 'prune':
+        result = store.prune()
+        print(f"清理完成: {result['records']} -> {result['kept_records']} 条记录，"
+              f"{result['bytes'] / 1024:.1f}KB -> {result['kept_bytes'] / 1024:.1f}KB")
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import logging
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+Region = Tuple[int, int, int, int]
+
+
+class FrameProvider:
+    """截图写入复用的缓冲区，同一轮检查中的多次检查共用一次截图
+
+    每次只截取请求的区域，写入按尺寸预先分配、反复使用的缓冲区，以只读视图的形式返回，不复制数据。
+    截图在本轮检查内有效：让出控制权等待（next_tick）或点击、输入（invalidate）后，下一次检查重新截图。
+    同一轮内落在已截取区域中的检查直接取视图，如自动恢复时帧差检查后紧接着的第一步检查、
+    恢复后立即重试当前行的第一步检查、可选步骤未出现时紧接着检查下一步。
+    取出的视图在下一次截取同样尺寸的区域前有效，需要保留时（如保存失败截图）由调用方复制。
+    """
+
+    def __init__(self, backend, max_buffers: int = 16, logger=None):
+        """
+        Args:
+            backend: 截图后端
+            max_buffers: 最多保留多少种尺寸的缓冲区
+            logger: 日志对象
+        """
+        self.backend = backend
+        self.max_buffers = max_buffers
+        self._buffers: 'OrderedDict[Tuple[int, int], np.ndarray]' = OrderedDict()
+        # 本轮检查中截取的区域和截图，无效时为None
+        self._rect: Optional[Region] = None
+        self._frame: Optional[np.ndarray] = None
+        self.ticks = 0
+        self.grabs = 0
+        self.crops = 0
+        self.shared = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('frame_provider')
+
+    def next_tick(self):
+        """让出控制权等待前调用：等待期间界面可能变化，下一次检查重新截图"""
+        self.ticks += 1
+        self.invalidate()
+
+    def invalidate(self):
+        """点击、输入或切换窗口后界面会变化，下一次检查重新截图"""
+        self._rect = None
+        self._frame = None
+
+    def _buffer(self, width: int, height: int) -> np.ndarray:
+        key = (width, height)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = np.empty((height, width, 3), dtype=np.uint8)
+            self.allocations += 1
+            self.allocated_bytes += buffer.nbytes
+            self._buffers[key] = buffer
+            if len(self._buffers) > self.max_buffers:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(key)
+        return buffer
+
+    def crop(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        """取出一块区域的截图
+        Returns:
+            (高, 宽, 3) 的RGB数组，为复用缓冲区的只读视图
+        """
+        self.crops += 1
+        rect = self._rect
+        if (rect is not None and left >= rect[0] and top >= rect[1]
+                and left + width <= rect[0] + rect[2] and top + height <= rect[1] + rect[3]):
+            self.shared += 1
+            y, x = top - rect[1], left - rect[0]
+            return self._frame[y:y + height, x:x + width]
+
+        buffer = self._buffer(width, height)
+        buffer.setflags(write=True)
+        self.backend.grab_into((left, top, width, height), buffer)
+        buffer.setflags(write=False)
+        self.grabs += 1
+        self._rect = (left, top, width, height)
+        self._frame = buffer
+        return buffer
+
+    def stats(self) -> Dict[str, float]:
+        """截图次数、共用次数和缓冲区分配统计；copied_grabs为后端经由图片复制截图的次数（每次新建图片）"""
+        return {
+            'ticks': self.ticks,
+            'grabs': self.grabs,
+            'crops': self.crops,
+            'shared': self.shared,
+            'allocations': self.allocations,
+            'allocated_bytes': self.allocated_bytes,
+            'copied_grabs': getattr(self.backend, 'copied_grabs', 0),
+        }
@@ -0,0 +1,187 @@
+import threading
+import time
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+# 事件类型
+CLICK = 'click'
+KEY_DOWN = 'key_down'
+KEY_UP = 'key_up'
+END = 'end'
+
+# 各输入库的按键名称统一为同一套名称
+_KEY_ALIASES = {
+    'capslock': 'capslock', 'caps': 'capslock',
+    'ctrl': 'ctrl', 'control': 'ctrl', 'ctrll': 'ctrl', 'ctrlr': 'ctrl', 'leftctrl': 'ctrl', 'rightctrl': 'ctrl',
+    'shift': 'shift', 'shiftl': 'shift', 'shiftr': 'shift', 'leftshift': 'shift', 'rightshift': 'shift',
+    'alt': 'alt', 'altl': 'alt', 'altr': 'alt', 'altgr': 'alt', 'leftalt': 'alt', 'rightalt': 'alt',
+    # 按住Ctrl时pynput报告的是控制字符
+    '\x03': 'c',
+}
+
+
+def normalize_key(name) -> str:
+    """将'caps lock'、'Key.caps_lock'、'ctrl_l'等不同写法统一为'capslock'、'ctrl'等"""
+    if name is None:
+        return ''
+    key = str(name).lower()
+    if key.startswith('key.'):
+        key = key[4:]
+    key = key.replace(' ', '').replace('_', '')
+    return _KEY_ALIASES.get(key, key)
+
+
+class InputEvent(NamedTuple):
+    kind: str               # CLICK、KEY_DOWN、KEY_UP或END
+    x: int = 0              # 点击位置
+    y: int = 0
+    key: str = ''           # 统一后的按键名称
+    button: str = ''        # 鼠标按键（left、right、middle）
+    time: float = 0.0
+
+
+class InputHooks:
+    """输入事件钩子：鼠标按下和键盘按下/抬起时回调，空闲时不占用CPU"""
+
+    def start(self, callback: Callable[[InputEvent], None]):
+        """开始监听，事件在后台线程中通过callback传出"""
+        raise NotImplementedError
+
+    def stop(self):
+        """停止监听"""
+        raise NotImplementedError
+
+
+class KeyboardMouseHooks(InputHooks):
+    """基于keyboard和mouse库的全局钩子（Windows和Linux）"""
+
+    def __init__(self):
+        self._keyboard_hook = None
+        self._mouse_hook = None
+
+    def start(self, callback: Callable[[InputEvent], None]):
+        import keyboard
+        import mouse
+
+        def on_key(event):
+            kind = KEY_DOWN if event.event_type == keyboard.KEY_DOWN else KEY_UP
+            callback(InputEvent(kind, key=normalize_key(event.name), time=event.time))
+
+        def on_mouse(event):
+            if isinstance(event, mouse.ButtonEvent) and event.event_type == mouse.DOWN:
+                x, y = mouse.get_position()
+                callback(InputEvent(CLICK, int(x), int(y), button=event.button, time=event.time))
+
+        self._keyboard_hook = keyboard.hook(on_key)
+        self._mouse_hook = mouse.hook(on_mouse)
+
+    def stop(self):
+        if self._keyboard_hook is not None:
+            import keyboard
+            keyboard.unhook(self._keyboard_hook)
+            self._keyboard_hook = None
+        if self._mouse_hook is not None:
+            import mouse
+            mouse.unhook(self._mouse_hook)
+            self._mouse_hook = None
+
+
+class PynputHooks(InputHooks):
+    """基于pynput的全局钩子（Windows、macOS和Linux）"""
+
+    def __init__(self):
+        self._listeners = []
+
+    def start(self, callback: Callable[[InputEvent], None]):
+        from pynput import keyboard, mouse
+
+        def on_click(x, y, button, pressed):
+            if pressed:
+                callback(InputEvent(CLICK, int(x), int(y), button=getattr(button, 'name', str(button)), time=time.time()))
+
+        def key_name(key):
+            return getattr(key, 'char', None) or getattr(key, 'name', None) or str(key)
+
+        def on_press(key):
+            callback(InputEvent(KEY_DOWN, key=normalize_key(key_name(key)), time=time.time()))
+
+        def on_release(key):
+            callback(InputEvent(KEY_UP, key=normalize_key(key_name(key)), time=time.time()))
+
+        self._listeners = [mouse.Listener(on_click=on_click),
+                           keyboard.Listener(on_press=on_press, on_release=on_release)]
+        for listener in self._listeners:
+            listener.start()
+
+    def stop(self):
+        for listener in self._listeners:
+            listener.stop()
+        self._listeners = []
+
+
+class ReplayHooks(InputHooks):
+    """回放预先准备的事件序列，用于在无桌面环境下测试坐标记录
+
+    事件序列播放完毕后发送END事件。realtime为True时按事件的time间隔回放。
+    """
+
+    def __init__(self, events: Iterable[InputEvent], realtime: bool = False):
+        self.events: List[InputEvent] = list(events)
+        self.realtime = realtime
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self, callback: Callable[[InputEvent], None]):
+        self._stopped.clear()
+
+        def play():
+            previous = None
+            for event in self.events:
+                if self._stopped.is_set():
+                    return
+                if self.realtime and previous is not None and event.time > previous:
+                    if self._stopped.wait(event.time - previous):
+                        return
+                previous = event.time
+                callback(event)
+            callback(InputEvent(END))
+
+        self._thread = threading.Thread(target=play, name='replay-hooks', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+
+
+def click(x: int, y: int, t: float = 0.0, button: str = 'left') -> InputEvent:
+    """构造回放用的鼠标点击事件"""
+    return InputEvent(CLICK, x, y, button=button, time=t)
+
+
+def key(name: str, down: bool = True, t: float = 0.0) -> InputEvent:
+    """构造回放用的按键事件"""
+    return InputEvent(KEY_DOWN if down else KEY_UP, key=normalize_key(name), time=t)
+
+
+def create_input_hooks(name: Optional[str] = None) -> InputHooks:
+    """创建输入钩子
+    Args:
+        name: 'keyboard'（keyboard和mouse库）或'pynput'，为空时使用第一个可用的
+    Returns:
+        InputHooks实例
+    """
+    factories = {'keyboard': (KeyboardMouseHooks, ('keyboard', 'mouse')), 'pynput': (PynputHooks, ('pynput',))}
+    names = [name] if name else list(factories)
+    errors = []
+    for candidate in names:
+        factory, modules = factories[candidate]
+        try:
+            for module in modules:
+                __import__(module)
+        except ImportError as e:
+            errors.append(str(e))
+            continue
+        return factory()
+    raise ImportError(f"没有可用的输入钩子库，请运行: pip install mouse keyboard（{'; '.join(errors)}）")
@@ -0,0 +1,136 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Dict, List
+
+import numpy as np
+from PIL import Image
+
+
+class IOWorker:
+    """后台磁盘写入线程
+
+    保存截图、写进度日志和导出检查点等任务按提交顺序在后台线程中执行，自动化线程只负责入队。
+    队列有上限，写入跟不上时submit会阻塞等待（背压），不会无限占用内存。
+    停止处理时调用flush/stop等待队列清空；程序异常退出时通过atexit清空队列。
+    """
+
+    def __init__(self, logger=None, maxsize: int = 256, name: str = 'io-worker'):
+        """
+        Args:
+            logger: 日志对象
+            maxsize: 队列中最多等待的任务数
+            name: 线程名称
+        """
+        self.name = name
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.blocked_seconds = 0.0
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('io_worker')
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+                atexit.register(self.stop)
+        return self
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                fn, args, kwargs = job
+                fn(*args, **kwargs)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                self.logger.error(f"后台写入任务失败: {e}")
+            finally:
+                self._queue.task_done()
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        """提交一个后台任务，队列已满时阻塞直到有空位"""
+        self.start()
+        started = time.perf_counter()
+        self._queue.put((fn, args, kwargs))
+        waited = time.perf_counter() - started
+        if waited > 0.001:
+            self.blocked_seconds += waited
+        self.submitted += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def save_image(self, frame: np.ndarray, path: str):
+        """在后台保存截图，frame会被复制，调用方可以继续复用缓冲区"""
+        self.submit(_save_image, np.array(frame, copy=True), path)
+
+    def flush(self):
+        """等待已提交的任务全部完成"""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+    def stop(self):
+        """清空队列并结束后台线程"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None or not thread.is_alive():
+            return
+        self._queue.put(None)
+        thread.join()
+        atexit.unregister(self.stop)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'pending': self._queue.qsize(),
+            'max_depth': self.max_depth,
+            'blocked_seconds': round(self.blocked_seconds, 3),
+        }
+
+
+def _save_image(frame: np.ndarray, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    Image.fromarray(frame).save(path)
+
+
+class _BlockingQueueHandler(QueueHandler):
+    """队列已满时阻塞等待，而不是丢弃日志"""
+
+    def enqueue(self, record):
+        self.queue.put(record)
+
+
+def start_log_listener(logger: logging.Logger, handlers: List[logging.Handler], maxsize: int = 10000) -> QueueListener:
+    """让logger只把日志放入队列，由后台线程写入handlers
+    Args:
+        logger: 日志对象
+        handlers: 实际写入的处理器（如FileHandler）
+        maxsize: 队列中最多等待的日志条数
+    Returns:
+        已启动的QueueListener，程序退出时自动停止并写完剩余日志
+    """
+    log_queue = queue.Queue(maxsize)
+    logger.addHandler(_BlockingQueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
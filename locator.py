@@ -0,0 +1,113 @@
+from typing import Tuple
+
+import numpy as np
+
+# RGB转灰度的系数
+_GRAY_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def to_gray(rgb: np.ndarray) -> np.ndarray:
+    """RGB图像转为float32灰度图"""
+    return rgb[..., :3].astype(np.float32) @ _GRAY_WEIGHTS
+
+
+def _downsample(gray: np.ndarray, factor: int) -> np.ndarray:
+    """按factor x factor块取平均缩小图像"""
+    h = gray.shape[0] // factor * factor
+    w = gray.shape[1] // factor * factor
+    return gray[:h, :w].reshape(h // factor, factor, w // factor, factor).mean(axis=(1, 3))
+
+
+def _fast_len(n: int) -> int:
+    """不小于n且只含2、3、5因子的长度，FFT在这些长度上最快"""
+    best = 1 << (n - 1).bit_length()
+    p5 = 1
+    while p5 < best:
+        p35 = p5
+        while p35 < best:
+            length = p35
+            while length < n:
+                length *= 2
+            best = min(best, length)
+            p35 *= 3
+        p5 *= 5
+    return best
+
+
+def _window_sums(image: np.ndarray, th: int, tw: int) -> Tuple[np.ndarray, np.ndarray]:
+    """用积分图计算所有th x tw窗口的像素和与平方和"""
+    def box(values):
+        ii = np.zeros((values.shape[0] + 1, values.shape[1] + 1), dtype=np.float64)
+        np.cumsum(np.cumsum(values, axis=0), axis=1, out=ii[1:, 1:])
+        return ii[th:, tw:] - ii[:-th, tw:] - ii[th:, :-tw] + ii[:-th, :-tw]
+
+    image = image.astype(np.float64)
+    return box(image), box(image * image)
+
+
+def ncc_map(image: np.ndarray, template: np.ndarray) -> np.ndarray:
+    """FFT互相关加积分图归一化，计算模板在图像中每个位置的归一化互相关系数
+    Args:
+        image: (H, W) 灰度搜索图
+        template: (h, w) 灰度模板，h <= H且w <= W
+    Returns:
+        (H - h + 1, W - w + 1) 的相关系数，取值[-1, 1]
+    """
+    ih, iw = image.shape
+    th, tw = template.shape
+    t = template.astype(np.float64) - template.mean()
+    t_norm = np.sqrt((t * t).sum())
+
+    # 模板零均值，所以sum(I * t)即为去均值后的互相关
+    shape = (_fast_len(ih + th - 1), _fast_len(iw + tw - 1))
+    corr = np.fft.irfft2(np.fft.rfft2(image, shape) * np.fft.rfft2(t[::-1, ::-1], shape), shape)
+    corr = corr[th - 1:ih, tw - 1:iw]
+
+    sums, sq_sums = _window_sums(image, th, tw)
+    variance = np.maximum(sq_sums - sums * sums / (th * tw), 0.0)
+    denominator = np.sqrt(variance) * t_norm
+    result = np.zeros_like(corr)
+    valid = denominator > 1e-6
+    result[valid] = corr[valid] / denominator[valid]
+    return result
+
+
+def _refine(image: np.ndarray, template: np.ndarray, cy: int, cx: int, radius: int) -> Tuple[int, int, float]:
+    """在粗定位结果附近的少量位置上直接计算相关系数"""
+    th, tw = template.shape
+    y0 = max(0, cy - radius)
+    x0 = max(0, cx - radius)
+    y1 = min(image.shape[0] - th, cy + radius)
+    x1 = min(image.shape[1] - tw, cx + radius)
+    windows = np.lib.stride_tricks.sliding_window_view(image[y0:y1 + th, x0:x1 + tw], (th, tw))
+    windows = windows.reshape(windows.shape[0], windows.shape[1], -1).astype(np.float64)
+    windows = windows - windows.mean(axis=2, keepdims=True)
+    t = template.astype(np.float64).ravel()
+    t = t - t.mean()
+    denominator = np.sqrt((windows * windows).sum(axis=2) * (t @ t))
+    scores = np.where(denominator > 1e-6, (windows @ t) / np.maximum(denominator, 1e-6), 0.0)
+    iy, ix = np.unravel_index(np.argmax(scores), scores.shape)
+    return y0 + int(iy), x0 + int(ix), float(scores[iy, ix])
+
+
+def locate(image: np.ndarray, template: np.ndarray, coarse_factor: int = 2) -> Tuple[int, int, float]:
+    """在搜索图中定位模板，先在缩小的图像上粗定位，再在原图上精确定位
+    Args:
+        image: (H, W) 灰度搜索图
+        template: (h, w) 灰度模板
+        coarse_factor: 粗定位时的缩小倍数，1表示直接在原图上搜索
+    Returns:
+        (最佳位置的行偏移, 列偏移, 相关系数)
+    """
+    th, tw = template.shape
+    if image.shape[0] < th or image.shape[1] < tw:
+        raise ValueError(f"搜索区域{image.shape}小于模板{template.shape}")
+
+    if coarse_factor <= 1 or min(th, tw) < coarse_factor * 8:
+        scores = ncc_map(image, template)
+        iy, ix = np.unravel_index(np.argmax(scores), scores.shape)
+        return int(iy), int(ix), float(scores[iy, ix])
+
+    coarse = ncc_map(_downsample(image, coarse_factor), _downsample(template, coarse_factor))
+    iy, ix = np.unravel_index(np.argmax(coarse), coarse.shape)
+    return _refine(image, template, int(iy) * coarse_factor, int(ix) * coarse_factor, coarse_factor)
@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+class RollingHistogram:
+    """保留最近N个样本的滚动统计"""
+
+    __slots__ = ('samples', 'count', 'total')
+
+    def __init__(self, window: int = 1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict[str, float]:
+        result = {'count': self.count, 'sum': self.total, 'mean': self.total / self.count if self.count else 0.0}
+        if self.samples:
+            values = np.percentile(np.fromiter(self.samples, dtype=np.float64), PERCENTILES)
+            for p, v in zip(PERCENTILES, values):
+                result[f'p{p}'] = float(v)
+        return result
+
+
+class RunMetrics:
+    """运行过程中的分步骤耗时和吞吐量统计"""
+
+    def __init__(self, path: str = 'metrics.json', export_interval: float = 30.0, window: int = 1000, logger=None):
+        """
+        Args:
+            path: 导出文件路径，.prom结尾时导出Prometheus文本格式，否则导出JSON
+            export_interval: 定期导出的间隔秒数
+            window: 每个统计项保留的最近样本数
+            logger: 日志对象
+        """
+        self.path = path
+        self.export_interval = export_interval
+        self.window = window
+        self.histograms: Dict[Tuple[str, str], RollingHistogram] = {}
+        self.row_seconds = RollingHistogram(window)
+        self.rows_done = 0
+        self.total_rows: Optional[int] = None
+        # 开始时待处理的行数（共享任务队列模式），设置后按已完成行数估算剩余时间
+        self.pending_rows: Optional[int] = None
+        self.current_row = 0
+        self.started = time.monotonic()
+        self._last_export = self.started
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('metrics')
+
+    def observe(self, step: str, phase: str, seconds: float):
+        """记录一次耗时
+        Args:
+            step: 步骤名，如step1
+            phase: 阶段名，如capture、score、verify、click、post_wait
+            seconds: 耗时秒数
+        """
+        key = (step, phase)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = RollingHistogram(self.window)
+        histogram.add(seconds)
+
+    def row_finished(self, index: int, seconds: float):
+        """记录一行处理完成"""
+        self.rows_done += 1
+        self.current_row = index
+        self.row_seconds.add(seconds)
+
+    def rows_per_hour(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.rows_done / elapsed * 3600 if elapsed > 0 else 0.0
+
+    def eta_seconds(self) -> Optional[float]:
+        """按文件剩余行数估算的剩余时间（剩余行中可能包含已处理的行，结果偏保守）；
+        设置了pending_rows时按待处理行数减去已完成行数估算"""
+        rate = self.rows_per_hour()
+        if rate <= 0:
+            return None
+        if self.pending_rows is not None:
+            remaining = max(0, self.pending_rows - self.rows_done)
+        elif self.total_rows is not None:
+            remaining = max(0, self.total_rows - self.current_row - 1)
+        else:
+            return None
+        return remaining / rate * 3600
+
+    def snapshot(self) -> Dict:
+        steps: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for (step, phase), histogram in sorted(self.histograms.items()):
+            steps.setdefault(step, {})[phase] = histogram.snapshot()
+        return {
+            'timestamp': time.time(),
+            'elapsed_seconds': time.monotonic() - self.started,
+            'rows_done': self.rows_done,
+            'current_row': self.current_row,
+            'total_rows': self.total_rows,
+            'pending_rows': self.pending_rows,
+            'rows_per_hour': self.rows_per_hour(),
+            'eta_seconds': self.eta_seconds(),
+            'row_seconds': self.row_seconds.snapshot(),
+            'steps': steps,
+        }
+
+    def _to_prometheus(self, snapshot: Dict) -> str:
+        lines = [
+            '# TYPE wecom_rows_done counter',
+            f'wecom_rows_done {snapshot["rows_done"]}',
+            '# TYPE wecom_rows_per_hour gauge',
+            f'wecom_rows_per_hour {snapshot["rows_per_hour"]:.3f}',
+        ]
+        if snapshot['eta_seconds'] is not None:
+            lines += ['# TYPE wecom_eta_seconds gauge', f'wecom_eta_seconds {snapshot["eta_seconds"]:.1f}']
+        lines.append('# TYPE wecom_step_seconds summary')
+        for step, phases in snapshot['steps'].items():
+            for phase, stats in phases.items():
+                labels = f'step="{step}",phase="{phase}"'
+                for p in PERCENTILES:
+                    if f'p{p}' in stats:
+                        lines.append(f'wecom_step_seconds{{{labels},quantile="{p / 100}"}} {stats[f"p{p}"]:.6f}')
+                lines.append(f'wecom_step_seconds_sum{{{labels}}} {stats["sum"]:.6f}')
+                lines.append(f'wecom_step_seconds_count{{{labels}}} {stats["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: str = None):
+        """原子地导出统计快照"""
+        self._last_export = time.monotonic()
+        self._write(path or self.path, self.snapshot())
+
+    def _write(self, path: str, snapshot: Dict):
+        if path.endswith('.prom'):
+            content = self._to_prometheus(snapshot)
+        else:
+            content = json.dumps(snapshot, ensure_ascii=False, indent=2)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def maybe_export(self, worker=None) -> bool:
+        """距离上次导出超过间隔时导出，导出失败只记录日志，不影响处理
+        Args:
+            worker: 后台写入线程（IOWorker），指定时在处理线程中取统计快照、由后台线程写入文件
+        """
+        if time.monotonic() - self._last_export < self.export_interval:
+            return False
+        self._last_export = time.monotonic()
+        snapshot = self.snapshot()
+        if worker is not None:
+            worker.submit(self._write, self.path, snapshot)
+            return True
+        try:
+            self._write(self.path, snapshot)
+        except Exception as e:
+            self.logger.warning(f"导出运行统计失败: {e}")
+        return True
+
+    def format_summary(self) -> str:
+        """生成分步骤平均耗时的文本摘要"""
+        lines = [f"吞吐量: {self.rows_per_hour():.1f} 条/小时"]
+        for (step, phase), histogram in sorted(self.histograms.items()):
+            stats = histogram.snapshot()
+            lines.append(f"{step}.{phase}: 平均 {stats['mean']:.3f}秒, p95 {stats.get('p95', 0.0):.3f}秒")
+        return '\n'.join(lines)
@@ -1,20 +1,30 @@
-import pyautogui
-import keyboard
 import json
-import time
+import queue
 from typing import List, Dict
 import logging
-from datetime import datetime
 import os
-from PIL import Image
+import numpy as np
+from input_hooks import CLICK, END, KEY_DOWN, KEY_UP, create_input_hooks
 
 class MouseRecorder:
-    def __init__(self, logger=None):
+    def __init__(self, logger=None, template_cache=None, backend=None, template_dir: str = 'templates', input_hooks=None,
+                 template_store=None):
         self.coordinates = []
+        # 多变体模板库，重新记录某一步骤时用新截图替换该步骤的全部变体
+        self.template_store = template_store
+        # 鼠标键盘事件来源，为空时在记录时自动选择可用的钩子库
+        self.input_hooks = input_hooks
+        self.template_cache = template_cache
+        # 多窗口时每个窗口使用单独的模板目录
+        self.template_dir = template_dir
+        if backend is None:
+            from screen_backend import PyAutoGUIBackend
+            backend = PyAutoGUIBackend()
+        self.backend = backend
         self._setup_logging(logger)
         # 创建templates文件夹
-        if not os.path.exists('templates'):
-            os.makedirs('templates')
+        if not os.path.exists(self.template_dir):
+            os.makedirs(self.template_dir)
         
     def _setup_logging(self, logger):
         """设置日志"""
@@ -37,12 +47,19 @@ class MouseRecorder:
             height = 50  # 总高度50像素
             
             # 截取图片
-            screenshot = pyautogui.screenshot(region=(left, top, width, height))
+            screenshot = self.backend.screenshot(region=(left, top, width, height))
             
             # 保存模板图片
-            template_path = f'templates/step{step}_template.png'
+            template_path = f'{self.template_dir}/step{step}_template.png'
             screenshot.save(template_path)
             
+            # 重新录制后旧的缓存模板不再有效
+            if self.template_cache is not None:
+                self.template_cache.invalidate(template_path)
+            if self.template_store is not None:
+                self.template_store.add(f'step{step}', np.array(screenshot.convert('RGB')), replace=True,
+                                        label='记录', source=template_path, **self._screen_info())
+            
             self.logger.info(f"已保存模板图片: {template_path}")
             return template_path
             
@@ -50,6 +67,13 @@ class MouseRecorder:
             self.logger.error(f"捕获模板图片失败: {e}")
             return ""
         
+    def _screen_info(self) -> Dict:
+        """截图时的屏幕分辨率和DPI，写入模板变体信息"""
+        try:
+            return {'screen_size': list(self.backend.screen_size()), 'dpi': self.backend.dpi()}
+        except Exception:
+            return {}
+
     def record(self, total_steps: int = None) -> List[Dict]:
         """记录鼠标坐标
         Args:
@@ -63,79 +87,82 @@ class MouseRecorder:
             print(f"将在记录{total_steps}个坐标后自动完成")
         
         step = 1
-        capslock_was_pressed = False
-        mouse_clicked = False
+        held = set()
         self.coordinates = []  # 清空之前的记录
-        
+
+        # 钩子线程只负责把事件放入队列，截图和保存在当前线程中完成
+        events = queue.Queue()
+        hooks = self.input_hooks
+        try:
+            if hooks is None:
+                hooks = self.input_hooks = create_input_hooks()
+            hooks.start(events.put)
+        except ImportError as e:
+            print(f"\n{e}")
+            self.logger.error(f"启动输入钩子失败: {e}")
+            return self.coordinates
+
         try:
             while True:
                 try:
-                    # 获取当前鼠标位置并打印
-                    current_x, current_y = pyautogui.position()
-                    print(f"\r当前鼠标位置: ({current_x}, {current_y})", end='')
-                    
-                    # 检测Capslock和鼠标左键状态
-                    if keyboard.is_pressed('capslock'):
-                        if not capslock_was_pressed:  # 只在第一次按下时记录状态
-                            capslock_was_pressed = True
-                    else:
-                        capslock_was_pressed = False
-                        mouse_clicked = False
-                        
-                    # 当Capslock按下时，检测鼠标点击
-                    if capslock_was_pressed and not mouse_clicked:
-                        try:
-                            import win32api
-                            import win32con
-                            if win32api.GetAsyncKeyState(win32con.VK_LBUTTON) < 0:  # 鼠标左键被按下
-                                mouse_clicked = True
-                                x, y = current_x, current_y
-                                
-                                # 捕获模板图片
-                                template_path = self._capture_template(x, y, step)
-                                
-                                # 记录坐标和模板路径
-                                coord = {
-                                    f"step{step}": {
-                                        "x": x,
-                                        "y": y,
-                                        "template": template_path
-                                    }
-                                }
-                                self.coordinates.append(coord)
-                                print(f"\n记录位置 step{step}: ({x}, {y})")
-                                print(f"当前已记录的所有坐标: {self.coordinates}")
-                                self.logger.info(f"记录坐标点 step{step}: ({x}, {y})")
-                                step += 1
-                                time.sleep(0.5)
-                                
-                                # 检查是否达到指定步骤数
-                                if total_steps and step > total_steps:
-                                    print(f"\n已达到指定的{total_steps}个坐标点")
-                                    break
-                        except ImportError:
-                            print("\n需要安装pywin32库来检测鼠标点击")
-                            print("请运行: pip install pywin32")
-                            break
-                    
-                    if keyboard.is_pressed('ctrl') and keyboard.is_pressed('c'):
+                    # 带超时等待，以便在Windows上也能响应Ctrl+C
+                    event = events.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+
+                if event.kind == END:
+                    break
+                if event.kind == KEY_DOWN:
+                    held.add(event.key)
+                    if event.key == 'c' and 'ctrl' in held:
                         break
-                    
-                    # 添加短暂延迟，减少CPU使用
-                    time.sleep(0.1)
-                    
-                except Exception as e:
-                    if not isinstance(e, KeyboardInterrupt):
-                        print(f"\n记录过程出错: {e}")
-                        self.logger.error(f"记录过程出错: {e}")
-                        print(f"错误类型: {type(e)}")
+                    continue
+                if event.kind == KEY_UP:
+                    held.discard(event.key)
+                    continue
+                # 只记录按住Capslock时的鼠标左键点击
+                if event.kind != CLICK or event.button != 'left' or 'capslock' not in held:
+                    continue
+
+                x, y = event.x, event.y
+                # 捕获模板图片
+                template_path = self._capture_template(x, y, step)
+
+                # 记录坐标、模板路径和记录时的屏幕分辨率、DPI（在其他屏幕上运行时据此转换坐标）
+                coord = {
+                    f"step{step}": {
+                        "x": x,
+                        "y": y,
+                        "template": template_path,
+                        **self._screen_info()
+                    }
+                }
+                self.coordinates.append(coord)
+                print(f"\n记录位置 step{step}: ({x}, {y})")
+                print(f"当前已记录的所有坐标: {self.coordinates}")
+                self.logger.info(f"记录坐标点 step{step}: ({x}, {y})")
+                step += 1
+
+                # 检查是否达到指定步骤数
+                if total_steps and step > total_steps:
+                    print(f"\n已达到指定的{total_steps}个坐标点")
                     break
-                    
+
+        except KeyboardInterrupt:
+            pass
         except Exception as e:
+            print(f"\n记录过程出错: {e}")
             self.logger.error(f"记录坐标时出错: {e}")
             print(f"错误类型: {type(e)}")
+        finally:
+            hooks.stop()
             
         # 保存并返回结果
+        if self.coordinates and self.template_store is not None:
+            try:
+                self.template_store.save()
+            except Exception as e:
+                self.logger.error(f"保存模板库失败: {e}")
         if self.coordinates:
             print("\n记录完成")
             print(f"共记录 {len(self.coordinates)} 个坐标点:")
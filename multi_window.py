@@ -0,0 +1,393 @@
+import heapq
+import json
+import time
+from collections import Counter
+from typing import Dict, Generator, List, Optional
+
+from display_geometry import DisplayGeometry
+from failure_store import FailureStore, DEFAULT_FAILURE_DIR
+from io_worker import IOWorker
+from automation import MouseAutomation
+from mouse_recorder import MouseRecorder
+from phone_index import PhoneIndex, normalize_phone, precheck, INVALID_STATUS, ADDED_STATUS, DEFAULT_INDEX_FILE
+from phone_source import PhoneSource, write_checkpoint
+from progress_journal import ProgressJournal, journal_path_for
+from rate_scheduler import DEFAULT_RATE_FILE
+from recovery import Recovery, NO_ACTION
+from screen_backend import PyAutoGUIBackend
+from metrics import RunMetrics
+from step_pipeline import StepPipeline, StepSpec, load_step_specs, DEFAULT_SPEC_FILE
+from template_store import TemplateStore
+from wait_profile import WaitProfile, DEFAULT_PROFILE_FILE
+
+DEFAULT_WINDOWS_FILE = 'windows.json'
+
+
+class WindowSession:
+    """单个企业微信窗口的运行状态：坐标、模板、手机号分区和进度"""
+
+    def __init__(self, name: str, automation: MouseAutomation, steps: List[StepSpec], source: PhoneSource,
+                 journal: ProgressJournal, excel_path: str, window_title: str = None, focus: Dict = None):
+        self.name = name
+        self.automation = automation
+        self.steps = steps
+        # 与单窗口处理共用同一套步骤流程，等待时让出控制权
+        self.pipeline = StepPipeline(steps, automation, automation.logger)
+        self.source = source
+        self.journal = journal
+        self.excel_path = excel_path
+        self.window_title = window_title
+        self.focus = focus
+        self.consecutive_failures = 0
+        self.rows_since_checkpoint = 0
+        self.counts = Counter()
+        # 自动恢复失败后该窗口暂停，等待人工处理后按Ctrl+F1继续
+        self.recovery: Optional[Recovery] = None
+        self.paused = False
+
+
+class MultiWindowDriver:
+    """在一个进程中轮流驱动多个企业微信窗口
+
+    每个窗口的处理流程是一个生成器（StepPipeline.iter_run），需要等待界面时让出控制权并返回等待秒数，
+    调度器总是推进最早就绪的窗口，因此一个窗口等待时其他窗口可以继续执行下一步。
+    所有截图、点击和输入都在同一个线程中完成，每次截图、点击和输入前先切换到对应窗口，操作不会交错。
+    """
+
+    def __init__(self, backend=None, logger=None):
+        self.backend = backend or PyAutoGUIBackend()
+        self.logger = logger or MouseAutomation(self.backend).logger
+        # 所有窗口共用一个后台写入线程
+        self.io_worker = IOWorker(self.logger)
+        # 所有窗口共用失败截图库（编号和去重跨窗口）
+        self.failure_store = FailureStore(DEFAULT_FAILURE_DIR, self.logger, self.io_worker)
+        self.sessions: List[WindowSession] = []
+        self.running = False
+        self.paused = False
+        # 切换窗口焦点后等待界面响应的秒数
+        self.focus_delay = 0.2
+        self.checkpoint_interval = 50
+        # 所有窗口共用学习到的界面响应时间（同一台电脑上的同一个程序）
+        self.wait_profile_path = DEFAULT_PROFILE_FILE
+        self.wait_percentile = 50
+        self.wait_profile = None
+        # 所有窗口合并统计分步骤耗时和吞吐量
+        self.metrics_path = 'metrics.json'
+        self.metrics = None
+        # 所有窗口共用已添加过的手机号索引，为空时不检查
+        self.phone_index_path = DEFAULT_INDEX_FILE
+        self.phone_index = None
+        # 模板定位的搜索半径，windows.json中可为每个窗口单独指定locate_radius
+        self.locate_radius = 0
+        # 自愈设置，含义同MouseAutomation的同名属性
+        self.failure_threshold = 2
+        self.row_retries = 1
+        self.escalate_after = 6
+        self.escalation_retry_interval = 300.0
+        self._focused: Optional[WindowSession] = None
+
+    def load_config(self, path: str = DEFAULT_WINDOWS_FILE) -> List[WindowSession]:
+        """从配置文件加载窗口列表
+        配置文件为列表，每项包含：
+            name: 窗口名称
+            coordinates: 坐标文件路径
+            phones: 手机号文件路径
+            steps: 步骤配置文件路径（可选）
+            partition: [k, n]，多个窗口共用同一个手机号文件时的分区（可选）
+            window_title: 用于切换焦点的窗口标题（可选）
+            focus: {"x": .., "y": ..}，没有窗口标题时点击该位置切换焦点（可选）
+            rate_limits: 限速配置文件路径（可选）
+            account: 限速额度所属的账号，默认为窗口名称（可选）
+            template_store: 多变体模板库路径（可选）
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+
+        if self.phone_index_path and self.phone_index is None:
+            self.phone_index = PhoneIndex(self.phone_index_path, self.logger, self.io_worker).load()
+        journals = {}
+        # 所有窗口在同一块屏幕上，坐标按记录时与当前屏幕的显示缩放转换
+        display = DisplayGeometry.from_backend(self.backend, self.logger)
+        for item in config:
+            name = item['name']
+            automation = MouseAutomation(self.backend, self.logger)
+            automation.io_worker = self.io_worker
+            automation.failure_store = self.failure_store
+            automation.locate_radius = item.get('locate_radius', self.locate_radius)
+            # 各窗口的模板不同，只使用为该窗口指定的模板库
+            store_path = item.get('template_store')
+            automation.template_store = TemplateStore(store_path, self.logger).load() if store_path else None
+            coordinates = MouseRecorder(self.logger, automation.template_cache, self.backend).load_from_file(item['coordinates'])
+            if not coordinates:
+                raise ValueError(f"窗口{name}的坐标文件为空: {item['coordinates']}")
+            steps = load_step_specs(coordinates, item.get('steps', DEFAULT_SPEC_FILE), self.logger, display)
+            automation.template_cache.preload((step.template, step.scale) for step in steps)
+            # 每个窗口对应一个账号，分别计算限速额度
+            automation.rate_limits_path = item.get('rate_limits', DEFAULT_RATE_FILE)
+            automation.rate_limits = {'account': item.get('account') or name}
+            automation.scheduler = automation.create_scheduler()
+
+            # 共用同一个手机号文件的窗口共用同一个进度日志
+            excel_path = item['phones']
+            journal = journals.get(excel_path)
+            if journal is None:
+                journal = journals[excel_path] = ProgressJournal(journal_path_for(excel_path), self.logger, self.io_worker)
+                journal.replay()
+                # 共用同一个文件的窗口只做一次预检查，分区之间的重复号码也能排除
+                rows = precheck(excel_path, journal.pending, self.phone_index)
+                for row in rows:
+                    journal.record(row.index, row.phone, row.status)
+                self.logger.info(f"预检查{excel_path}: {len(rows)} 条无效、重复或已添加过的号码")
+            partition = tuple(item['partition']) if item.get('partition') else None
+            source = PhoneSource(excel_path, done=journal.snapshot(), logger=self.logger, partition=partition)
+
+            session = WindowSession(name, automation, steps, source, journal, excel_path,
+                                    item.get('window_title'), item.get('focus'))
+            # 截图、点击和输入前先切换到该窗口，窗口互相遮挡时也不会比较或点击错误的窗口
+            automation.activate = lambda session=session: self._focus(session)
+            session.recovery = Recovery(automation, steps, self.logger, lambda session=session: self._refocus(session))
+            self.sessions.append(session)
+            self.logger.info(f"加载窗口{name}: {len(steps)}个步骤，手机号文件{excel_path}，分区{partition}")
+        return self.sessions
+
+    def _focus(self, session: WindowSession):
+        """切换到指定窗口，已是当前窗口时不重复切换"""
+        if self._focused is session:
+            return
+        if session.window_title:
+            if not self.backend.focus_window(session.window_title):
+                self.logger.warning(f"未找到窗口: {session.window_title}")
+        elif session.focus:
+            self.backend.click(session.focus['x'], session.focus['y'])
+        self._focused = session
+        time.sleep(self.focus_delay)
+
+    def _refocus(self, session: WindowSession) -> bool:
+        """自动恢复时重新切换到该窗口，即使已是当前窗口"""
+        if not session.window_title and not session.focus:
+            return False
+        self._focused = None
+        self._focus(session)
+        return True
+
+    def _recover(self, session: WindowSession) -> Generator[float, None, bool]:
+        """连续失败后自动恢复窗口界面，恢复期间其他窗口继续运行
+        Returns:
+            是否重试当前行
+        """
+        failures = session.consecutive_failures
+        if failures < self.escalate_after:
+            print(f"[{session.name}] 检测到连续{failures}次匹配失败，正在自动恢复界面...")
+            self.logger.warning(f"[{session.name}] 检测到连续{failures}次匹配失败，开始自动恢复")
+            action = yield from session.recovery.iter_recover()
+            if action == NO_ACTION:
+                session.consecutive_failures = 0
+                return False
+            if action is not None:
+                print(f"[{session.name}] 界面已恢复（{action}）")
+                return True
+        return (yield from self._escalate(session))
+
+    def _escalate(self, session: WindowSession) -> Generator[float, None, bool]:
+        """暂停该窗口等待人工处理，期间定时再尝试自动恢复，其他窗口继续运行"""
+        print(f"\n警告：窗口{session.name}自动恢复失败，已暂停该窗口，其他窗口继续运行")
+        print("检查窗口是否被遮挡、界面是否变化后按Ctrl+F1继续（重试当前记录）")
+        self.logger.warning(f"窗口{session.name}自动恢复失败，暂停等待人工处理")
+        session.paused = True
+        started = time.perf_counter()
+        next_retry = time.monotonic() + (self.escalation_retry_interval or 0)
+        while session.paused and self.running:
+            yield 0.5
+            if self.escalation_retry_interval and time.monotonic() >= next_retry:
+                if (yield from session.recovery.iter_recover()) is not None:
+                    print(f"[{session.name}] 界面已自动恢复，继续处理")
+                    self.logger.info(f"[{session.name}] 暂停期间界面已自动恢复，继续处理")
+                    session.paused = False
+                next_retry = time.monotonic() + self.escalation_retry_interval
+        self.metrics.observe('recovery', 'manual', time.perf_counter() - started)
+        session.consecutive_failures = 0
+        return self.running
+
+    def _set_status(self, session: WindowSession, index: int, phone, status: str):
+        session.journal.record(index, phone, status, window=session.name)
+        session.counts[status if not status.startswith('错误:') else '错误'] += 1
+
+    def _checkpoint(self, excel_path: str, journal: ProgressJournal):
+        """在后台线程中导出检查点"""
+        if journal.has_pending():
+            self.io_worker.submit(self._write_checkpoint, excel_path, journal, journal.snapshot())
+
+    def _write_checkpoint(self, excel_path: str, journal: ProgressJournal, statuses: Dict[int, str]):
+        try:
+            write_checkpoint(excel_path, statuses)
+            journal.compact(statuses)
+            self.logger.info(f"进度已保存到文件: {excel_path}")
+        except Exception as e:
+            self.logger.error(f"保存文件失败，进度仍保留在日志中: {excel_path}: {e}")
+
+    def _run_session(self, session: WindowSession) -> Generator[float, None, None]:
+        """逐行处理一个窗口的手机号"""
+        for index, phone, _ in session.source:
+            while self.paused and self.running:
+                yield 0.1
+            if not self.running:
+                return
+            automation = session.automation
+            normalized = normalize_phone(phone)
+            if normalized is None:
+                self._set_status(session, index, phone, INVALID_STATUS)
+                continue
+            # 其他窗口可能刚刚添加过同一个号码
+            if self.phone_index is not None and self.phone_index.contains(normalized):
+                self._set_status(session, index, phone, ADDED_STATUS)
+                continue
+            phone = normalized
+
+            # 额度用完时只让出控制权，其他窗口（账号）继续处理
+            while not automation.scheduler.acquire():
+                if not self.running:
+                    return
+                yield min(max(automation.scheduler.delay()[0], 0.05), 1.0)
+
+            processed = session.counts['已处理']
+            row_started = time.perf_counter()
+            print(f"[{session.name}] 开始处理第 {index + 1} 条记录，手机号: {phone}")
+            self.logger.info(f"[{session.name}] 开始处理第 {index + 1} 条记录，手机号: {phone}")
+            try:
+                outcome = yield from session.pipeline.iter_run(str(phone))
+                retries = 0
+                while True:
+                    # 任一步骤验证通过即重置连续失败计数器
+                    if outcome.completed:
+                        session.consecutive_failures = 0
+                    if outcome.success:
+                        break
+                    error_msg = f"[{session.name}] 步骤{outcome.failed_step.index}验证失败：界面不匹配 {outcome.debug_path}"
+                    print(error_msg)
+                    self.logger.error(error_msg)
+                    session.consecutive_failures += 1
+                    if session.consecutive_failures < self.failure_threshold or retries >= self.row_retries:
+                        break
+                    if not (yield from self._recover(session)):
+                        break
+                    retries += 1
+                    print(f"[{session.name}] 重试第 {index + 1} 条记录，手机号: {phone}")
+                    self.logger.info(f"[{session.name}] 重试第 {index + 1} 条记录，手机号: {phone}")
+                    outcome = yield from session.pipeline.iter_run(str(phone))
+
+                if not outcome.success:
+                    self._set_status(session, index, phone, '添加失败')
+                else:
+                    print(f"[{session.name}] 手机号 {phone} 处理完成")
+                    self.logger.info(f"[{session.name}] 手机号 {phone} 处理完成")
+                    self._set_status(session, index, phone, '已处理')
+                    if self.phone_index is not None:
+                        self.phone_index.add(phone)
+            except Exception as e:
+                self.logger.error(f"[{session.name}] 处理手机号 {phone} 时出错: {e}")
+                self._set_status(session, index, phone, f'错误: {str(e)}')
+            automation.scheduler.record_result(session.counts['已处理'] > processed)
+            self.metrics.row_finished(index, time.perf_counter() - row_started)
+            self.metrics.maybe_export(self.io_worker)
+
+            session.rows_since_checkpoint += 1
+            if session.rows_since_checkpoint >= self.checkpoint_interval:
+                self._checkpoint(session.excel_path, session.journal)
+                if self.wait_profile is not None:
+                    self.io_worker.submit(self.wait_profile.save, self.wait_profile.snapshot())
+                session.rows_since_checkpoint = 0
+
+    def run(self):
+        """轮流推进所有窗口，直到全部处理完成或收到停止信号"""
+        if not self.sessions:
+            print("没有可运行的窗口")
+            return
+        self.backend.add_hotkey('ctrl+f1', self._toggle_pause)
+        self.backend.add_hotkey('ctrl+f2', self._stop)
+        if self.wait_profile_path:
+            self.wait_profile = WaitProfile(self.wait_profile_path, self.wait_percentile, logger=self.logger).load()
+        self.metrics = RunMetrics(self.metrics_path, logger=self.logger)
+        for session in self.sessions:
+            session.automation.metrics = self.metrics
+            session.pipeline.add_hook(self.metrics.observe)
+            session.pipeline.wait_profile = self.wait_profile
+        self.running = True
+        print(f"\n开始多窗口处理，共 {len(self.sessions)} 个窗口，按Ctrl+F1暂停/继续，按Ctrl+F2结束")
+        self.logger.info(f"开始多窗口处理，共 {len(self.sessions)} 个窗口")
+
+        # (就绪时间, 序号, 窗口, 生成器)
+        queue = [(0.0, i, session, self._run_session(session)) for i, session in enumerate(self.sessions)]
+        heapq.heapify(queue)
+        try:
+            while queue:
+                ready_at, order, session, task = heapq.heappop(queue)
+                delay = ready_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                # 窗口让出控制权期间界面可能变化，恢复执行时不复用之前的截图
+                session.automation.frames.invalidate()
+                try:
+                    wait = next(task)
+                except StopIteration:
+                    continue
+                heapq.heappush(queue, (time.monotonic() + wait, order, session, task))
+        finally:
+            self.backend.unhook_all()
+            journals = {}
+            for session in self.sessions:
+                session.source.close()
+                journals[session.excel_path] = session.journal
+            for excel_path, journal in journals.items():
+                self._checkpoint(excel_path, journal)
+            if self.phone_index is not None:
+                self.io_worker.submit(self.phone_index.compact)
+            if self.failure_store.saved or self.failure_store.deduplicated:
+                self.logger.info(f"失败截图统计: {self.failure_store.stats()}")
+            self.io_worker.submit(self.failure_store.prune)
+            if self.wait_profile is not None:
+                self.io_worker.submit(self.wait_profile.save, self.wait_profile.snapshot())
+                self.logger.info(f"界面响应时间统计: {self.wait_profile.stats()}")
+            for session in self.sessions:
+                if session.recovery.attempts:
+                    self.logger.info(f"窗口{session.name}自动恢复统计: {session.recovery.stats()}")
+                self.logger.info(f"窗口{session.name}截图统计: {session.automation.frames.stats()}")
+            self.io_worker.flush()
+            for journal in journals.values():
+                journal.close()
+            self.logger.info(f"后台写入统计: {self.io_worker.stats()}")
+            try:
+                self.metrics.export()
+                self.logger.info(f"运行统计:\n{self.metrics.format_summary()}")
+            except Exception as e:
+                self.logger.warning(f"导出运行统计失败: {e}")
+            self._print_summary()
+
+    def _print_summary(self):
+        print("\n多窗口处理结果统计")
+        print("=" * 50)
+        for session in self.sessions:
+            counts = dict(session.counts)
+            state = '等待人工处理' if session.paused else '完成'
+            print(f"窗口{session.name}（{state}）: {counts}")
+            self.logger.info(f"窗口{session.name}（{state}）处理结果: {counts}")
+        print("=" * 50)
+
+    def _toggle_pause(self):
+        """暂停/继续所有窗口；有窗口在等待人工处理时只让这些窗口继续"""
+        escalated = [session for session in self.sessions if session.paused]
+        if escalated:
+            for session in escalated:
+                session.paused = False
+                print(f"窗口{session.name}继续运行")
+                self.logger.info(f"窗口{session.name}人工处理完成，继续运行")
+            return
+        self.paused = not self.paused
+        status = "已暂停" if self.paused else "继续运行"
+        print(status)
+        self.logger.info(status)
+
+    def _stop(self):
+        """停止所有窗口"""
+        self.running = False
+        self.logger.info("程序已停止")
+        print("程序已停止")
@@ -0,0 +1,217 @@
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from phone_source import PhoneRow, PhoneSource
+
+DEFAULT_INDEX_FILE = 'phone_index.npy'
+
+INVALID_STATUS = '无效手机号'
+DUPLICATE_STATUS = '重复手机号'
+ADDED_STATUS = '已添加过'
+
+# 清洗时去掉的分隔符
+SEPARATORS = (' ', '\u00a0', '\u3000', '-', '\t', '(', ')')
+# 国家码前缀及带前缀时的总长度
+COUNTRY_PREFIXES = (('+86', 14), ('0086', 15), ('86', 13))
+
+_POWERS = 10 ** np.arange(10, -1, -1, dtype=np.int64)
+
+
+def normalize_phones(values: Iterable) -> np.ndarray:
+    """向量化地清洗和校验一列手机号
+    去掉空格、横线等分隔符和+86/0086/86国家码，Excel中以浮点数存储的号码（13800000000.0）还原为整数，
+    只有11位数字、以13~19开头的号码视为合法的手机号。
+    Args:
+        values: 手机号单元格的值
+    Returns:
+        int64数组，合法的手机号为号码本身，不合法的为0
+    """
+    text = np.asarray(list(values), dtype=object).astype(str)
+    if not text.size:
+        return np.zeros(0, dtype=np.int64)
+    text = np.char.strip(text)
+    for separator in SEPARATORS:
+        text = np.char.replace(text, separator, '')
+    # 浮点数单元格："13800000000.0" -> "13800000000"
+    head, dot, tail = np.char.rpartition(text, '.').T
+    text = np.where((dot == '.') & (np.char.strip(tail, '0') == ''), head, text)
+    lengths = np.char.str_len(text)
+    for prefix, length in COUNTRY_PREFIXES:
+        strip = (lengths == length) & np.char.startswith(text, prefix)
+        text = np.where(strip, np.char.replace(text, prefix, '', 1), text)
+        lengths = np.where(strip, length - len(prefix), lengths)
+
+    # 按字符编码逐位检查，避免逐个解析字符串
+    codes = np.where(lengths == 11, text, '').astype('U11').view(np.uint32).reshape(-1, 11).astype(np.int64)
+    digits = codes - ord('0')
+    valid = (lengths == 11) & ((digits >= 0) & (digits <= 9)).all(axis=1)
+    valid &= (digits[:, 0] == 1) & (digits[:, 1] >= 3)
+    return np.where(valid, digits @ _POWERS, 0)
+
+
+def normalize_phone(value) -> Optional[str]:
+    """清洗单个手机号，规则与normalize_phones一致
+    Returns:
+        11位手机号，不合法时返回None
+    """
+    # 已是11位数字时直接判断号段，不经过数组运算（处理循环中逐行调用）
+    text = str(value).strip()
+    if len(text) == 11 and text.isascii() and text.isdigit():
+        return text if text[0] == '1' and text[1] >= '3' else None
+    phone = int(normalize_phones([value])[0])
+    return str(phone) if phone else None
+
+
+class PhoneIndex:
+    """所有运行中已成功添加过的手机号索引
+
+    已合并的号码以排序的int64数组保存在.npy文件中（每百万个号码8MB），用二分查找批量判断；
+    运行中新添加的号码立即追加到同名的.log文件，结束时再合并进数组，中断后下次加载时从日志恢复。
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_FILE, logger=None, worker=None):
+        """
+        Args:
+            path: 索引文件路径
+            logger: 日志对象
+            worker: 后台写入线程（IOWorker），为空时同步写入
+        """
+        self.path = path
+        self.log_path = os.path.splitext(path)[0] + '.log'
+        self.worker = worker
+        self._sorted = np.zeros(0, dtype=np.int64)
+        # 尚未合并进数组的号码
+        self._added = set()
+        self._lock = threading.Lock()
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('phone_index')
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._added)
+
+    def load(self) -> 'PhoneIndex':
+        """读取索引文件和尚未合并的追加日志"""
+        if os.path.exists(self.path):
+            self._sorted = np.load(self.path)
+        if os.path.exists(self.log_path):
+            with open(self.log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line.isdigit():
+                        self._added.add(int(line))
+        self.logger.info(f"已加载手机号索引 {self.path}: {len(self)} 个号码")
+        return self
+
+    def contains_many(self, phones: np.ndarray) -> np.ndarray:
+        """批量判断号码是否已添加过
+        Args:
+            phones: normalize_phones的结果
+        Returns:
+            布尔数组
+        """
+        phones = np.asarray(phones, dtype=np.int64)
+        found = np.zeros(phones.shape, dtype=bool)
+        if len(self._sorted):
+            positions = np.searchsorted(self._sorted, phones).clip(max=len(self._sorted) - 1)
+            found = self._sorted[positions] == phones
+        with self._lock:
+            added = np.fromiter(self._added, dtype=np.int64, count=len(self._added))
+        if added.size:
+            found |= np.isin(phones, added)
+        return found & (phones != 0)
+
+    def contains(self, phone: str) -> bool:
+        phone = int(phone)
+        with self._lock:
+            if phone in self._added:
+                return True
+        if not len(self._sorted):
+            return False
+        position = int(np.searchsorted(self._sorted, phone))
+        return position < len(self._sorted) and self._sorted[position] == phone
+
+    def add(self, phone: str):
+        """记录一个已成功添加的号码（normalize_phone的结果）"""
+        with self._lock:
+            self._added.add(int(phone))
+        if self.worker is not None:
+            self.worker.submit(self._append, phone)
+        else:
+            self._append(phone)
+
+    def _append(self, phone: str):
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(f'{phone}\n')
+
+    def compact(self):
+        """将追加日志合并进排序数组，原子地写入索引文件后清空日志"""
+        with self._lock:
+            added = np.fromiter(self._added, dtype=np.int64, count=len(self._added))
+        if not added.size:
+            return
+        merged = np.union1d(self._sorted, added)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.npy', dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, merged)
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self._sorted = merged
+            self._added.difference_update(added.tolist())
+            remaining = list(self._added)
+        # 合并期间新增的号码保留在日志中
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.log', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(''.join(f'{phone}\n' for phone in remaining))
+        os.replace(tmp_path, self.log_path)
+        self.logger.info(f"手机号索引已合并: {len(merged)} 个号码")
+
+
+def precheck(path: str, done: Dict[int, str], index: PhoneIndex = None) -> List[PhoneRow]:
+    """开始处理前一次性检查整个手机号文件，找出不需要进入界面流程的行
+    Args:
+        path: 手机号文件路径
+        done: 进度日志中已有状态的行，{行号: 状态}
+        index: 已添加过的手机号索引
+    Returns:
+        按行号排列的PhoneRow，状态为无效手机号、重复手机号（文件中已出现过）或已添加过（已成功添加过）
+    """
+    rows, values, statuses, pending = [], [], [], []
+    for row in PhoneSource(path, skip_processed=False):
+        status = done.get(row.index, row.status)
+        rows.append(row.index)
+        values.append(row.phone)
+        statuses.append(status)
+        pending.append(status is None)
+    if not rows:
+        return []
+    phones = normalize_phones(values)
+    statuses = np.asarray(statuses, dtype=object)
+    pending = np.asarray(pending)
+    valid = phones != 0
+
+    # 已成功添加过：文件中其他行已处理成功，或在以前的运行中添加过
+    added = pending & valid & np.isin(phones, phones[(statuses == '已处理') & valid])
+    if index is not None:
+        added |= pending & index.contains_many(phones)
+    # 文件中的重复：待处理的合法号码只保留第一次出现的行
+    candidates = np.flatnonzero(pending & valid & ~added)
+    _, first = np.unique(phones[candidates], return_index=True)
+    duplicate = np.zeros(len(rows), dtype=bool)
+    duplicate[candidates] = True
+    duplicate[candidates[first]] = False
+
+    result = []
+    for mask, status in ((pending & ~valid, INVALID_STATUS), (duplicate, DUPLICATE_STATUS), (added, ADDED_STATUS)):
+        result.extend(PhoneRow(rows[i], values[i], status) for i in np.flatnonzero(mask))
+    result.sort()
+    return result
+
@@ -0,0 +1,222 @@
+import csv
+import logging
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+PHONE_COLUMN = '手机号'
+STATUS_COLUMN = '状态'
+
+# 导出Excel时的列宽：第1,2列为9，第3,4列为15
+DEFAULT_COLUMN_WIDTHS = {'A': 9, 'B': 9, 'C': 15, 'D': 15}
+
+
+class PhoneRow(NamedTuple):
+    index: int          # 数据行号（不含表头，从0开始，与原DataFrame索引一致）
+    phone: object       # 手机号单元格的值
+    status: Optional[str]
+
+
+def _is_csv(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in ('.csv', '.txt')
+
+
+def _normalize_cell(value):
+    """Excel中的整数常以浮点数存储，还原为整数"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _iter_raw_rows(path: str) -> Iterator[tuple]:
+    """逐行读取原始单元格（第一行为表头），不把整个文件载入内存"""
+    if _is_csv(path):
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            for values in csv.reader(f):
+                yield tuple(v if v != '' else None for v in values)
+        return
+
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        for values in ws.iter_rows(values_only=True):
+            yield values
+    finally:
+        wb.close()
+
+
+class PhoneSource:
+    """流式读取手机号列表，已有状态的行在读取时直接跳过
+
+    读取的是开始遍历时复制的临时副本，原文件不会一直被打开，处理过程中可以导出检查点替换原文件
+    （Windows上无法替换正在被读取的文件）。处理结束或中断时调用close删除副本。
+    """
+
+    def __init__(self, path: str, done: Dict[int, str] = None, skip_processed: bool = True, logger=None,
+                 partition: Tuple[int, int] = None):
+        """
+        Args:
+            path: 手机号文件路径（.xlsx或.csv）
+            done: 已在进度日志中记录状态的行，{行号: 状态}
+            skip_processed: 是否跳过已有状态的行
+            logger: 日志对象
+            partition: (k, n)，只读取行号除以n余k的行，用于多个窗口分摊同一个文件
+        """
+        self.path = path
+        self.done = done if done is not None else {}
+        self.skip_processed = skip_processed
+        self.partition = partition
+        self.skipped = 0
+        self.total = 0
+        self._rows = None
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('phone_source')
+
+    def __iter__(self) -> Iterator[PhoneRow]:
+        self.close()
+        self._rows = self._iterate()
+        return self._rows
+
+    def close(self):
+        """结束正在进行的遍历，关闭并删除临时副本"""
+        if self._rows is not None:
+            self._rows.close()
+            self._rows = None
+
+    def _iterate(self) -> Iterator[PhoneRow]:
+        self.skipped = 0
+        self.total = 0
+        fd, snapshot = tempfile.mkstemp(prefix='phones_', suffix=os.path.splitext(self.path)[1])
+        os.close(fd)
+        rows = None
+        try:
+            shutil.copyfile(self.path, snapshot)
+            rows = _iter_raw_rows(snapshot)
+            yield from self._parse(rows)
+        finally:
+            if rows is not None:
+                rows.close()
+            os.remove(snapshot)
+
+    def _parse(self, rows: Iterator[tuple]) -> Iterator[PhoneRow]:
+        header = next(rows, None)
+        if header is None:
+            return
+        header = list(header)
+        if PHONE_COLUMN not in header:
+            raise ValueError(f"文件缺少'{PHONE_COLUMN}'列: {self.path}")
+        phone_col = header.index(PHONE_COLUMN)
+        status_col = header.index(STATUS_COLUMN) if STATUS_COLUMN in header else None
+
+        part, parts = self.partition or (0, 1)
+        for index, values in enumerate(rows):
+            if index % parts != part:
+                continue
+            self.total += 1
+            status = values[status_col] if status_col is not None and status_col < len(values) else None
+            if self.skip_processed and (not _is_blank(status) or index in self.done):
+                self.skipped += 1
+                continue
+            phone = _normalize_cell(values[phone_col]) if phone_col < len(values) else None
+            yield PhoneRow(index, phone, None if _is_blank(status) else status)
+
+
+def estimate_rows(path: str) -> Optional[int]:
+    """快速估算数据行数（不含表头），用于计算剩余时间"""
+    try:
+        if _is_csv(path):
+            with open(path, 'rb') as f:
+                return max(0, sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 20), b'')) - 1)
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True)
+        try:
+            max_row = wb.active.max_row
+        finally:
+            wb.close()
+        return max(0, max_row - 1) if max_row else None
+    except Exception:
+        return None
+
+
+def write_checkpoint(path: str, statuses: Dict[int, str], column_widths: Dict[str, float] = None):
+    """将状态合并进手机号文件：逐行读取原文件写入临时文件，完成后原子替换
+    Args:
+        path: 手机号文件路径（.xlsx或.csv）
+        statuses: 需要写入的状态，{行号: 状态}
+        column_widths: Excel列宽，{列字母: 列宽}
+    """
+    column_widths = DEFAULT_COLUMN_WIDTHS if column_widths is None else column_widths
+    directory = os.path.dirname(os.path.abspath(path))
+    suffix = os.path.splitext(path)[1]
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix, prefix='.tmp_', dir=directory)
+    os.close(fd)
+
+    def merged_rows():
+        rows = _iter_raw_rows(path)
+        header = list(next(rows, None) or [PHONE_COLUMN])
+        if STATUS_COLUMN not in header:
+            header.append(STATUS_COLUMN)
+        status_col = header.index(STATUS_COLUMN)
+        yield header
+        for index, values in enumerate(rows):
+            values: List = list(values)
+            if index in statuses:
+                values.extend([None] * (status_col + 1 - len(values)))
+                values[status_col] = statuses[index]
+            yield values
+
+    try:
+        if _is_csv(path):
+            with open(tmp_path, 'w', encoding='utf-8-sig', newline='') as f:
+                writer = csv.writer(f)
+                for values in merged_rows():
+                    writer.writerow(['' if v is None else v for v in values])
+        else:
+            from openpyxl import Workbook
+            wb = Workbook(write_only=True)
+            ws = wb.create_sheet()
+            for column, width in column_widths.items():
+                ws.column_dimensions[column].width = width
+            for values in merged_rows():
+                ws.append(values)
+            wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def summarize(path: str, done: Dict[int, str] = None) -> Dict[str, int]:
+    """流式统计手机号文件中各状态的数量
+    Args:
+        path: 手机号文件路径
+        done: 进度日志中尚未写入文件的状态，{行号: 状态}，优先于文件中的状态
+    """
+    counts = {'total': 0, 'processed': 0, 'failed': 0, 'invalid': 0, 'duplicate': 0, 'error': 0, 'skipped': 0}
+    done = done or {}
+    for row in PhoneSource(path, skip_processed=False):
+        counts['total'] += 1
+        status = done.get(row.index, row.status)
+        if status is None:
+            counts['skipped'] += 1
+        elif status == '已处理':
+            counts['processed'] += 1
+        elif status == '添加失败':
+            counts['failed'] += 1
+        elif status == '无效手机号':
+            counts['invalid'] += 1
+        elif status in ('重复手机号', '已添加过'):
+            counts['duplicate'] += 1
+        elif str(status).startswith('错误:'):
+            counts['error'] += 1
+    return counts
@@ -0,0 +1,170 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, List
+
+def journal_path_for(excel_path: str) -> str:
+    """根据Excel文件路径得到对应的进度日志路径"""
+    root, _ = os.path.splitext(excel_path)
+    return f'{root}.journal.jsonl'
+
+
+class ProgressJournal:
+    """只追加的处理进度日志（JSONL）
+
+    未指定worker时每条状态写入后立即落盘；指定后台写入线程时，状态先放入缓冲区，
+    由后台线程成批写入并只做一次fsync，处理线程不再等待磁盘。
+    打开、写入和压缩替换日志文件都在同一把文件锁内进行，压缩期间的写入不会落到被替换掉的旧文件。
+    """
+
+    def __init__(self, path: str, logger=None, worker=None):
+        """
+        Args:
+            path: 日志文件路径
+            logger: 日志对象
+            worker: 后台写入线程（IOWorker），为空时同步写入
+        """
+        self.path = path
+        self.worker = worker
+        self._file = None
+        self.records_written = 0
+        # 尚未写入检查点的状态，{行号: 状态}
+        self.pending: Dict[int, str] = {}
+        # 尚未写入检查点的每行最新记录，压缩日志时原样保留
+        self._lines: Dict[int, str] = {}
+        self._buffer: List[str] = []
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+        # 保护日志文件的打开、写入、关闭和替换
+        self._file_lock = threading.RLock()
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('progress_journal')
+
+    def open(self):
+        with self._file_lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+        return self
+
+    def close(self):
+        with self._file_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def record(self, row: int, phone: str, status: str, **fields):
+        """追加一条行状态记录
+        Args:
+            row: 行号（DataFrame索引）
+            phone: 手机号
+            status: 处理状态
+            **fields: 额外记录的字段，如多窗口时的窗口名
+        """
+        entry = {
+            'row': int(row),
+            'phone': str(phone),
+            'status': status,
+            'time': datetime.now().isoformat(timespec='seconds'),
+        }
+        entry.update(fields)
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self.records_written += 1
+            self.pending[int(row)] = status
+            self._lines[int(row)] = line
+            self._buffer.append(line)
+            schedule = self.worker is not None and not self._flush_scheduled
+            if schedule:
+                self._flush_scheduled = True
+        if self.worker is None:
+            self.flush()
+        elif schedule:
+            self.worker.submit(self.flush)
+
+    def flush(self):
+        """将缓冲区中的记录一次性写入并落盘"""
+        with self._file_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+                self._flush_scheduled = False
+            if not lines:
+                return
+            self.open()
+            self._file.write(''.join(lines))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def replay(self) -> Dict[int, str]:
+        """读取日志中每一行的最新状态，崩溃时写了一半的末行会被忽略
+        Returns:
+            {行号: 状态}
+        """
+        statuses = {}
+        lines = {}
+        if not os.path.exists(self.path):
+            return statuses
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                    statuses[int(entry['row'])] = entry['status']
+                    lines[int(entry['row'])] = line + '\n'
+                except (ValueError, KeyError, TypeError):
+                    self.logger.warning(f"忽略无法解析的进度记录: {self.path}:{line_no}")
+        with self._lock:
+            self.pending.update(statuses)
+            self._lines.update(lines)
+        return statuses
+
+    def has_pending(self) -> bool:
+        """是否有尚未写入检查点的记录"""
+        return bool(self.pending) or (os.path.exists(self.path) and os.path.getsize(self.path) > 0)
+
+    def snapshot(self) -> Dict[int, str]:
+        """当前尚未写入检查点的状态副本，用于在后台线程中导出检查点"""
+        with self._lock:
+            return dict(self.pending)
+
+    def compact(self, checkpointed: Dict[int, str]):
+        """检查点写入完成后，从日志中移除已写入检查点的记录
+        导出检查点期间新增的记录会保留在日志中，下一次检查点时再写入
+        Args:
+            checkpointed: 已写入检查点的状态，{行号: 状态}
+        """
+        with self._file_lock:
+            self.flush()
+            with self._lock:
+                for row, status in checkpointed.items():
+                    if self.pending.get(row) == status:
+                        del self.pending[row]
+                        self._lines.pop(row, None)
+                remaining = list(self._lines.values())
+            # 关闭、替换期间持有文件锁，其他线程的写入等替换完成后追加到新文件
+            self.close()
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.jsonl', dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(''.join(remaining))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def truncate(self):
+        """检查点写入完成后清空日志"""
+        self.compact(self.snapshot())
+
@@ -0,0 +1,291 @@
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Tuple
+
+DEFAULT_RATE_FILE = 'rate_limits.json'
+DEFAULT_STATE_FILE = 'rate_state.json'
+
+# 默认限额：每分钟、每小时、每天最多发送的好友邀请数
+DEFAULT_LIMITS = {
+    'account': 'default',
+    'per_minute': 4,
+    'per_hour': 80,
+    'per_day': 300,
+    # 工作时间段，如[["09:00", "12:00"], ["13:30", "18:00"]]，为空表示不限制
+    'working_hours': [],
+    # 两次界面操作之间的随机间隔（秒），取值集中在中间，不会超出范围
+    'action_gap': [1.0, 2.5],
+    # 最近failure_window行中失败比例达到failure_ratio时暂停，暂停时间逐次翻倍
+    'failure_window': 10,
+    'failure_ratio': 0.5,
+    'backoff_seconds': 60,
+    'max_backoff_seconds': 1800,
+}
+
+
+class TokenBucket:
+    """令牌桶：容量为limit，每period秒匀速补满"""
+
+    __slots__ = ('limit', 'period', 'tokens', 'updated')
+
+    def __init__(self, limit: float, period: float, tokens: float = None, updated: float = None):
+        self.limit = limit
+        self.period = period
+        self.tokens = limit if tokens is None else min(limit, tokens)
+        self.updated = time.time() if updated is None else updated
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.limit, self.tokens + (now - self.updated) * self.limit / self.period)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """距离可以取出一个令牌还需等待的秒数"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * self.period / self.limit
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+def _parse_clock(value: str) -> int:
+    """"HH:MM"转为当天的分钟数"""
+    hours, minutes = value.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def load_rate_limits(path: str = DEFAULT_RATE_FILE, logger=None) -> Dict:
+    """读取限速配置，未配置的项使用默认值
+    Args:
+        path: 配置文件路径，文件不存在时使用默认配置
+        logger: 日志对象
+    Returns:
+        限速配置
+    """
+    limits = dict(DEFAULT_LIMITS)
+    if path and os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(DEFAULT_LIMITS)
+        if unknown and logger:
+            logger.warning(f"限速配置中有未知的项，已忽略: {sorted(unknown)}")
+        limits.update({key: value for key, value in overrides.items() if key in DEFAULT_LIMITS})
+    return limits
+
+
+class RateScheduler:
+    """按账号限制好友邀请速度
+
+    每行开始前通过acquire/wait申请许可：每分钟和每小时的额度用令牌桶控制，每天的额度按自然日计数，
+    工作时间段外和失败过多后的退避期间不发放许可。额度用完之前不额外等待，从而在限额内尽可能快地处理。
+    每天的计数和令牌桶状态保存在状态文件中，重启程序不会重置额度。
+    """
+
+    def __init__(self, limits: Dict = None, state_path: str = DEFAULT_STATE_FILE, logger=None, worker=None):
+        """
+        Args:
+            limits: 限速配置（load_rate_limits的结果），为空时使用默认配置
+            state_path: 额度状态文件路径，为空时不保存
+            logger: 日志对象
+            worker: 后台写入线程（IOWorker），设置后额度状态在后台写盘
+        """
+        self.limits = dict(DEFAULT_LIMITS)
+        self.limits.update(limits or {})
+        self.account = str(self.limits['account'])
+        self.state_path = state_path
+        self.worker = worker
+        self._setup_logging(logger)
+
+        self.buckets: Dict[str, TokenBucket] = {}
+        for name, key, period in (('minute', 'per_minute', 60.0), ('hour', 'per_hour', 3600.0)):
+            if self.limits.get(key):
+                self.buckets[name] = TokenBucket(float(self.limits[key]), period)
+        self.per_day = self.limits.get('per_day') or None
+        self.day = datetime.now().strftime('%Y-%m-%d')
+        self.day_count = 0
+        self.working_hours: List[Tuple[int, int]] = [
+            (_parse_clock(start), _parse_clock(end)) for start, end in self.limits.get('working_hours') or []]
+
+        self.results = deque(maxlen=int(self.limits['failure_window']))
+        self.backoff_level = 0
+        self.backoff_until = 0.0
+        self.granted = 0
+        self._load_state()
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('rate_scheduler')
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f).get(self.account, {})
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"读取限速状态失败，额度从零开始计算: {e}")
+            return
+        if state.get('day') == self.day:
+            self.day_count = int(state.get('count', 0))
+        for name, (tokens, updated) in state.get('buckets', {}).items():
+            if name in self.buckets:
+                bucket = self.buckets[name]
+                self.buckets[name] = TokenBucket(bucket.limit, bucket.period, tokens, updated)
+
+    def _save_state(self):
+        """保存额度状态，设置了后台写入线程时在后台写盘"""
+        if not self.state_path:
+            return
+        current = {
+            'day': self.day,
+            'count': self.day_count,
+            'buckets': {name: [bucket.tokens, bucket.updated] for name, bucket in self.buckets.items()},
+        }
+        if self.worker is not None:
+            self.worker.submit(self._write_state, current)
+        else:
+            self._write_state(current)
+
+    def _write_state(self, current: Dict):
+        """原子地写入本账号的额度状态，保留其他账号的记录"""
+        try:
+            state = {}
+            if os.path.exists(self.state_path):
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            state[self.account] = current
+            directory = os.path.dirname(os.path.abspath(self.state_path))
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.json', dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.state_path)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"保存限速状态失败: {e}")
+
+    def _roll_day(self, now: float):
+        day = datetime.fromtimestamp(now).strftime('%Y-%m-%d')
+        if day != self.day:
+            self.day = day
+            self.day_count = 0
+
+    def _until_working(self, now: float) -> float:
+        """距离下一个工作时间段开始的秒数，当前在工作时间内时返回0"""
+        if not self.working_hours:
+            return 0.0
+        current = datetime.fromtimestamp(now)
+        minute = current.hour * 60 + current.minute
+        for start, end in self.working_hours:
+            if start <= minute < end:
+                return 0.0
+        midnight = current.replace(hour=0, minute=0, second=0, microsecond=0)
+        starts = sorted(start for start, _ in self.working_hours)
+        later = [start for start in starts if start > minute]
+        next_start = midnight + timedelta(minutes=later[0]) if later else midnight + timedelta(days=1, minutes=starts[0])
+        return max(0.0, next_start.timestamp() - now)
+
+    def _until_tomorrow(self, now: float) -> float:
+        current = datetime.fromtimestamp(now)
+        tomorrow = current.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        return max(0.0, tomorrow.timestamp() - now)
+
+    def delay(self, now: float = None) -> Tuple[float, str]:
+        """距离下一次许可还需等待的秒数及原因，可以立即开始时返回(0, '')"""
+        now = time.time() if now is None else now
+        self._roll_day(now)
+        waits = [(self._until_working(now), '不在工作时间内'),
+                 (self.backoff_until - now, '失败过多，暂停处理')]
+        if self.per_day and self.day_count >= self.per_day:
+            waits.append((self._until_tomorrow(now), '已达到今日添加上限'))
+        names = {'minute': '已达到每分钟添加上限', 'hour': '已达到每小时添加上限'}
+        for name, bucket in self.buckets.items():
+            waits.append((bucket.wait_time(now), names[name]))
+        seconds, reason = max(waits)
+        return (seconds, reason) if seconds > 0 else (0.0, '')
+
+    def acquire(self, now: float = None) -> bool:
+        """尝试取得一次许可（消耗额度）
+        Returns:
+            当前不允许开始时返回False，不消耗额度
+        """
+        now = time.time() if now is None else now
+        if self.delay(now)[0] > 0:
+            return False
+        for bucket in self.buckets.values():
+            bucket.take(now)
+        self.day_count += 1
+        self.granted += 1
+        self._save_state()
+        return True
+
+    def wait(self, should_continue: Callable[[], bool] = None, sleep: Callable[[float], None] = time.sleep,
+             max_sleep: float = 1.0) -> bool:
+        """阻塞等待直到取得许可，每次最多睡眠max_sleep秒以便及时响应停止信号
+        Args:
+            should_continue: 返回False时放弃等待
+            sleep: 睡眠函数
+            max_sleep: 单次睡眠的最长秒数
+        Returns:
+            取得许可返回True，被停止时返回False
+        """
+        last_reason = None
+        while True:
+            if should_continue is not None and not should_continue():
+                return False
+            seconds, reason = self.delay()
+            if seconds <= 0 and self.acquire():
+                return True
+            if reason and reason != last_reason and seconds >= 5:
+                message = f"{reason}，约 {seconds / 60:.1f} 分钟后继续"
+                print(message)
+                self.logger.info(message)
+            last_reason = reason
+            sleep(min(max(seconds, 0.05), max_sleep))
+
+    def action_gap(self) -> float:
+        """两次界面操作之间的随机间隔，集中在范围中间且不超出范围"""
+        low, high = self.limits['action_gap']
+        if high <= low:
+            return float(low)
+        return random.triangular(low, high)
+
+    def record_result(self, success: bool, now: float = None):
+        """记录一行的处理结果，最近失败比例过高时按指数退避暂停
+        Args:
+            success: 是否处理成功
+        """
+        now = time.time() if now is None else now
+        self.results.append(bool(success))
+        failures = self.results.count(False)
+        window = self.results.maxlen
+        if success:
+            if failures / window < self.limits['failure_ratio']:
+                self.backoff_level = 0
+            return
+        # 至少有半个窗口的样本后才判断失败比例
+        if len(self.results) * 2 >= window and failures / len(self.results) >= self.limits['failure_ratio']:
+            seconds = min(self.limits['backoff_seconds'] * 2 ** self.backoff_level, self.limits['max_backoff_seconds'])
+            self.backoff_level += 1
+            self.backoff_until = now + seconds
+            self.results.clear()
+            message = f"最近失败比例过高，暂停处理 {seconds:.0f} 秒"
+            print(message)
+            self.logger.warning(message)
+
+    def stats(self) -> Dict[str, object]:
+        """当前额度使用情况"""
+        now = time.time()
+        result = {'account': self.account, 'granted': self.granted, 'day_count': self.day_count,
+                  'per_day': self.per_day, 'backoff_level': self.backoff_level}
+        for name, bucket in self.buckets.items():
+            bucket.wait_time(now)
+            result[f'{name}_tokens'] = round(bucket.tokens, 2)
+        return result
@@ -0,0 +1,222 @@
+import logging
+import time
+from collections import Counter
+from typing import Callable, Dict, Generator, List, Optional, Tuple
+
+import numpy as np
+
+from locator import to_gray
+from step_pipeline import StepSpec, run_blocking
+
+# 第一步界面已经就绪，不需要任何恢复动作
+NO_ACTION = 'none'
+
+
+def steps_region(steps: List[StepSpec], padding: int = 40, screen_size: Tuple[int, int] = None) -> Tuple[int, int, int, int]:
+    """覆盖所有步骤截图区域的矩形(left, top, width, height)，作为界面状态的观察区域
+    Args:
+        steps: 步骤列表
+        padding: 向外扩展的像素数
+        screen_size: 屏幕分辨率（宽, 高），指定时截掉超出屏幕的部分
+    """
+    left = max(0, min(step.x - round(40 * step.scale) for step in steps) - padding)
+    top = max(0, min(step.y - round(25 * step.scale) for step in steps) - padding)
+    right = max(step.x + round(40 * step.scale) for step in steps) + padding
+    bottom = max(step.y + round(25 * step.scale) for step in steps) + padding
+    if screen_size is not None:
+        right = min(right, screen_size[0])
+        bottom = min(bottom, screen_size[1])
+    return left, top, right - left, bottom - top
+
+
+class FrameWatchdog:
+    """通过帧差判断界面状态：对观察区域隔一段时间截图，比较缩小后的灰度图
+
+    两次截图几乎相同说明界面已静止（卡在某个界面或弹窗上），持续变化说明界面仍在加载或动画中。
+    """
+
+    def __init__(self, capture: Callable[[], object], threshold: float = 2.0, scale: int = 4,
+                 tick: Callable[[], None] = None):
+        """
+        Args:
+            capture: 截取观察区域的函数，返回RGB数组
+            threshold: 平均灰度差低于该值时视为画面未变化
+            scale: 缩小倍数
+            tick: 每次等待前调用，使下一次截图不复用等待前的画面
+        """
+        self.capture = capture
+        self.tick = tick
+        self.threshold = threshold
+        self.scale = scale
+
+    def signature(self) -> np.ndarray:
+        gray = to_gray(self.capture()[::self.scale, ::self.scale])
+        return gray.astype(np.int16)
+
+    @staticmethod
+    def difference(a: np.ndarray, b: np.ndarray) -> float:
+        if a.shape != b.shape:
+            return float('inf')
+        return float(np.abs(a - b).mean())
+
+    def iter_wait_stable(self, timeout: float, interval: float = 0.3) -> Generator[float, None, bool]:
+        """等待画面静止
+        Returns:
+            timeout秒内画面是否静止
+        """
+        deadline = time.monotonic() + timeout
+        previous = self.signature()
+        while True:
+            if self.tick is not None:
+                self.tick()
+            yield interval
+            current = self.signature()
+            if self.difference(previous, current) < self.threshold:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            previous = current
+
+
+class Recovery:
+    """连续失败后的自愈流程
+
+    先等待界面静止，判断第一步界面是否已经就绪；未就绪时依次执行恢复动作（按Esc关闭弹窗、
+    重新切换到窗口、在更大范围内重新定位第一步界面），每个动作后检查第一步界面是否出现。
+    所有动作执行rounds轮仍未恢复时返回None，由调用方暂停等待人工处理。
+    每次恢复的动作和耗时（从开始恢复到可以继续处理）记录到运行统计的recovery项中。
+    """
+
+    def __init__(self, automation, steps: List[StepSpec], logger=None, refocus: Callable[[], bool] = None):
+        """
+        Args:
+            automation: MouseAutomation实例
+            steps: 步骤列表，第一步为每行开始时的界面
+            logger: 日志对象
+            refocus: 重新切换到窗口的函数，返回是否执行了切换；为空时跳过该动作
+        """
+        self.automation = automation
+        self.first = steps[0]
+        try:
+            screen_size = automation.backend.screen_size()
+        except Exception:
+            screen_size = None
+        self.region = steps_region(steps, screen_size=screen_size)
+        self.refocus = refocus
+        self.watchdog = FrameWatchdog(self._capture, tick=automation.frames.next_tick)
+        # 界面仍在变化时最多等待的秒数、每个动作后等待第一步界面出现的秒数、动作执行轮数
+        self.settle_timeout = 5.0
+        self.check_timeout = 2.0
+        self.rounds = 2
+        # 重新定位时的搜索半径，以及找到偏移后此后各步骤的搜索半径
+        self.relocate_radius = 300
+        self.follow_radius = 20
+        self.actions: List[Tuple[str, Callable[[], bool]]] = [
+            ('esc', self._escape),
+            ('refocus', self._refocus),
+            ('relocate', self._relocate),
+        ]
+        self.attempts = 0
+        self.outcomes = Counter()
+        self.total_seconds = 0.0
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('recovery')
+
+    def _capture(self):
+        self.automation._activate()
+        return self.automation.frames.crop(*self.region)
+
+    def _first_step_ready(self, timeout: float) -> Generator[float, None, bool]:
+        """在timeout秒内轮询第一步界面，不保存失败截图"""
+        automation = self.automation
+        deadline = time.monotonic() + timeout
+        while True:
+            automation._activate()
+            check = automation.check_template(self.first.target, self.first.threshold, self.first.name)
+            if check is not None and check['matched']:
+                return True
+            if time.monotonic() >= deadline:
+                return False
+            automation.frames.next_tick()
+            yield automation.poll_interval
+
+    def _escape(self) -> bool:
+        """按Esc关闭可能遮挡界面的弹窗或搜索结果"""
+        self.automation.press_key('esc')
+        return True
+
+    def _refocus(self) -> bool:
+        """重新切换到企业微信窗口"""
+        return self.refocus is not None and self.refocus()
+
+    def _relocate(self) -> bool:
+        """在更大范围内搜索第一步界面，窗口被移动时校正此后的点击坐标"""
+        automation = self.automation
+        original = automation.locate_radius
+        automation.locate_radius = max(original, self.relocate_radius)
+        try:
+            automation._activate()
+            check = automation.check_template(self.first.target, self.first.threshold, self.first.name)
+        finally:
+            automation.locate_radius = original
+        if check is not None and check['matched'] and automation.window_offset != (0, 0):
+            # 此后各步骤在新的窗口位置附近搜索
+            automation.locate_radius = max(original, self.follow_radius)
+            self.logger.warning(f"重新定位到窗口偏移 {automation.window_offset}，此后在该位置附近搜索界面")
+        return True
+
+    def _finish(self, outcome: str, started: float):
+        seconds = time.perf_counter() - started
+        self.outcomes[outcome] += 1
+        self.total_seconds += seconds
+        metrics = self.automation.metrics
+        if metrics is not None:
+            metrics.observe('recovery', outcome, seconds)
+        return seconds
+
+    def recover(self) -> Optional[str]:
+        """执行恢复流程，等待时直接睡眠（返回值同iter_recover）"""
+        return run_blocking(self.iter_recover())
+
+    def iter_recover(self) -> Generator[float, None, Optional[str]]:
+        """执行恢复流程，需要等待时让出控制权并给出等待秒数
+        Returns:
+            使界面恢复的动作名，第一步界面本来就已就绪时为NO_ACTION，全部动作都无效时为None
+        """
+        self.attempts += 1
+        started = time.perf_counter()
+        stable = yield from self.watchdog.iter_wait_stable(self.settle_timeout)
+        state = '界面已静止' if stable else f'界面{self.settle_timeout:.0f}秒内持续变化'
+        if (yield from self._first_step_ready(0)):
+            seconds = self._finish(NO_ACTION, started)
+            self.logger.info(f"自动恢复：{state}，第一步界面已就绪，无需恢复（{seconds:.1f}秒）")
+            return NO_ACTION
+        self.logger.warning(f"自动恢复：{state}，但不是第一步界面，开始执行恢复动作")
+
+        for round_index in range(self.rounds):
+            for name, action in self.actions:
+                # 动作不可用（如没有设置窗口标题）时跳过
+                if not action():
+                    continue
+                self.automation.frames.next_tick()
+                yield self.automation.settle_delay
+                if (yield from self._first_step_ready(self.check_timeout)):
+                    seconds = self._finish(name, started)
+                    self.logger.info(f"自动恢复成功：第 {round_index + 1} 轮动作{name}后界面恢复，耗时 {seconds:.1f}秒")
+                    return name
+                self.logger.info(f"自动恢复：动作{name}后第一步界面仍未出现")
+
+        seconds = self._finish('failed', started)
+        self.logger.error(f"自动恢复失败：执行 {self.rounds} 轮恢复动作后第一步界面仍未出现（{seconds:.1f}秒）")
+        return None
+
+    def stats(self) -> Dict:
+        """恢复次数、各结果次数和平均耗时"""
+        return {
+            'attempts': self.attempts,
+            'outcomes': dict(self.outcomes),
+            'mean_seconds': round(self.total_seconds / self.attempts, 3) if self.attempts else 0.0,
+        }
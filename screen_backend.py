@@ -0,0 +1,376 @@
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+Region = Tuple[int, int, int, int]
+
+
+class ScreenBackend:
+    """屏幕截图与鼠标键盘输入的统一接口"""
+
+    # 经由screenshot截图（每次新建图片再复制到缓冲区）的次数
+    copied_grabs = 0
+
+    def screenshot(self, region: Region = None) -> Image.Image:
+        raise NotImplementedError
+
+    def grab_into(self, region: Region, out: np.ndarray) -> np.ndarray:
+        """截取区域写入预先分配的(高, 宽, 3) uint8缓冲区并返回out，默认经由screenshot复制一次"""
+        self.copied_grabs += 1
+        image = self.screenshot(region=region)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        np.copyto(out, np.asarray(image))
+        return out
+
+    def position(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def click(self, x: int, y: int):
+        raise NotImplementedError
+
+    def hotkey(self, *keys: str):
+        raise NotImplementedError
+
+    def press(self, key: str):
+        raise NotImplementedError
+
+    def copy(self, text: str):
+        raise NotImplementedError
+
+    def is_pressed(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def add_hotkey(self, combo: str, callback: Callable[[], None]):
+        raise NotImplementedError
+
+    def focus_window(self, title: str) -> bool:
+        """激活标题包含title的窗口，成功时返回True"""
+        raise NotImplementedError
+
+    def unhook_all(self):
+        raise NotImplementedError
+
+    def screen_size(self) -> Tuple[int, int]:
+        """屏幕分辨率（宽, 高）"""
+        raise NotImplementedError
+
+    def dpi(self) -> int:
+        """屏幕DPI，无法获取时返回96（100%缩放）"""
+        return 96
+
+
+class _GdiCapture:
+    """Windows GDI截图：BitBlt到常驻的32位DIB位图，再按通道直接复制到调用方的缓冲区
+
+    每种截图尺寸只创建一次位图，之后每次截图不新建图片或数组。
+    """
+
+    SRCCOPY = 0x00CC0020
+    CAPTUREBLT = 0x40000000
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+
+        class BITMAPINFOHEADER(ctypes.Structure):
+            _fields_ = [('biSize', wintypes.DWORD), ('biWidth', wintypes.LONG), ('biHeight', wintypes.LONG),
+                        ('biPlanes', wintypes.WORD), ('biBitCount', wintypes.WORD), ('biCompression', wintypes.DWORD),
+                        ('biSizeImage', wintypes.DWORD), ('biXPelsPerMeter', wintypes.LONG),
+                        ('biYPelsPerMeter', wintypes.LONG), ('biClrUsed', wintypes.DWORD), ('biClrImportant', wintypes.DWORD)]
+
+        self.ctypes = ctypes
+        self.header_type = BITMAPINFOHEADER
+        self.user32 = ctypes.windll.user32
+        self.gdi32 = ctypes.windll.gdi32
+        handle = ctypes.c_void_p
+        self.user32.GetDC.restype = handle
+        self.user32.GetDC.argtypes = [handle]
+        self.user32.ReleaseDC.argtypes = [handle, handle]
+        self.gdi32.CreateCompatibleDC.restype = handle
+        self.gdi32.CreateCompatibleDC.argtypes = [handle]
+        self.gdi32.CreateDIBSection.restype = handle
+        self.gdi32.CreateDIBSection.argtypes = [handle, ctypes.c_void_p, wintypes.UINT, ctypes.POINTER(ctypes.c_void_p),
+                                                handle, wintypes.DWORD]
+        self.gdi32.SelectObject.restype = handle
+        self.gdi32.SelectObject.argtypes = [handle, handle]
+        self.gdi32.DeleteObject.argtypes = [handle]
+        self.gdi32.DeleteDC.argtypes = [handle]
+        self.gdi32.BitBlt.argtypes = [handle, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                      handle, ctypes.c_int, ctypes.c_int, wintypes.DWORD]
+        self.screen_dc = self.user32.GetDC(None)
+        self.memory_dc = self.gdi32.CreateCompatibleDC(self.screen_dc)
+        # {(宽, 高): (位图句柄, BGRA视图)}
+        self._bitmaps: Dict[Tuple[int, int], Tuple[int, np.ndarray]] = {}
+
+    def _bitmap(self, width: int, height: int) -> Tuple[int, np.ndarray]:
+        bitmap = self._bitmaps.get((width, height))
+        if bitmap is None:
+            ctypes = self.ctypes
+            header = self.header_type()
+            header.biSize = ctypes.sizeof(header)
+            header.biWidth = width
+            # 高度为负表示自上而下的行顺序，与数组一致
+            header.biHeight = -height
+            header.biPlanes = 1
+            header.biBitCount = 32
+            bits = ctypes.c_void_p()
+            handle = self.gdi32.CreateDIBSection(self.memory_dc, ctypes.byref(header), 0, ctypes.byref(bits), None, 0)
+            if not handle or not bits.value:
+                raise OSError('CreateDIBSection失败')
+            raw = (ctypes.c_uint8 * (width * height * 4)).from_address(bits.value)
+            bitmap = self._bitmaps[(width, height)] = (handle, np.ctypeslib.as_array(raw).reshape(height, width, 4))
+        return bitmap
+
+    def grab_into(self, region: Region, out: np.ndarray) -> np.ndarray:
+        left, top, width, height = region
+        handle, bgra = self._bitmap(width, height)
+        self.gdi32.SelectObject(self.memory_dc, handle)
+        if not self.gdi32.BitBlt(self.memory_dc, 0, 0, width, height, self.screen_dc, left, top,
+                                 self.SRCCOPY | self.CAPTUREBLT):
+            raise OSError('BitBlt失败')
+        np.copyto(out, bgra[..., 2::-1])
+        return out
+
+    def close(self):
+        for handle, _ in self._bitmaps.values():
+            self.gdi32.DeleteObject(handle)
+        self._bitmaps.clear()
+        self.gdi32.DeleteDC(self.memory_dc)
+        self.user32.ReleaseDC(None, self.screen_dc)
+
+
+class PyAutoGUIBackend(ScreenBackend):
+    """基于pyautogui、keyboard和pyperclip的真实桌面后端，依赖在首次使用时导入
+
+    Windows上通过GDI直接截图到调用方的缓冲区（grab_into），其他系统或GDI不可用时经由pyautogui截图。
+    """
+
+    def __init__(self):
+        self._pyautogui = None
+        self._keyboard = None
+        self._gdi = None
+        self._gdi_failed = False
+
+    @property
+    def pyautogui(self):
+        if self._pyautogui is None:
+            import pyautogui
+            self._pyautogui = pyautogui
+        return self._pyautogui
+
+    @property
+    def keyboard(self):
+        if self._keyboard is None:
+            import keyboard
+            self._keyboard = keyboard
+        return self._keyboard
+
+    def screenshot(self, region: Region = None) -> Image.Image:
+        return self.pyautogui.screenshot(region=region)
+
+    def grab_into(self, region: Region, out: np.ndarray) -> np.ndarray:
+        if self._gdi is None and not self._gdi_failed:
+            try:
+                # pyautogui导入时设置进程DPI感知，GDI截图与pyautogui使用相同的物理像素坐标
+                self.pyautogui
+                self._gdi = _GdiCapture()
+            except (ImportError, AttributeError, OSError):
+                self._gdi_failed = True
+        if self._gdi is None:
+            return super().grab_into(region, out)
+        return self._gdi.grab_into(region, out)
+
+    def position(self) -> Tuple[int, int]:
+        x, y = self.pyautogui.position()
+        return x, y
+
+    def click(self, x: int, y: int):
+        self.pyautogui.click(x=x, y=y)
+
+    def hotkey(self, *keys: str):
+        self.pyautogui.hotkey(*keys)
+
+    def press(self, key: str):
+        self.pyautogui.press(key)
+
+    def copy(self, text: str):
+        import pyperclip
+        pyperclip.copy(text)
+
+    def is_pressed(self, key: str) -> bool:
+        return self.keyboard.is_pressed(key)
+
+    def add_hotkey(self, combo: str, callback: Callable[[], None]):
+        self.keyboard.add_hotkey(combo, callback)
+
+    def focus_window(self, title: str) -> bool:
+        windows = self.pyautogui.getWindowsWithTitle(title)
+        if not windows:
+            return False
+        windows[0].activate()
+        return True
+
+    def unhook_all(self):
+        self.keyboard.unhook_all()
+
+    def screen_size(self) -> Tuple[int, int]:
+        width, height = self.pyautogui.size()
+        return width, height
+
+    def dpi(self) -> int:
+        try:
+            import ctypes
+            return int(ctypes.windll.user32.GetDpiForSystem())
+        except (ImportError, AttributeError, OSError):
+            return 96
+
+
+class FakeScreenBackend(ScreenBackend):
+    """模拟的屏幕后端，用于无桌面环境下的基准测试和调试
+
+    按步骤构建一个简单的状态机：当前步骤的模板区域返回模板图片，其余区域返回空白画面；
+    点击当前步骤的坐标后，经过response_delay秒进入下一步骤，最后一步之后回到第一步。
+    设置window_offset可以模拟窗口被移动。
+    也可以通过frames指定固定的截图序列，依次循环返回。
+    """
+
+    def __init__(self, steps: Sequence[Dict] = (), frames: Sequence = (), response_delay: float = 0.0,
+                 screen_size: Tuple[int, int] = (1920, 1080), background: int = 255, dpi: int = 96):
+        """
+        Args:
+            steps: 步骤列表，每项包含x、y和template
+            frames: 固定截图序列（图片路径、PIL图片或numpy数组），非空时优先使用
+            response_delay: 点击后界面切换到下一步骤所需的秒数
+            screen_size: 模拟的屏幕大小
+            dpi: 模拟的屏幕DPI
+            background: 非模板区域的灰度值
+        """
+        self.steps = [dict(step) for step in steps]
+        self._templates = [self._load(step['template']) for step in self.steps]
+        self._template_arrays = [np.asarray(template) for template in self._templates]
+        self._frames = [self._load(frame) for frame in frames]
+        self.response_delay = response_delay
+        self._screen_size = tuple(screen_size)
+        self._dpi = dpi
+        self.background = background
+        self.state = 0
+        self._ready_at = 0.0
+        self._frame_index = 0
+        self._lock = threading.Lock()
+        self.clicks: List[Tuple[int, int]] = []
+        self.keys: List[Tuple[str, ...]] = []
+        self.clipboard = ''
+        self.screenshots = 0
+        self.hotkeys: Dict[str, Callable[[], None]] = {}
+        self.pressed = set()
+        self.mouse = (0, 0)
+        # 模拟窗口被移动后的偏移
+        self.window_offset = (0, 0)
+        self.focused = None
+        self.focus_changes = 0
+
+    @staticmethod
+    def _load(image) -> Image.Image:
+        if isinstance(image, Image.Image):
+            return image.convert('RGB')
+        if isinstance(image, np.ndarray):
+            return Image.fromarray(image)
+        with Image.open(image) as img:
+            return img.convert('RGB')
+
+    def _blank(self, size: Tuple[int, int]) -> Image.Image:
+        return Image.new('RGB', size, (self.background,) * 3)
+
+    def screenshot(self, region: Region = None) -> Image.Image:
+        with self._lock:
+            self.screenshots += 1
+            if region is None:
+                region = (0, 0) + self._screen_size
+            size = (region[2], region[3])
+            if self._frames:
+                frame = self._frames[self._frame_index % len(self._frames)]
+                self._frame_index += 1
+                return frame.copy() if frame.size == size else frame.resize(size)
+            image = self._blank(size)
+            if not self.steps or time.monotonic() < self._ready_at:
+                return image
+            # 当前步骤的模板按窗口偏移绘制在虚拟屏幕上，截取区域内可见的部分
+            step = self.steps[self.state]
+            template = self._templates[self.state]
+            left = max(0, step['x'] - template.width // 2) + self.window_offset[0]
+            top = max(0, step['y'] - template.height // 2) + self.window_offset[1]
+            image.paste(template, (left - region[0], top - region[1]))
+            return image
+
+    def grab_into(self, region: Region, out: np.ndarray) -> np.ndarray:
+        """直接在缓冲区中绘制当前画面，不创建PIL图片"""
+        if self._frames:
+            return super().grab_into(region, out)
+        with self._lock:
+            self.screenshots += 1
+            out[...] = self.background
+            if not self.steps or time.monotonic() < self._ready_at:
+                return out
+            step = self.steps[self.state]
+            template = self._template_arrays[self.state]
+            height, width = template.shape[:2]
+            left = max(0, step['x'] - width // 2) + self.window_offset[0] - region[0]
+            top = max(0, step['y'] - height // 2) + self.window_offset[1] - region[1]
+            # 模板与截图区域的重叠部分
+            x0, y0 = max(left, 0), max(top, 0)
+            x1, y1 = min(left + width, out.shape[1]), min(top + height, out.shape[0])
+            if x0 < x1 and y0 < y1:
+                out[y0:y1, x0:x1] = template[y0 - top:y1 - top, x0 - left:x1 - left]
+            return out
+
+    def position(self) -> Tuple[int, int]:
+        return self.mouse
+
+    def click(self, x: int, y: int):
+        with self._lock:
+            self.clicks.append((x, y))
+            self.mouse = (x, y)
+            if self.steps:
+                step = self.steps[self.state]
+                if (step['x'] + self.window_offset[0], step['y'] + self.window_offset[1]) == (x, y):
+                    self.state = (self.state + 1) % len(self.steps)
+                    self._ready_at = time.monotonic() + self.response_delay
+
+    def hotkey(self, *keys: str):
+        self.keys.append(keys)
+
+    def press(self, key: str):
+        self.keys.append((key,))
+
+    def copy(self, text: str):
+        self.clipboard = text
+
+    def is_pressed(self, key: str) -> bool:
+        return key in self.pressed
+
+    def add_hotkey(self, combo: str, callback: Callable[[], None]):
+        self.hotkeys[combo] = callback
+
+    def focus_window(self, title: str) -> bool:
+        self.focused = title
+        self.focus_changes += 1
+        return True
+
+    def unhook_all(self):
+        self.hotkeys.clear()
+
+    def screen_size(self) -> Tuple[int, int]:
+        return self._screen_size
+
+    def dpi(self) -> int:
+        return self._dpi
+
+    def trigger_hotkey(self, combo: str):
+        """模拟按下已注册的快捷键"""
+        callback = self.hotkeys.get(combo)
+        if callback is not None:
+            callback()
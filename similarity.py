@@ -0,0 +1,222 @@
+from typing import NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+# 通道权重（R, G, B），绿色通道权重更高
+DEFAULT_CHANNEL_WEIGHTS = (0.3, 0.4, 0.3)
+# 局部区域划分（行数, 列数）
+DEFAULT_GRID = (4, 4)
+# 全局相似度与最低局部相似度的权重
+DEFAULT_GLOBAL_WEIGHT = 0.4
+DEFAULT_LOCAL_WEIGHT = 0.6
+
+
+class SimilarityResult(NamedTuple):
+    """批量相似度计算结果，第一维对应输入的每一帧"""
+    final: np.ndarray       # (N,) 最终相似度
+    global_: np.ndarray     # (N,) 三通道加权的全局相似度
+    local: np.ndarray       # (N, 行数, 列数) 各局部区域相似度
+
+    @property
+    def min_local(self) -> np.ndarray:
+        return self.local.reshape(self.local.shape[0], -1).min(axis=1)
+
+
+def _block_bounds(length: int, parts: int) -> Tuple[np.ndarray, np.ndarray]:
+    """计算分块起点和大小，最后一块包含余数像素（与原逐块循环一致）"""
+    if parts <= 0 or length < parts:
+        raise ValueError(f"无法将长度{length}划分为{parts}块")
+    step = length // parts
+    starts = np.arange(parts) * step
+    sizes = np.full(parts, step)
+    sizes[-1] = length - starts[-1]
+    return starts, sizes
+
+
+def score_batch(frames: np.ndarray, template: np.ndarray,
+                channel_weights: Sequence[float] = DEFAULT_CHANNEL_WEIGHTS,
+                grid: Tuple[int, int] = DEFAULT_GRID,
+                global_weight: float = DEFAULT_GLOBAL_WEIGHT,
+                local_weight: float = DEFAULT_LOCAL_WEIGHT) -> SimilarityResult:
+    """一次性计算多帧与同一模板的全局和局部相似度
+    Args:
+        frames: (H, W, 3) 或 (N, H, W, 3) 的RGB图像
+        template: (H, W, 3) 的模板图像，uint8或int16
+        channel_weights: RGB三个通道的权重
+        grid: 局部区域划分（行数, 列数）
+        global_weight: 全局相似度权重
+        local_weight: 最低局部相似度权重
+    Returns:
+        SimilarityResult
+    """
+    frames = np.asarray(frames)
+    if frames.ndim == 3:
+        frames = frames[np.newaxis]
+    if frames.shape[1:] != template.shape:
+        raise ValueError(f"图片大小不匹配: 当前{frames.shape[1:]} vs 模板{template.shape}")
+
+    # int16差值避免uint8相减回绕
+    diff = frames.astype(np.int16)
+    diff -= template
+    np.abs(diff, out=diff)
+    return _score_diff(diff, channel_weights, grid, global_weight, local_weight)
+
+
+def score_variants(frame: np.ndarray, templates: np.ndarray,
+                   channel_weights: Sequence[float] = DEFAULT_CHANNEL_WEIGHTS,
+                   grid: Tuple[int, int] = DEFAULT_GRID,
+                   global_weight: float = DEFAULT_GLOBAL_WEIGHT,
+                   local_weight: float = DEFAULT_LOCAL_WEIGHT) -> SimilarityResult:
+    """一次性计算同一帧与多个模板变体的相似度
+    Args:
+        frame: (H, W, 3) 的RGB截图
+        templates: (V, H, W, 3) 的模板变体，uint8或int16
+    Returns:
+        SimilarityResult，第一维对应每个模板变体
+    """
+    if templates.shape[1:] != frame.shape:
+        raise ValueError(f"图片大小不匹配: 当前{frame.shape} vs 模板{templates.shape[1:]}")
+    diff = templates.astype(np.int16)
+    diff -= frame
+    np.abs(diff, out=diff)
+    return _score_diff(diff, channel_weights, grid, global_weight, local_weight)
+
+
+def _score_diff(diff: np.ndarray, channel_weights, grid, global_weight, local_weight) -> SimilarityResult:
+    """由 (N, H, W, 3) 的逐像素绝对差计算相似度"""
+    n, h, w, c = diff.shape
+    row_starts, row_sizes = _block_bounds(h, grid[0])
+    col_starts, col_sizes = _block_bounds(w, grid[1])
+
+    # 全局：各通道平均差异
+    channel_sums = diff.sum(axis=(1, 2), dtype=np.int64)
+    channel_sim = 1.0 - channel_sums / (h * w * 255.0)
+    global_sim = channel_sim @ np.asarray(channel_weights, dtype=np.float64)
+
+    # 局部：先沿行、再沿列做分块求和
+    pixel_sums = diff.sum(axis=3, dtype=np.int64)
+    block_sums = np.add.reduceat(np.add.reduceat(pixel_sums, row_starts, axis=1), col_starts, axis=2)
+    block_counts = np.outer(row_sizes, col_sizes) * (c * 255.0)
+    local_sim = 1.0 - block_sums / block_counts
+
+    min_local = local_sim.reshape(n, -1).min(axis=1)
+    final = global_weight * global_sim + local_weight * min_local
+    return SimilarityResult(final, global_sim, local_sim)
+
+
+def score(frame: np.ndarray, template: np.ndarray, **kwargs) -> Tuple[float, float, float]:
+    """计算单帧相似度
+    Returns:
+        (最终相似度, 全局相似度, 最低局部相似度)
+    """
+    result = score_batch(frame, template, **kwargs)
+    return float(result.final[0]), float(result.global_[0]), float(result.min_local[0])
+
+
+# 分级判定的结果层级
+TIER_REJECT = 'thumbnail-reject'
+TIER_ACCEPT = 'exact-accept'
+TIER_FULL = 'full'
+
+
+def block_means(frame: np.ndarray, grid: Tuple[int, int] = DEFAULT_GRID) -> np.ndarray:
+    """按局部区域划分计算每块每通道的平均值（即缩略图）
+    Args:
+        frame: (H, W, 3) 的RGB图像
+        grid: 局部区域划分（行数, 列数）
+    Returns:
+        (行数, 列数, 3) 的块平均值
+    """
+    h, w = frame.shape[:2]
+    row_starts, row_sizes = _block_bounds(h, grid[0])
+    col_starts, col_sizes = _block_bounds(w, grid[1])
+    sums = np.add.reduceat(np.add.reduceat(frame, row_starts, axis=0, dtype=np.int64), col_starts, axis=1)
+    return sums / np.outer(row_sizes, col_sizes)[:, :, np.newaxis]
+
+
+def _upper_bounds(frame_means: np.ndarray, template_means: np.ndarray, shape: Tuple[int, int],
+                  channel_weights: Sequence[float] = DEFAULT_CHANNEL_WEIGHTS,
+                  grid: Tuple[int, int] = DEFAULT_GRID,
+                  global_weight: float = DEFAULT_GLOBAL_WEIGHT,
+                  local_weight: float = DEFAULT_LOCAL_WEIGHT) -> Tuple[np.ndarray, np.ndarray]:
+    """similarity_upper_bound的向量化版本，template_means可以带有前导的变体维度"""
+    _, row_sizes = _block_bounds(shape[0], grid[0])
+    _, col_sizes = _block_bounds(shape[1], grid[1])
+    block_diff = np.abs(frame_means - template_means)
+    pixels = np.outer(row_sizes, col_sizes)[:, :, np.newaxis]
+
+    channel_sim = 1.0 - (block_diff * pixels).sum(axis=(-3, -2)) / (shape[0] * shape[1] * 255.0)
+    global_ub = channel_sim @ np.asarray(channel_weights, dtype=np.float64)
+    local_sim = 1.0 - block_diff.mean(axis=-1) / 255.0
+    local_ub = local_sim.reshape(local_sim.shape[:-2] + (-1,)).min(axis=-1)
+    distance = block_diff.mean(axis=(-3, -2, -1)) / 255.0
+    return global_weight * global_ub + local_weight * local_ub, distance
+
+
+def similarity_upper_bound(frame_means: np.ndarray, template_means: np.ndarray, shape: Tuple[int, int],
+                           **kwargs) -> Tuple[float, float]:
+    """由块平均值计算最终相似度的上界
+    块内平均值之差不超过逐像素差的平均值，因此缩略图算出的相似度一定不低于完整计算结果，
+    上界低于阈值时可以直接判定不匹配。
+    Returns:
+        (最终相似度上界, 缩略图平均差异，取值[0, 1])
+    """
+    upper_bound, distance = _upper_bounds(frame_means, template_means, shape, **kwargs)
+    return float(upper_bound), float(distance)
+
+
+def tiered_score(frame: np.ndarray, template: np.ndarray, template_means: np.ndarray, threshold: float,
+                 **kwargs) -> Tuple[bool, str, float, float, float]:
+    """分级判定：缩略图上界低于阈值时直接判定不匹配，截图与模板完全相同时直接判定匹配，其余情况做完整计算
+    缩略图只能给出相似度的上界，无法证明截图一定匹配，因此快速通过只用于逐像素相同的截图（相似度为1）。
+    Args:
+        frame: (H, W, 3) 的RGB截图
+        template: (H, W, 3) 的模板图像，uint8或int16
+        template_means: 模板的块平均值（block_means的结果）
+        threshold: 匹配阈值
+        **kwargs: 传给score的相似度参数
+    Returns:
+        (是否匹配, 判定层级, 最终相似度, 全局相似度, 最低局部相似度)
+        缩略图排除时相似度为上界，全局和局部相似度为nan
+    """
+    grid = kwargs.get('grid', DEFAULT_GRID)
+    frame_means = block_means(frame, grid)
+    upper_bound, _ = similarity_upper_bound(frame_means, template_means, frame.shape[:2], **kwargs)
+    if upper_bound < threshold:
+        return False, TIER_REJECT, upper_bound, float('nan'), float('nan')
+    if np.array_equal(frame, template):
+        return True, TIER_ACCEPT, 1.0, 1.0, 1.0
+
+    final, global_sim, min_local = score(frame, template, **kwargs)
+    return final >= threshold, TIER_FULL, final, global_sim, min_local
+
+
+def tiered_score_variants(frame: np.ndarray, templates: np.ndarray, templates_means: np.ndarray, threshold: float,
+                          **kwargs) -> Tuple[bool, str, float, float, float, int]:
+    """对多个模板变体做分级判定：缩略图上界低于阈值的变体直接排除，
+    截图与某个变体完全相同时直接判定匹配，其余变体在一次向量化计算中完整比较
+    Args:
+        frame: (H, W, 3) 的RGB截图
+        templates: (V, H, W, 3) 的模板变体
+        templates_means: (V, 行数, 列数, 3) 的模板块平均值
+        threshold: 匹配阈值
+        **kwargs: 传给score_variants的相似度参数
+    Returns:
+        (是否匹配, 判定层级, 最终相似度, 全局相似度, 最低局部相似度, 最佳变体序号)
+    """
+    grid = kwargs.get('grid', DEFAULT_GRID)
+    frame_means = block_means(frame, grid)
+    upper_bounds, _ = _upper_bounds(frame_means, templates_means, frame.shape[:2], **kwargs)
+    candidates = np.flatnonzero(upper_bounds >= threshold)
+    if candidates.size == 0:
+        best = int(np.argmax(upper_bounds))
+        return False, TIER_REJECT, float(upper_bounds[best]), float('nan'), float('nan'), best
+    for i in candidates:
+        if np.array_equal(frame, templates[i]):
+            return True, TIER_ACCEPT, 1.0, 1.0, 1.0, int(i)
+
+    result = score_variants(frame, templates[candidates], **kwargs)
+    i = int(np.argmax(result.final))
+    final = float(result.final[i])
+    return (final >= threshold, TIER_FULL, final, float(result.global_[i]), float(result.min_local[i]),
+            int(candidates[i]))
@@ -0,0 +1,290 @@
+import json
+import logging
+import os
+import random
+import time
+from typing import Callable, Dict, Generator, List, Optional, Tuple, TypeVar
+
+from display_geometry import DisplayGeometry, transform_point
+
+# 添加客户流程的默认步骤配置，键为坐标文件中的步骤名
+DEFAULT_ADD_CUSTOMER_SPEC = {
+    'step1': {'description': '点击添加按钮'},
+    'step2': {'description': '点击输入框并输入手机号', 'input': '{phone}', 'press_enter': True, 'post_wait': 1.0},
+    'step3': {'description': '点击添加按钮'},
+    'step4': {'description': '点击发送邀请'},
+    'step5': {'description': '点击确认按钮'},
+}
+
+DEFAULT_SPEC_FILE = 'steps.json'
+
+T = TypeVar('T')
+
+
+class StepSpec:
+    """单个步骤的声明：验证模板 → 点击 → 可选输入 → 步骤后等待"""
+
+    __slots__ = ('index', 'name', 'description', 'x', 'y', 'template', 'scale', 'threshold', 'timeout',
+                 'retries', 'input', 'press_enter', 'post_wait', 'optional')
+
+    def __init__(self, index: int, name: str, x: int, y: int, template: str, description: str = '',
+                 threshold: float = 0.6, timeout: float = None, retries: int = 0, input: str = None,
+                 press_enter: bool = False, post_wait: float = 0.0, optional: bool = False, scale: float = 1.0):
+        self.index = index
+        self.name = name
+        self.description = description or f'点击{name}'
+        # 当前屏幕上的坐标，以及模板相对记录时的缩放比例
+        self.x = x
+        self.y = y
+        self.template = template
+        self.scale = scale
+        self.threshold = threshold
+        self.timeout = timeout
+        self.retries = retries
+        self.input = input
+        self.press_enter = press_enter
+        self.post_wait = post_wait
+        self.optional = optional
+
+    @property
+    def target(self) -> Dict:
+        """与坐标文件格式一致的坐标配置"""
+        return {'x': self.x, 'y': self.y, 'template': self.template, 'scale': self.scale}
+
+
+# 步骤配置文件中可以使用的项
+STEP_OPTIONS = ('description', 'threshold', 'timeout', 'retries', 'input', 'press_enter', 'post_wait', 'optional')
+
+
+def _check_option(name: str, key: str, value):
+    """检查步骤配置项的类型和取值范围，配置文件中写成字符串等错误在加载时报出"""
+    number = isinstance(value, (int, float)) and not isinstance(value, bool)
+    if key in ('description', 'input'):
+        valid = value is None or isinstance(value, str)
+        expected = '字符串'
+    elif key in ('press_enter', 'optional'):
+        valid = isinstance(value, bool)
+        expected = 'true或false'
+    elif key == 'threshold':
+        valid = number and 0 <= value <= 1
+        expected = '0到1之间的数字'
+    elif key == 'retries':
+        valid = isinstance(value, int) and not isinstance(value, bool) and value >= 0
+        expected = '不小于0的整数'
+    elif key == 'timeout':
+        valid = value is None or (number and value > 0)
+        expected = '大于0的数字'
+    else:
+        valid = number and value >= 0
+        expected = '不小于0的数字'
+    if not valid:
+        raise ValueError(f"步骤{name}的配置项{key}应为{expected}，实际为: {value!r}")
+
+
+class StepOutcome:
+    """一行数据执行流程的结果"""
+
+    __slots__ = ('success', 'failed_step', 'debug_path', 'completed')
+
+    def __init__(self, success: bool, failed_step: StepSpec = None, debug_path: str = '', completed: int = 0):
+        self.success = success
+        self.failed_step = failed_step
+        self.debug_path = debug_path
+        self.completed = completed
+
+
+def load_step_specs(coordinates: List[Dict], spec_path: str = DEFAULT_SPEC_FILE, logger=None,
+                    display: DisplayGeometry = None) -> List[StepSpec]:
+    """根据坐标文件和步骤配置文件生成步骤列表
+    Args:
+        coordinates: MouseRecorder记录的坐标列表
+        spec_path: 步骤配置文件路径，存在时按其中的步骤名和顺序执行（可以调整顺序或省略步骤），
+            不存在时按默认的添加客户流程执行，坐标文件中必须有其中的全部步骤
+        logger: 日志对象
+        display: 当前屏幕，与记录坐标时的屏幕不同时转换坐标和模板缩放比例；为空时按记录的坐标执行
+    Returns:
+        按执行顺序排列的步骤列表
+    """
+    logger = logger or logging.getLogger('step_pipeline')
+    points = {}
+    for coord in coordinates:
+        points.update(coord)
+
+    if spec_path and os.path.exists(spec_path):
+        with open(spec_path, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+        if not isinstance(spec, dict):
+            raise ValueError(f"步骤配置文件格式错误，应为以步骤名为键的对象: {spec_path}")
+        logger.info(f"从文件加载了 {len(spec)} 个步骤配置: {spec_path}")
+        names = list(spec)
+    else:
+        spec = DEFAULT_ADD_CUSTOMER_SPEC
+        names = list(spec)
+        extra = [name for name in points if name not in spec]
+        if extra:
+            logger.warning(f"未找到步骤配置文件，按默认流程执行，坐标点{', '.join(extra)}不执行")
+
+    missing = [name for name in names if name not in points]
+    if missing:
+        raise ValueError(f"坐标点数量不足，需要{len(names)}个坐标点，缺少: {', '.join(missing)}")
+
+    steps = []
+    converted = set()
+    for index, name in enumerate(names, 1):
+        options = spec.get(name) or {}
+        if not isinstance(options, dict):
+            raise ValueError(f"步骤{name}的配置应为对象，实际为: {options!r}")
+        unknown = sorted(set(options) - set(STEP_OPTIONS))
+        if unknown:
+            raise ValueError(f"步骤{name}的配置中有未知的项: {', '.join(unknown)}，可用的项: {', '.join(STEP_OPTIONS)}")
+        for key, value in options.items():
+            _check_option(name, key, value)
+        point = points[name]
+        x, y = point.get('x'), point.get('y')
+        if not isinstance(x, int) or not isinstance(y, int) or x < 0 or y < 0 or not point.get('template'):
+            raise ValueError(f"坐标点{name}无效: {point}，请重新记录坐标")
+        scale = 1.0
+        recorded = DisplayGeometry.from_point(point)
+        if display is not None and recorded is not None and recorded != display:
+            x, y, scale = transform_point(x, y, recorded, display)
+            converted.add(repr(recorded))
+        steps.append(StepSpec(index, name, x, y, point['template'], scale=scale, **options))
+    if converted:
+        logger.info(f"坐标记录于{'、'.join(sorted(converted))}，已转换到当前屏幕{display!r}")
+    return steps
+
+
+def run_blocking(task: Generator[float, None, T]) -> T:
+    """在当前线程中执行生成器任务：按任务让出的秒数睡眠，返回任务的结果"""
+    try:
+        while True:
+            time.sleep(next(task))
+    except StopIteration as stop:
+        return stop.value
+
+
+class StepPipeline:
+    """按步骤配置执行一行数据，统一处理等待、重试、失败策略和计时回调
+
+    流程以生成器实现（iter_run），需要等待时让出控制权并给出等待秒数：
+    单窗口时由run直接睡眠，多窗口时由调度器在等待期间推进其他窗口。
+    """
+
+    def __init__(self, steps: List[StepSpec], automation, logger=None):
+        """
+        Args:
+            steps: 步骤列表
+            automation: MouseAutomation实例，提供等待界面、点击和输入能力
+            logger: 日志对象
+        """
+        self.steps = steps
+        self.automation = automation
+        # 计时回调: hook(步骤名, 阶段, 耗时秒数)
+        self.hooks: List[Callable[[str, str, float], None]] = []
+        # 学习到的界面响应时间（WaitProfile），为空时使用步骤配置的post_wait
+        self.wait_profile = None
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('step_pipeline')
+
+    def add_hook(self, hook: Callable[[str, str, float], None]):
+        self.hooks.append(hook)
+
+    def _emit(self, step: StepSpec, phase: str, started: float):
+        elapsed = time.perf_counter() - started
+        for hook in self.hooks:
+            try:
+                hook(step.name, phase, elapsed)
+            except Exception as e:
+                self.logger.warning(f"计时回调执行失败: {e}")
+
+    def _verify(self, step: StepSpec, phone: str) -> Generator[float, None, Tuple[bool, str]]:
+        """等待步骤界面就绪，失败时按步骤配置重试"""
+        success, debug_path = False, ''
+        timeout = step.timeout
+        if self.wait_profile is not None:
+            timeout = self.wait_profile.timeout(step.name, self.automation.step_timeout if timeout is None else timeout)
+        for attempt in range(step.retries + 1):
+            if attempt:
+                print(f"{step.name} 第 {attempt} 次重试...")
+            success, debug_path = yield from self.automation.iter_wait_for_step(
+                step.target, step_name=step.name, phone=phone, timeout=timeout, threshold=step.threshold)
+            if success:
+                break
+        return success, debug_path
+
+    def _post_wait(self, step: StepSpec, next_step: Optional[StepSpec]) -> float:
+        """步骤完成后、开始轮询下一步之前的等待秒数"""
+        if self.wait_profile is None or next_step is None:
+            return step.post_wait
+        return self.wait_profile.wait(next_step.name, step.post_wait)
+
+    def _input(self, step: StepSpec, phone: str) -> Generator[float, None, None]:
+        """通过剪贴板粘贴输入内容"""
+        automation = self.automation
+        yield automation.settle_delay
+        yield from automation.iter_paste_text(step.input.format(phone=phone))
+        if step.press_enter:
+            # 模拟手动输入的随机延迟
+            yield random.uniform(*automation.key_delay_range)
+            automation.press_key('enter')
+
+    def run(self, phone: str) -> StepOutcome:
+        """依次执行所有步骤，等待时直接睡眠
+        Args:
+            phone: 当前处理的手机号
+        Returns:
+            StepOutcome
+        """
+        return run_blocking(self.iter_run(phone))
+
+    def iter_run(self, phone: str) -> Generator[float, None, StepOutcome]:
+        """依次执行所有步骤，需要等待时让出控制权并给出等待秒数
+        Args:
+            phone: 当前处理的手机号
+        Returns:
+            StepOutcome
+        """
+        completed = 0
+        # 上一步操作完成的时间，用于统计界面响应时间
+        acted = None
+        for position, step in enumerate(self.steps):
+            print(f"步骤{step.index}: {step.description}")
+            self.logger.debug(f"执行步骤{step.index}: {step.description}")
+
+            started = time.perf_counter()
+            success, debug_path = yield from self._verify(step, phone)
+            self._emit(step, 'verify', started)
+            if not success:
+                if step.optional:
+                    self.logger.info(f"可选步骤{step.name}未出现，跳过")
+                    acted = None
+                    continue
+                return StepOutcome(False, step, debug_path, completed)
+            if acted is not None and self.wait_profile is not None:
+                automation = self.automation
+                self.wait_profile.observe(step.name, automation.matched_at - acted, censored=automation.match_polls <= 1)
+
+            # 开启定位时点击校正后的坐标
+            x, y = self.automation.matched_point or (step.x, step.y)
+            started = time.perf_counter()
+            self.automation.click(x, y)
+            self._emit(step, 'click', started)
+
+            if step.input:
+                started = time.perf_counter()
+                yield from self._input(step, phone)
+                self._emit(step, 'input', started)
+
+            acted = time.monotonic()
+            next_step = self.steps[position + 1] if position + 1 < len(self.steps) else None
+            post_wait = self._post_wait(step, next_step)
+            if post_wait > 0:
+                started = time.perf_counter()
+                yield post_wait
+                self._emit(step, 'post_wait', started)
+            completed += 1
+
+        return StepOutcome(True, completed=completed)
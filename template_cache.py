@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from display_geometry import scale_image
+from locator import to_gray
+from similarity import block_means
+
+
+class TemplateEntry:
+    """已解码的模板图片，供相似度计算直接使用"""
+
+    __slots__ = ('path', 'signature', 'digest', 'rgb', 'rgb_i16', 'gray', 'size', '_means')
+
+    def __init__(self, path: str, signature: Tuple[int, int], digest: str, rgb: np.ndarray):
+        self.path = path
+        self.signature = signature
+        self.digest = digest
+        rgb.setflags(write=False)
+        self.rgb = rgb
+        # 预先转换为int16，计算差值时不会发生uint8回绕
+        rgb_i16 = rgb.astype(np.int16)
+        rgb_i16.setflags(write=False)
+        self.rgb_i16 = rgb_i16
+        # 灰度图用于窗口偏移时的模板定位
+        gray = to_gray(rgb)
+        gray.setflags(write=False)
+        self.gray = gray
+        # 与PIL保持一致的(宽, 高)
+        self.size = (rgb.shape[1], rgb.shape[0])
+        self._means = {}
+
+    def means(self, grid: Tuple[int, int]) -> np.ndarray:
+        """按局部区域划分的块平均值（缩略图），用于分级判定"""
+        grid = tuple(grid)
+        means = self._means.get(grid)
+        if means is None:
+            means = self._means[grid] = block_means(self.rgb, grid)
+        return means
+
+
+class TemplateCache:
+    def __init__(self, logger=None):
+        self._entries: Dict[str, TemplateEntry] = {}
+        # 按当前屏幕缩放后的模板，(路径, 缩放比例) -> 缓存项
+        self._scaled: Dict[Tuple[str, float], TemplateEntry] = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.rescales = 0
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('template_cache')
+
+    @staticmethod
+    def _key(template_path: str) -> str:
+        return os.path.normcase(os.path.abspath(template_path))
+
+    def get(self, template_path: str, scale: float = 1.0) -> Optional[TemplateEntry]:
+        """获取模板，文件未变化时直接返回缓存
+        Args:
+            template_path: 模板图片路径
+            scale: 模板缩放比例（记录坐标与当前屏幕的显示缩放不同时），每个比例只缩放一次
+        Returns:
+            模板缓存项，文件不存在或无法解码时返回None
+        """
+        entry = self._get(template_path)
+        if entry is None or scale == 1.0:
+            return entry
+        key = (self._key(template_path), round(scale, 4))
+        scaled = self._scaled.get(key)
+        # 原模板内容变化时重新缩放
+        if scaled is None or scaled.digest != entry.digest:
+            scaled = self._scaled[key] = TemplateEntry(template_path, entry.signature, entry.digest,
+                                                       scale_image(entry.rgb, scale))
+            self.rescales += 1
+            self.logger.info(f"模板已按当前屏幕缩放{scale:.2f}倍: {template_path} {entry.size} -> {scaled.size}")
+        return scaled
+
+    def _get(self, template_path: str) -> Optional[TemplateEntry]:
+        key = self._key(template_path)
+        try:
+            st = os.stat(template_path)
+        except OSError:
+            self._entries.pop(key, None)
+            return None
+
+        signature = (st.st_mtime_ns, st.st_size)
+        entry = self._entries.get(key)
+        if entry is not None and entry.signature == signature:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        try:
+            with open(template_path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha1(data).hexdigest()
+
+            # 只有修改时间变化而内容相同时，无需重新解码
+            if entry is not None and entry.digest == digest:
+                entry.signature = signature
+                return entry
+
+            with Image.open(template_path) as template:
+                rgb = np.array(template.convert('RGB'))
+        except Exception as e:
+            self.logger.error(f"加载模板图片失败: {template_path}: {e}")
+            self._entries.pop(key, None)
+            return None
+
+        if entry is not None:
+            self.reloads += 1
+            self.logger.info(f"模板图片已更新，重新加载: {template_path}")
+        self._entries[key] = TemplateEntry(template_path, signature, digest, rgb)
+        return self._entries[key]
+
+    def preload(self, template_paths) -> int:
+        """预加载一组模板
+        Args:
+            template_paths: 模板图片路径列表，也可以是(路径, 缩放比例)
+        Returns:
+            成功加载的模板数量
+        """
+        loaded = 0
+        for item in template_paths:
+            path, scale = item if isinstance(item, tuple) else (item, 1.0)
+            if path and self.get(path, scale) is not None:
+                loaded += 1
+        return loaded
+
+    def invalidate(self, template_path: str = None):
+        """使缓存失效
+        Args:
+            template_path: 模板图片路径，为空时清空全部缓存
+        """
+        if template_path is None:
+            self._entries.clear()
+            self._scaled.clear()
+        else:
+            key = self._key(template_path)
+            self._entries.pop(key, None)
+            for scaled in [scaled for scaled in self._scaled if scaled[0] == key]:
+                del self._scaled[scaled]
+
+    def stats(self) -> Dict[str, int]:
+        """返回缓存命中统计"""
+        return {
+            'entries': len(self._entries),
+            'rescaled': self.rescales,
+            'hits': self.hits,
+            'misses': self.misses,
+            'reloads': self.reloads,
+        }
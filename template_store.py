@@ -0,0 +1,219 @@
+"""多变体模板库：每个步骤保存多张模板（悬停、选中、不同主题等），全部存放在一个.npz文件中
+
+用法:
+    python template_store.py list                                   查看各步骤的模板变体
+    python template_store.py add step3 debug_screenshots/xxx.png     将截图添加为step3的变体
+    python template_store.py remove step3 1                         删除step3的第2个变体
+    python template_store.py import coordinates.json                导入坐标文件中的模板图片
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from display_geometry import scale_image
+from similarity import block_means
+
+DEFAULT_STORE_FILE = 'templates.npz'
+# 每个步骤最多保留的变体数，超出时丢弃最早的变体
+DEFAULT_MAX_VARIANTS = 8
+
+_META_KEY = '__meta__'
+
+
+class TemplateVariants:
+    """一个步骤的全部模板变体，图片按 (变体数, 高, 宽, 3) 堆叠"""
+
+    __slots__ = ('step', 'images', 'images_i16', 'meta', '_means')
+
+    def __init__(self, step: str, images: np.ndarray, meta: List[Dict]):
+        self.step = step
+        images.setflags(write=False)
+        self.images = images
+        images_i16 = images.astype(np.int16)
+        images_i16.setflags(write=False)
+        self.images_i16 = images_i16
+        self.meta = meta
+        self._means = {}
+
+    def __len__(self) -> int:
+        return self.images.shape[0]
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.images.shape[1:]
+
+    def means(self, grid: Tuple[int, int]) -> np.ndarray:
+        """各变体的块平均值，(变体数, 行数, 列数, 3)"""
+        grid = tuple(grid)
+        means = self._means.get(grid)
+        if means is None:
+            means = self._means[grid] = np.stack([block_means(image, grid) for image in self.images])
+        return means
+
+    def label(self, index: int) -> str:
+        """变体的说明，用于日志"""
+        meta = self.meta[index] if index < len(self.meta) else {}
+        return meta.get('label') or f'变体{index + 1}'
+
+
+class TemplateStore:
+    """多变体模板库，启动时一次性读入内存，修改后原子地写回文件"""
+
+    def __init__(self, path: str = DEFAULT_STORE_FILE, logger=None, max_variants: int = DEFAULT_MAX_VARIANTS):
+        self.path = path
+        self.max_variants = max_variants
+        self._steps: Dict[str, TemplateVariants] = {}
+        # 按当前屏幕缩放后的变体，(步骤, 缩放比例) -> 变体
+        self._scaled: Dict[Tuple[str, float], TemplateVariants] = {}
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('template_store')
+
+    def load(self) -> 'TemplateStore':
+        """读取模板库文件，文件不存在时为空"""
+        self._steps = {}
+        self._scaled = {}
+        if not os.path.exists(self.path):
+            return self
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                meta = json.loads(bytes(data[_META_KEY]).decode('utf-8')) if _META_KEY in data.files else {}
+                for step in data.files:
+                    if step == _META_KEY:
+                        continue
+                    self._steps[step] = TemplateVariants(step, np.ascontiguousarray(data[step]), meta.get(step, []))
+        except Exception as e:
+            self.logger.error(f"读取模板库失败: {self.path}: {e}")
+            self._steps = {}
+            return self
+        self.logger.info(f"已加载模板库 {self.path}: {self.stats()}")
+        return self
+
+    def save(self):
+        """原子地写入模板库文件"""
+        arrays = {step: variants.images for step, variants in self._steps.items()}
+        meta = {step: variants.meta for step, variants in self._steps.items()}
+        arrays[_META_KEY] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.npz', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get(self, step: str, scale: float = 1.0) -> Optional[TemplateVariants]:
+        """一个步骤的全部变体，scale不为1时返回缩放到当前屏幕的变体（每个比例只缩放一次）"""
+        variants = self._steps.get(step)
+        if variants is None or scale == 1.0:
+            return variants
+        key = (step, round(scale, 4))
+        scaled = self._scaled.get(key)
+        if scaled is None or scaled.meta is not variants.meta:
+            images = np.stack([scale_image(image, scale) for image in variants.images])
+            scaled = self._scaled[key] = TemplateVariants(step, images, variants.meta)
+        return scaled
+
+    def steps(self) -> List[str]:
+        return list(self._steps)
+
+    def add(self, step: str, image: np.ndarray, replace: bool = False, **meta) -> int:
+        """添加一个模板变体
+        Args:
+            step: 步骤名称
+            image: (H, W, 3) 的RGB图片，尺寸须与该步骤已有的变体一致
+            replace: 是否清除该步骤已有的变体（重新记录坐标时）
+            **meta: 变体信息，如label、screen_size、dpi、source
+        Returns:
+            新变体的序号
+        """
+        image = np.ascontiguousarray(image[..., :3], dtype=np.uint8)
+        meta.setdefault('captured_at', datetime.now().isoformat(timespec='seconds'))
+        current = None if replace else self._steps.get(step)
+        if current is not None and current.shape != image.shape:
+            raise ValueError(f"变体大小不一致: {step}已有{current.shape}，新变体{image.shape}")
+
+        images = [image] if current is None else list(current.images) + [image]
+        metas = [meta] if current is None else list(current.meta) + [meta]
+        if len(images) > self.max_variants:
+            dropped = len(images) - self.max_variants
+            images, metas = images[dropped:], metas[dropped:]
+            self.logger.info(f"{step}的模板变体超过{self.max_variants}个，丢弃最早的{dropped}个")
+        self._steps[step] = TemplateVariants(step, np.stack(images), metas)
+        return len(images) - 1
+
+    def remove(self, step: str, index: int = None):
+        """删除一个变体，index为空时删除该步骤的全部变体"""
+        current = self._steps.get(step)
+        if current is None:
+            return
+        if index is None or len(current) <= 1:
+            del self._steps[step]
+            return
+        keep = [i for i in range(len(current)) if i != index]
+        self._steps[step] = TemplateVariants(step, current.images[keep].copy(), [current.meta[i] for i in keep])
+
+    def stats(self) -> Dict[str, int]:
+        """各步骤的变体数量"""
+        return {step: len(variants) for step, variants in self._steps.items()}
+
+
+def _load_image(path: str) -> np.ndarray:
+    with Image.open(path) as image:
+        return np.array(image.convert('RGB'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='多变体模板库')
+    parser.add_argument('--store', default=DEFAULT_STORE_FILE, help='模板库文件路径')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help='查看各步骤的模板变体')
+    add = commands.add_parser('add', help='添加模板变体')
+    add.add_argument('step', help='步骤名称，如step3')
+    add.add_argument('image', help='图片路径，尺寸须与已有变体一致')
+    add.add_argument('--label', help='变体说明，如"悬停"')
+    remove = commands.add_parser('remove', help='删除模板变体')
+    remove.add_argument('step', help='步骤名称')
+    remove.add_argument('index', type=int, nargs='?', help='变体序号（从0开始），为空时删除全部')
+    imports = commands.add_parser('import', help='导入坐标文件中的模板图片')
+    imports.add_argument('coordinates', nargs='?', default='coordinates.json', help='坐标文件路径')
+    args = parser.parse_args(argv)
+
+    store = TemplateStore(args.store).load()
+    if args.command == 'add':
+        index = store.add(args.step, _load_image(args.image), label=args.label, source=args.image)
+        store.save()
+        print(f"已添加{args.step}的第{index + 1}个变体")
+    elif args.command == 'remove':
+        store.remove(args.step, args.index)
+        store.save()
+    elif args.command == 'import':
+        with open(args.coordinates, 'r') as f:
+            for coord in json.load(f):
+                for step, info in coord.items():
+                    if info.get('template') and os.path.exists(info['template']):
+                        store.add(step, _load_image(info['template']), replace=True, source=info['template'])
+        store.save()
+
+    for step in store.steps():
+        variants = store.get(step)
+        print(f"{step}: {len(variants)}个变体")
+        for i, meta in enumerate(variants.meta):
+            print(f"  [{i}] {variants.label(i)} {meta.get('captured_at', '')} "
+                  f"分辨率{meta.get('screen_size', '-')} DPI{meta.get('dpi', '-')}")
+
+
+if __name__ == '__main__':
+    main()
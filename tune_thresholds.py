@@ -0,0 +1,312 @@
+"""离线调整匹配阈值：用已标注的截图批量计算相似度，扫描阈值和全局/局部权重，给出每个步骤的建议设置
+
+截图来源（可同时使用）:
+    corpus/<步骤名>/match/*.png      应当匹配的截图
+    corpus/<步骤名>/nomatch/*.png    不应匹配的截图
+    --labels labels.csv              其他位置（如failure_store.py export导出的失败截图）的截图，每行: 路径,步骤名,match或nomatch
+                                     步骤名为空时按文件名前缀（如step3_手机号_编号.png）推断
+
+用法:
+    python tune_thresholds.py --corpus corpus [--labels labels.csv] [--min-precision 1.0] [--output report.json] [--apply]
+"""
+import argparse
+import copy
+import csv
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from similarity import DEFAULT_CHANNEL_WEIGHTS, DEFAULT_GLOBAL_WEIGHT, DEFAULT_GRID, score_batch
+from step_pipeline import DEFAULT_ADD_CUSTOMER_SPEC, DEFAULT_SPEC_FILE, load_step_specs
+from template_store import DEFAULT_STORE_FILE, TemplateStore
+
+MATCH = 'match'
+NOMATCH = 'nomatch'
+_LABELS = {'match': True, '1': True, 'true': True, '匹配': True,
+           'nomatch': False, '0': False, 'false': False, '不匹配': False}
+
+
+def _step_from_filename(path: str, steps: List[str]) -> str:
+    """导出的失败截图文件名以步骤名开头"""
+    name = os.path.basename(path)
+    for step in sorted(steps, key=len, reverse=True):
+        if name.startswith(f'{step}_'):
+            return step
+    return ''
+
+
+def load_corpus(corpus_dir: str = None, labels_path: str = None, steps: List[str] = ()) -> Dict[str, List[Tuple[str, bool]]]:
+    """收集已标注的截图
+    Returns:
+        {步骤名: [(图片路径, 是否应当匹配)]}
+    """
+    corpus = defaultdict(list)
+    if corpus_dir and os.path.isdir(corpus_dir):
+        for step in sorted(os.listdir(corpus_dir)):
+            for label, expected in ((MATCH, True), (NOMATCH, False)):
+                directory = os.path.join(corpus_dir, step, label)
+                if not os.path.isdir(directory):
+                    continue
+                for name in sorted(os.listdir(directory)):
+                    if name.lower().endswith('.png'):
+                        corpus[step].append((os.path.join(directory, name), expected))
+    if labels_path:
+        with open(labels_path, 'r', encoding='utf-8-sig', newline='') as f:
+            for values in csv.reader(f):
+                if len(values) < 3 or values[0].startswith('#'):
+                    continue
+                path, step, label = (v.strip() for v in values[:3])
+                if label.lower() not in _LABELS:
+                    continue
+                step = step or _step_from_filename(path, steps)
+                if step and os.path.exists(path):
+                    corpus[step].append((path, _LABELS[label.lower()]))
+    return dict(corpus)
+
+
+def _load_frames(paths: List[str], shape: Tuple[int, int, int]) -> Tuple[np.ndarray, List[int]]:
+    """读取截图并堆叠，尺寸与模板不同的截图被跳过
+    Returns:
+        (N, H, W, 3) 的截图, 被采用的截图在paths中的序号
+    """
+    frames = np.empty((len(paths),) + shape, dtype=np.uint8)
+    used = []
+    for i, path in enumerate(paths):
+        with Image.open(path) as image:
+            array = np.asarray(image.convert('RGB'))
+        if array.shape == shape:
+            frames[len(used)] = array
+            used.append(i)
+    return frames[:len(used)], used
+
+
+def score_corpus(frames: np.ndarray, templates: np.ndarray, channel_weights=DEFAULT_CHANNEL_WEIGHTS,
+                 grid=DEFAULT_GRID, chunk: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """用生产环境的相似度函数计算每张截图与每个模板变体的全局相似度和最低局部相似度
+    这两项与全局/局部权重无关，扫描权重时无需重新计算
+    Args:
+        frames: (N, H, W, 3) 的截图
+        templates: (V, H, W, 3) 的模板变体
+        chunk: 每批计算的截图数，限制int16差值数组占用的内存
+    Returns:
+        (N, V) 的全局相似度, (N, V) 的最低局部相似度
+    """
+    global_sim = np.empty((len(frames), len(templates)))
+    min_local = np.empty_like(global_sim)
+    for v, template in enumerate(templates):
+        template = template.astype(np.int16)
+        for start in range(0, len(frames), chunk):
+            result = score_batch(frames[start:start + chunk], template, channel_weights=channel_weights, grid=grid)
+            global_sim[start:start + chunk, v] = result.global_
+            min_local[start:start + chunk, v] = result.min_local
+    return global_sim, min_local
+
+
+def sweep(global_sim: np.ndarray, min_local: np.ndarray, expected: np.ndarray,
+          weights: np.ndarray, thresholds: np.ndarray) -> Dict[str, np.ndarray]:
+    """对所有(全局权重, 阈值)组合计算精确率和召回率
+    Args:
+        global_sim, min_local: (N, V) 的相似度
+        expected: (N,) 是否应当匹配
+        weights: (W,) 全局权重，局部权重为1 - 全局权重
+        thresholds: (T,) 阈值
+    Returns:
+        precision、recall、f1为 (W, T)，final为 (W, N) 的最终相似度（各变体中的最大值）
+    """
+    final = (weights[:, None, None] * global_sim + (1 - weights[:, None, None]) * min_local).max(axis=2)
+    predicted = final[:, None, :] >= thresholds[None, :, None]
+    positives = expected[None, None, :]
+    tp = (predicted & positives).sum(axis=2)
+    fp = (predicted & ~positives).sum(axis=2)
+    fn = (~predicted & positives).sum(axis=2)
+    precision = np.where(tp + fp > 0, tp / np.maximum(tp + fp, 1), 1.0)
+    recall = np.where(tp + fn > 0, tp / np.maximum(tp + fn, 1), 1.0)
+    f1 = np.where(precision + recall > 0, 2 * precision * recall / np.maximum(precision + recall, 1e-12), 0.0)
+    return {'precision': precision, 'recall': recall, 'f1': f1, 'final': final}
+
+
+def suggest(curves: Dict[str, np.ndarray], expected: np.ndarray, weights: np.ndarray, thresholds: np.ndarray,
+            min_precision: float = 1.0) -> Dict:
+    """选择精确率不低于min_precision时召回率最高的设置，
+    召回率相同时选择匹配与不匹配截图之间间隔最大的权重，阈值取间隔中点
+    """
+    precision, recall = curves['precision'], curves['recall']
+    feasible = precision >= min_precision
+    if not feasible.any():
+        feasible = precision >= precision.max()
+    best_recall = np.where(feasible, recall, -1).max()
+    candidates = np.argwhere(feasible & (recall >= best_recall))
+
+    best = None
+    for w, t in candidates:
+        final = curves['final'][w]
+        positives, negatives = final[expected], final[~expected]
+        low = negatives.max() if negatives.size else thresholds[0]
+        high = positives.min() if positives.size else thresholds[-1]
+        margin = high - low
+        key = (margin, -abs(weights[w] - DEFAULT_GLOBAL_WEIGHT))
+        if best is None or key > best[0]:
+            # 完全可分时阈值取两类之间的中点，否则使用扫描得到的阈值
+            threshold = (low + high) / 2 if margin > 0 else thresholds[t]
+            best = (key, w, float(threshold), float(margin))
+    _, w, threshold, margin = best
+    return {
+        'global_weight': float(weights[w]),
+        'local_weight': float(1 - weights[w]),
+        'threshold': round(threshold, 4),
+        'precision': float(precision[w, np.searchsorted(thresholds, threshold, side='right') - 1]),
+        'recall': float(recall[w, np.searchsorted(thresholds, threshold, side='right') - 1]),
+        'margin': round(margin, 4),
+    }
+
+
+def _evaluate(final: np.ndarray, expected: np.ndarray, threshold: float) -> Dict[str, float]:
+    predicted = final >= threshold
+    tp = int((predicted & expected).sum())
+    fp = int((predicted & ~expected).sum())
+    fn = int((~predicted & expected).sum())
+    return {'precision': tp / (tp + fp) if tp + fp else 1.0, 'recall': tp / (tp + fn) if tp + fn else 1.0,
+            'false_accepts': fp, 'false_rejects': fn}
+
+
+def tune(coordinates_path: str = 'coordinates.json', steps_path: str = DEFAULT_SPEC_FILE,
+         store_path: str = DEFAULT_STORE_FILE, corpus_dir: str = 'corpus', labels_path: str = None,
+         min_precision: float = 1.0) -> Dict:
+    """对每个步骤扫描阈值和权重
+    Returns:
+        {步骤名: 报告}
+    """
+    with open(coordinates_path, 'r') as f:
+        coordinates = json.load(f)
+    steps = {step.name: step for step in load_step_specs(coordinates, steps_path)}
+    store = TemplateStore(store_path).load()
+    corpus = load_corpus(corpus_dir, labels_path, list(steps))
+
+    weights = np.round(np.arange(0.0, 1.0001, 0.05), 2)
+    thresholds = np.round(np.arange(0.50, 1.0001, 0.0025), 4)
+    report = {}
+    for name, samples in corpus.items():
+        step = steps.get(name)
+        if step is None:
+            print(f"忽略未知步骤的截图: {name}")
+            continue
+        variants = store.get(name)
+        if variants is not None:
+            templates = variants.images
+        else:
+            with Image.open(step.template) as image:
+                templates = np.asarray(image.convert('RGB'))[np.newaxis]
+
+        started = time.perf_counter()
+        frames, used = _load_frames([path for path, _ in samples], templates.shape[1:])
+        expected = np.array([samples[i][1] for i in used], dtype=bool)
+        loaded = time.perf_counter()
+        global_sim, min_local = score_corpus(frames, templates)
+        scored = time.perf_counter()
+        curves = sweep(global_sim, min_local, expected, weights, thresholds)
+        swept = time.perf_counter()
+
+        current_w = int(np.argmin(np.abs(weights - DEFAULT_GLOBAL_WEIGHT)))
+        # 只有匹配或只有不匹配的截图时无法确定阈值的位置，不给出建议
+        suggestion = applied = None
+        if expected.any() and not expected.all():
+            suggestion = suggest(curves, expected, weights, thresholds, min_precision)
+            # 程序中所有步骤都使用同一组权重，写入配置的阈值只能按当前权重选择
+            current_curves = {key: value[current_w:current_w + 1] for key, value in curves.items()}
+            applied = suggest(current_curves, expected, weights[current_w:current_w + 1], thresholds, min_precision)
+        w = int(np.argmin(np.abs(weights - suggestion['global_weight']))) if suggestion else current_w
+        report[name] = {
+            'samples': len(samples),
+            'used': len(used),
+            'match': int(expected.sum()),
+            'nomatch': int((~expected).sum()),
+            'variants': len(templates),
+            'current': dict(threshold=step.threshold, global_weight=DEFAULT_GLOBAL_WEIGHT,
+                            **_evaluate(curves['final'][current_w], expected, step.threshold)),
+            'suggested': suggestion,
+            'applied': applied,
+            'curve': [{'threshold': float(t), 'precision': float(p), 'recall': float(r)}
+                      for t, p, r in zip(thresholds, curves['precision'][w], curves['recall'][w])],
+            'crops_per_second': len(used) / max(scored - loaded, 1e-9),
+            'seconds': {'load': loaded - started, 'score': scored - loaded, 'sweep': swept - scored},
+        }
+    return report
+
+
+def apply_thresholds(report: Dict, steps_path: str = DEFAULT_SPEC_FILE, coordinates_path: str = 'coordinates.json'):
+    """将按当前全局/局部权重得到的建议阈值写入步骤配置文件，只修改阈值，不改变执行哪些步骤"""
+    if os.path.exists(steps_path):
+        with open(steps_path, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+    else:
+        # 配置文件不存在时，按坐标文件得到程序实际执行的步骤，在其默认配置的基础上写入阈值
+        with open(coordinates_path, 'r') as f:
+            coordinates = json.load(f)
+        spec = {step.name: copy.deepcopy(DEFAULT_ADD_CUSTOMER_SPEC.get(step.name, {}))
+                for step in load_step_specs(coordinates, steps_path)}
+    for name, result in report.items():
+        if not result['applied']:
+            continue
+        if name not in spec:
+            print(f"步骤{name}不在步骤配置中，未写入阈值")
+            continue
+        spec[name] = spec[name] or {}
+        spec[name]['threshold'] = result['applied']['threshold']
+    directory = os.path.dirname(os.path.abspath(steps_path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.json', dir=directory)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(spec, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, steps_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='离线调整匹配阈值')
+    parser.add_argument('--corpus', default='corpus', help='已标注截图目录（<步骤名>/match、<步骤名>/nomatch）')
+    parser.add_argument('--labels', help='标注文件（路径,步骤名,match或nomatch）')
+    parser.add_argument('--coordinates', default='coordinates.json', help='坐标文件路径')
+    parser.add_argument('--steps', default=DEFAULT_SPEC_FILE, help='步骤配置文件路径')
+    parser.add_argument('--store', default=DEFAULT_STORE_FILE, help='多变体模板库路径')
+    parser.add_argument('--min-precision', type=float, default=1.0, help='建议设置须达到的最低精确率')
+    parser.add_argument('--output', help='将完整报告（含精确率/召回率曲线）保存为JSON文件')
+    parser.add_argument('--apply', action='store_true', help='将建议阈值写入步骤配置文件')
+    args = parser.parse_args(argv)
+
+    report = tune(args.coordinates, args.steps, args.store, args.corpus, args.labels, args.min_precision)
+    if not report:
+        print("没有找到已标注的截图")
+        return
+    print(f"{'步骤':<8}{'截图':>6}{'匹配':>6}{'不匹配':>6}  {'当前阈值':>8}{'误判/漏判':>10}  {'建议阈值':>8}{'召回率':>8}  "
+          f"{'最佳权重':>8}{'阈值':>8}{'精确率':>8}{'召回率':>8}{'间隔':>8}{'张/秒':>10}")
+    for name, result in report.items():
+        current, suggested = result['current'], result['suggested']
+        line = (f"{name:<8}{result['used']:>6}{result['match']:>6}{result['nomatch']:>6}  "
+                f"{current['threshold']:>8.3f}{current['false_accepts']:>5}/{current['false_rejects']:<4}  ")
+        if suggested:
+            applied = result['applied']
+            line += (f"{applied['threshold']:>8.3f}{applied['recall']:>8.3f}  "
+                     f"{suggested['global_weight']:>8.2f}{suggested['threshold']:>8.3f}{suggested['precision']:>8.3f}"
+                     f"{suggested['recall']:>8.3f}{suggested['margin']:>8.3f}")
+        else:
+            line += f"{'需要同时有匹配和不匹配的截图':>58}"
+        print(line + f"{result['crops_per_second']:>10.0f}")
+        if result['used'] < result['samples']:
+            print(f"  {result['samples'] - result['used']}张截图尺寸与模板不同，已跳过")
+    print(f"建议阈值按程序当前的全局权重{DEFAULT_GLOBAL_WEIGHT}计算，--apply写入的是该阈值；"
+          "最佳权重及其阈值只作参考，程序中的权重对所有步骤生效（MouseAutomation.similarity_options）")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.apply:
+        apply_thresholds(report, args.steps, args.coordinates)
+        print(f"建议阈值已写入 {args.steps}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import tempfile
+from collections import deque
+from typing import Dict, List
+
+import numpy as np
+
+DEFAULT_PROFILE_FILE = 'wait_profile.json'
+
+
+class WaitProfile:
+    """各步骤界面响应时间的分布：从上一步点击（或输入）完成到该步骤模板首次匹配的秒数
+
+    上一步完成后先等待响应时间的指定百分位数，再开始轮询，不再使用写死的固定等待。
+    每个步骤只保留最近window个样本，界面变慢或变快时等待时间随之调整；样本在多次运行之间保存。
+    等待后第一次截图就已匹配时，实际响应时间可能更短，这类样本按比例缩小后记录，使等待时间能够回落。
+    """
+
+    def __init__(self, path: str = DEFAULT_PROFILE_FILE, percentile: float = 50.0, window: int = 50,
+                 min_samples: int = 5, timeout_factor: float = 3.0, max_timeout: float = 60.0,
+                 censored_shrink: float = 0.9, logger=None):
+        """
+        Args:
+            path: 样本保存文件路径，为空时不保存
+            percentile: 等待时间取响应时间的百分位数
+            window: 每个步骤保留的最近样本数
+            min_samples: 样本数达到该值后才使用学习到的等待时间
+            timeout_factor: 等待超时至少为响应时间p95的倍数（界面变慢时自动放宽超时）
+            max_timeout: 自动放宽的超时上限（秒）
+            censored_shrink: 第一次截图即匹配时样本的缩小比例
+            logger: 日志对象
+        """
+        self.path = path
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.timeout_factor = timeout_factor
+        self.max_timeout = max_timeout
+        self.censored_shrink = censored_shrink
+        self.samples: Dict[str, deque] = {}
+        self._setup_logging(logger)
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('wait_profile')
+
+    def load(self) -> 'WaitProfile':
+        """读取上次运行保存的样本，文件不存在或损坏时从零开始"""
+        if not self.path or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"读取等待时间样本失败，重新开始统计: {e}")
+            return self
+        for step, values in data.get('samples', {}).items():
+            self.samples[step] = deque((float(v) for v in values), maxlen=self.window)
+        self.logger.info(f"已加载等待时间样本 {self.path}: {self.stats()}")
+        return self
+
+    def snapshot(self) -> Dict[str, List[float]]:
+        """当前样本的副本，可以交给后台线程保存"""
+        return {step: [round(v, 4) for v in values] for step, values in self.samples.items()}
+
+    def save(self, snapshot: Dict[str, List[float]] = None):
+        """原子地保存样本
+        Args:
+            snapshot: snapshot()的结果，为空时保存当前样本
+        """
+        if not self.path:
+            return
+        data = {'percentile': self.percentile, 'samples': self.snapshot() if snapshot is None else snapshot}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.tmp_', suffix='.json', dir=directory)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def observe(self, step: str, seconds: float, censored: bool = False):
+        """记录一次响应时间
+        Args:
+            step: 步骤名，即等待其模板匹配的步骤
+            seconds: 从上一步操作完成到模板首次匹配的秒数
+            censored: 第一次截图即匹配，实际响应时间不超过seconds
+        """
+        values = self.samples.get(step)
+        if values is None:
+            values = self.samples[step] = deque(maxlen=self.window)
+        values.append(max(0.0, seconds * self.censored_shrink if censored else seconds))
+
+    def _quantile(self, step: str, percentile: float):
+        """百分位数（与np.percentile的默认线性插值一致），每步每行都要计算，样本很少，直接排序比numpy快"""
+        values = self.samples.get(step)
+        if values is None or len(values) < self.min_samples:
+            return None
+        ordered = sorted(values)
+        position = (len(ordered) - 1) * percentile / 100.0
+        low = int(position)
+        high = min(low + 1, len(ordered) - 1)
+        return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+    def wait(self, step: str, default: float = 0.0) -> float:
+        """上一步完成后、开始轮询step之前的等待秒数，样本不足时返回default"""
+        value = self._quantile(step, self.percentile)
+        return default if value is None else value
+
+    def timeout(self, step: str, default: float) -> float:
+        """等待step界面的超时秒数，不低于配置值，界面变慢时随响应时间放宽"""
+        value = self._quantile(step, 95)
+        if value is None:
+            return default
+        return max(default, min(value * self.timeout_factor, self.max_timeout))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """各步骤的样本数、中位数、p95和当前等待时间"""
+        result = {}
+        for step, values in self.samples.items():
+            array = np.fromiter(values, dtype=np.float64, count=len(values))
+            if not array.size:
+                continue
+            p50, p95 = np.percentile(array, (50, 95))
+            result[step] = {'count': int(array.size), 'p50': round(float(p50), 3),
+                            'p95': round(float(p95), 3), 'wait': round(self.wait(step), 3)}
+        return result
@@ -0,0 +1,375 @@
+"""多台电脑共用的手机号任务队列（SQLite）
+
+用法:
+    python work_queue.py import phone.xlsx --db queue.db     导入手机号（已导入的行不会重复导入）
+    python work_queue.py status --db queue.db                查看处理进度
+    python work_queue.py export phone.xlsx --db queue.db     将队列中的状态写回手机号文件
+"""
+import argparse
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List
+
+from phone_source import PhoneRow, PhoneSource, write_checkpoint
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS phones (
+    row_index INTEGER PRIMARY KEY,
+    phone TEXT,
+    status TEXT,
+    owner TEXT,
+    lease_expires REAL,
+    host TEXT,
+    updated_at REAL,
+    normalized TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_phones_pending ON phones (status, lease_expires);
+"""
+
+# 每个清洗后的号码只有一行保留normalized，其余重复的行在导入时标记为重复手机号，不会被任何电脑领取
+_UNIQUE_INDEX = 'CREATE UNIQUE INDEX IF NOT EXISTS idx_phones_normalized ON phones (normalized)'
+
+
+def default_owner() -> str:
+    """当前进程的租约持有者标识：主机名-进程号"""
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+class WorkQueue:
+    """带租约的共享任务队列
+
+    每台电脑按批领取未处理的行，领取的行带有租约（lease_seconds秒后过期），
+    后台线程定期续约；状态在同一个事务中写入并释放租约。
+    导入时按清洗后的号码去重（normalized列唯一），同一号码只会被一台电脑领取一次。
+    持有者停止运行或长时间无响应时租约过期，这些行会被其他电脑重新领取。
+    使用默认的回滚日志模式（WAL模式不支持网络文件系统）。数据库放在共享目录中时，
+    文件锁依赖文件服务器的实现，SMB等网络文件系统上可能长时间拿不到写锁或锁失效，
+    写入状态失败时按退避间隔重试，仍失败则只记录日志，该行的租约过期后会被重新领取。
+    """
+
+    def __init__(self, path: str, owner: str = None, lease_seconds: float = 300.0,
+                 heartbeat_interval: float = 60.0, logger=None, write_retries: int = 2, retry_delay: float = 1.0):
+        """
+        Args:
+            path: 数据库文件路径
+            owner: 租约持有者标识，默认为主机名-进程号
+            lease_seconds: 租约有效期（秒）
+            heartbeat_interval: 续约间隔（秒），应明显小于租约有效期
+            logger: 日志对象
+            write_retries: 写入状态失败（如数据库被锁定）时的重试次数
+            retry_delay: 第一次重试前等待的秒数，之后每次加倍
+        """
+        self.path = path
+        self.owner = owner or default_owner()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.write_retries = write_retries
+        self.retry_delay = retry_delay
+        self.lost_leases = 0
+        self.failed_writes = 0
+        self._heartbeat_thread = None
+        self._heartbeat_stop = threading.Event()
+        self._setup_logging(logger)
+        self._conn = self._connect()
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _setup_logging(self, logger):
+        """设置日志"""
+        self.logger = logger or logging.getLogger('work_queue')
+
+    def _connect(self) -> sqlite3.Connection:
+        # 手动管理事务；其他电脑持有写锁时最多等待30秒
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+
+    def _migrate(self):
+        """旧版本创建的队列没有normalized列：补上该列，按已有号码回填，并将未处理的重复行标记为重复手机号"""
+        conn = self._conn
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(phones)')]
+        if 'normalized' not in columns:
+            from phone_index import DUPLICATE_STATUS, normalize_phone
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # 其他电脑可能已先完成升级
+                columns = [row[1] for row in conn.execute('PRAGMA table_info(phones)')]
+                if 'normalized' not in columns:
+                    conn.execute('ALTER TABLE phones ADD COLUMN normalized TEXT')
+                    rows = conn.execute('SELECT row_index, phone, status FROM phones').fetchall()
+                    keep, duplicates = self._deduplicate(rows, set(), normalize_phone)
+                    conn.executemany('UPDATE phones SET normalized = ? WHERE row_index = ?',
+                                     [(normalized, index) for index, normalized in keep.items()])
+                    conn.executemany('UPDATE phones SET status = ? WHERE row_index = ? AND status IS NULL',
+                                     [(DUPLICATE_STATUS, index) for index in duplicates])
+                    if duplicates:
+                        self.logger.info(f"任务队列升级：{len(duplicates)} 条未处理的重复号码已标记为{DUPLICATE_STATUS}")
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        conn.execute(_UNIQUE_INDEX)
+
+    @staticmethod
+    def _deduplicate(rows, seen: set, normalize):
+        """为每个号码选出保留的行：已有状态的行优先（已处理的号码不再领取），其次行号较小的行
+        Args:
+            rows: (行号, 手机号, 状态)
+            seen: 队列中已有的清洗后号码，会被更新
+            normalize: 清洗单个手机号的函数
+        Returns:
+            ({保留的行号: 清洗后号码}, [未处理的重复行号])
+        """
+        keep, duplicates = {}, []
+        for index, phone, status in sorted(rows, key=lambda row: (row[2] is None, row[0])):
+            normalized = normalize(phone) if phone is not None else None
+            if normalized is None:
+                continue
+            if normalized in seen:
+                if status is None:
+                    duplicates.append(index)
+                continue
+            seen.add(normalized)
+            keep[index] = normalized
+        return keep, duplicates
+
+    def _write(self, conn: sqlite3.Connection, sql: str, params=()) -> int:
+        """在写事务中执行一条语句，返回影响的行数"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            count = conn.execute(sql, params).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return count
+
+    def close(self):
+        self.stop_heartbeat()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def import_rows(self, excel_path: str) -> int:
+        """从手机号文件导入行，已存在的行保持不变
+        清洗后与队列中已有号码（或文件中其他行）相同的未处理行标记为重复手机号，不会被领取
+        Args:
+            excel_path: 手机号文件路径（.xlsx或.csv）
+        Returns:
+            新导入的行数
+        """
+        from phone_index import DUPLICATE_STATUS, normalize_phone
+        rows = [(row.index, None if row.phone is None else str(row.phone), row.status)
+                for row in PhoneSource(excel_path, skip_processed=False, logger=self.logger)]
+        now = time.time()
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            existing = {index for index, in conn.execute('SELECT row_index FROM phones')}
+            rows = [row for row in rows if row[0] not in existing]
+            seen = {normalized for normalized, in conn.execute('SELECT normalized FROM phones WHERE normalized IS NOT NULL')}
+            keep, duplicates = self._deduplicate(rows, seen, normalize_phone)
+            duplicates = set(duplicates)
+            conn.executemany(
+                'INSERT INTO phones (row_index, phone, status, normalized, updated_at) VALUES (?, ?, ?, ?, ?)',
+                [(index, phone, DUPLICATE_STATUS if index in duplicates else status, keep.get(index), now)
+                 for index, phone, status in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self.logger.info(f"已导入 {len(rows)} 条记录到任务队列: {self.path}，其中 {len(duplicates)} 条重复号码")
+        return len(rows)
+
+    def lease(self, batch_size: int = 10) -> List[PhoneRow]:
+        """领取一批未处理且未被占用（或租约已过期）的行
+        Returns:
+            领取到的行，队列为空时返回空列表
+        """
+        conn = self._conn
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(
+                'SELECT row_index, phone FROM phones WHERE status IS NULL AND (owner IS NULL OR lease_expires < ?) '
+                'ORDER BY row_index LIMIT ?', (now, batch_size)).fetchall()
+            conn.executemany('UPDATE phones SET owner = ?, lease_expires = ? WHERE row_index = ?',
+                             [(self.owner, now + self.lease_seconds, index) for index, _ in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return [PhoneRow(index, phone, None) for index, phone in rows]
+
+    def renew(self, index: int) -> bool:
+        """开始处理某一行前续约，确认租约仍归自己所有
+        Returns:
+            租约已过期并被其他电脑领取时返回False
+        """
+        count = self._write(self._conn,
+                            'UPDATE phones SET lease_expires = ? WHERE row_index = ? AND owner = ? AND status IS NULL',
+                            (time.time() + self.lease_seconds, index, self.owner))
+        return count > 0
+
+    def complete(self, index: int, status: str) -> bool:
+        """写入行状态并释放租约，数据库被锁定等错误时按退避间隔重试
+        Returns:
+            租约已不属于自己时返回False（状态仍会写入，避免结果丢失）；
+            重试后仍无法写入时记录日志并返回False，不抛出异常，该行的租约过期后会被重新领取
+        """
+        delay = self.retry_delay
+        for attempt in range(self.write_retries + 1):
+            try:
+                return self._complete(index, status)
+            except sqlite3.Error as e:
+                if attempt == self.write_retries:
+                    self.failed_writes += 1
+                    self.logger.error(f"第 {index + 1} 行的状态写入任务队列失败（{status}），租约过期后将被重新领取: {e}")
+                    return False
+                self.logger.warning(f"第 {index + 1} 行的状态写入任务队列失败，{delay:.1f}秒后重试: {e}")
+                time.sleep(delay)
+                delay *= 2
+        return False
+
+    def _complete(self, index: int, status: str) -> bool:
+        now = time.time()
+        count = self._write(self._conn,
+                            'UPDATE phones SET status = ?, owner = NULL, lease_expires = NULL, host = ?, updated_at = ? '
+                            'WHERE row_index = ? AND owner = ?',
+                            (status, self.owner, now, index, self.owner))
+        if count:
+            return True
+        self.lost_leases += 1
+        self.logger.warning(f"第 {index + 1} 行的租约已失效，仍写入状态: {status}")
+        self._write(self._conn,
+                    'UPDATE phones SET status = ?, host = ?, updated_at = ? WHERE row_index = ?',
+                    (status, self.owner, now, index))
+        return False
+
+    def release(self) -> int:
+        """释放自己持有的未完成租约，使这些行可以立即被其他电脑领取
+        Returns:
+            释放的行数
+        """
+        count = self._write(self._conn,
+                            'UPDATE phones SET owner = NULL, lease_expires = NULL WHERE owner = ? AND status IS NULL',
+                            (self.owner,))
+        if count:
+            self.logger.info(f"已释放 {count} 条未处理记录的租约")
+        return count
+
+    def heartbeat(self, conn: sqlite3.Connection = None) -> int:
+        """为自己持有的所有未完成租约续约
+        Returns:
+            续约的行数
+        """
+        return self._write(conn or self._conn,
+                           'UPDATE phones SET lease_expires = ? WHERE owner = ? AND status IS NULL',
+                           (time.time() + self.lease_seconds, self.owner))
+
+    def start_heartbeat(self):
+        """启动后台续约线程（使用独立的数据库连接）"""
+        if self._heartbeat_thread is not None:
+            return
+        self._heartbeat_stop.clear()
+
+        def loop():
+            conn = self._connect()
+            try:
+                while not self._heartbeat_stop.wait(self.heartbeat_interval):
+                    try:
+                        self.heartbeat(conn)
+                    except sqlite3.Error as e:
+                        self.logger.warning(f"任务队列续约失败: {e}")
+            finally:
+                conn.close()
+
+        self._heartbeat_thread = threading.Thread(target=loop, name='work-queue-heartbeat', daemon=True)
+        self._heartbeat_thread.start()
+
+    def stop_heartbeat(self):
+        if self._heartbeat_thread is not None:
+            self._heartbeat_stop.set()
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+
+    def rows(self, batch_size: int = 10) -> Iterator[PhoneRow]:
+        """逐批领取并逐行返回待处理的行，直到队列中没有可领取的行"""
+        while True:
+            batch = self.lease(batch_size)
+            if not batch:
+                return
+            for row in batch:
+                # 批内较晚的行可能因长时间卡住而失去租约
+                if self.renew(row.index):
+                    yield row
+                else:
+                    self.lost_leases += 1
+                    self.logger.warning(f"第 {row.index + 1} 行的租约已被其他电脑领取，跳过")
+
+    def statuses(self) -> Dict[int, str]:
+        """已有状态的行，{行号: 状态}"""
+        return dict(self._conn.execute('SELECT row_index, status FROM phones WHERE status IS NOT NULL'))
+
+    def export(self, excel_path: str) -> int:
+        """将队列中的状态写回手机号文件
+        Returns:
+            写入状态的行数
+        """
+        statuses = self.statuses()
+        write_checkpoint(excel_path, statuses)
+        return len(statuses)
+
+    def summarize(self) -> Dict[str, int]:
+        """统计各状态数量，字段与phone_source.summarize一致，另含leased（正在处理）"""
+        counts = {'total': 0, 'processed': 0, 'failed': 0, 'invalid': 0, 'duplicate': 0, 'error': 0, 'skipped': 0, 'leased': 0}
+        now = time.time()
+        for status, leased, count in self._conn.execute(
+                'SELECT status, status IS NULL AND owner IS NOT NULL AND lease_expires >= ?, COUNT(*) '
+                'FROM phones GROUP BY 1, 2', (now,)):
+            counts['total'] += count
+            if status is None:
+                counts['skipped'] += count
+                if leased:
+                    counts['leased'] += count
+            elif status == '已处理':
+                counts['processed'] += count
+            elif status == '添加失败':
+                counts['failed'] += count
+            elif status == '无效手机号':
+                counts['invalid'] += count
+            elif status in ('重复手机号', '已添加过'):
+                counts['duplicate'] += count
+            elif str(status).startswith('错误:'):
+                counts['error'] += count
+        return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='多台电脑共用的手机号任务队列')
+    parser.add_argument('command', choices=['import', 'status', 'export'], help='import导入、status查看进度、export导出状态')
+    parser.add_argument('excel', nargs='?', default='phone.xlsx', help='手机号文件路径')
+    parser.add_argument('--db', default='queue.db', help='任务队列数据库路径')
+    args = parser.parse_args(argv)
+
+    with WorkQueue(args.db) as queue:
+        if args.command == 'import':
+            print(f"新导入 {queue.import_rows(args.excel)} 条记录")
+        elif args.command == 'export':
+            print(f"已将 {queue.export(args.excel)} 条状态写入 {args.excel}")
+        counts = queue.summarize()
+        print(f"总记录数: {counts['total']}，处理成功: {counts['processed']}，添加失败: {counts['failed']}，"
+              f"无效号码: {counts['invalid']}，重复号码: {counts['duplicate']}，发生错误: {counts['error']}，"
+              f"未处理数: {counts['skipped']}（其中正在处理 {counts['leased']}）")
+
+
+if __name__ == '__main__':
+    main()